@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+构建 serverless 入口使用的目录快照（部署时由 vercel.json 的 buildCommand 执行）。
+
+快照就是一份预先编译好的目录缓存：按 backend/catalog.py 的 default_sources
+读取与 server.py 相同的数据源，把每个目录编译成 card_store 文件，并建好搜索、
+协同、推荐、关联图与声优索引，写到 api/snapshot/ 下随函数一起打包。
+冷启动时只需 mmap / 加载这些文件，不需要再解析任何源 JSON。
+
+    python api/build_snapshot.py
+"""
+
+import argparse
+import os
+import sys
+import time
+
+API_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(API_DIR)
+sys.path.insert(0, os.path.join(PROJECT_ROOT, "backend"))
+
+from catalog import Catalog  # noqa: E402
+
+SNAPSHOT_DIR = os.path.join(API_DIR, "snapshot")
+
+
+def build_snapshot(data_root: str, output_dir: str = SNAPSHOT_DIR) -> dict:
+    """编译所有目录与索引，返回 {目录名: 卡牌数}；缺失的数据源跳过。"""
+    catalog = Catalog(data_root, output_dir).preload()
+    try:
+        return catalog.stats()
+    finally:
+        catalog.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="构建 serverless 入口的目录快照")
+    parser.add_argument(
+        "--data-root", default=os.path.join(PROJECT_ROOT, "data"), help="数据目录"
+    )
+    parser.add_argument("-o", "--output", default=SNAPSHOT_DIR, help="快照输出目录")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    counts = build_snapshot(args.data_root, args.output)
+    summary = ", ".join(f"{name}={count}" for name, count in counts.items())
+    print(f"快照已写入 {args.output}（{summary}），耗时 {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,65 +1,54 @@
-from flask import Flask, request, jsonify, send_from_directory
-from flask_cors import CORS
-import os
-import json
+"""
+Vercel serverless 入口。
 
-app = Flask(__name__)
-CORS(app)  # 允许跨域访问
-app.config["SEND_FILE_MAX_AGE_DEFAULT"] = 0
+路由只有一份实现：backend/server.py 的 Flask 应用。这里只负责把它配置成
+serverless 环境可用的样子，并在第一个请求到来时才导入（冷启动时模块导入
+只剩标准库，Flask 与各索引的导入推迟到真正需要时）：
 
-# Vercel serverless 环境下的用户数据目录
-USER_DATA_DIR = "/tmp/user_data"
+- 卡牌目录读取部署时构建的快照（api/build_snapshot.py 预编译的 card_store
+  与各索引文件，见 backend/catalog.py 的 get_catalog），只需 mmap / 加载，
+  不解析源 JSON，也不需要随函数打包 data/ 下的源数据；
+- 用户数据通过 backend/user_store.py 读写：设置了 USER_STORE_URL（远程 KV
+  服务）时跨实例持久保存，否则退回到 /tmp/user_data，实例回收后就会丢失。
 
+vercel.json 只把 /api/* 转发到这里，所以请求指标由 /api/metrics 输出，
+只反映当前函数实例。
 
-# --- Helper Functions ---
-def get_user_filepath(username):
-    if not username or not username.isalnum():
-        return None
-    return os.path.join(USER_DATA_DIR, f"{username}.json")
+用 backend/benchmarks/bench_cold_start.py 测量导入与首个请求的耗时。
+"""
 
+import os
+import sys
 
-# --- API Routes ---
-@app.route("/api/user/data", methods=["GET"])
-def get_user_data():
-    username = request.args.get("username")
-    filepath = get_user_filepath(username)
-    if not filepath:
-        return jsonify({"error": "Invalid username"}), 400
+API_DIR = os.path.dirname(os.path.abspath(__file__))
+SNAPSHOT_DIR = os.path.join(API_DIR, "snapshot")
+BACKEND_DIR = os.path.join(os.path.dirname(API_DIR), "backend")
+sys.path.insert(0, BACKEND_DIR)
 
-    if not os.path.exists(filepath):
-        return jsonify({"isNewUser": True})
+# server.py 导入时读取这些配置；部署目录只读，用户数据只能写到 /tmp
+os.environ.setdefault("CATALOG_SNAPSHOT", SNAPSHOT_DIR)
+os.environ.setdefault("USER_DATA_DIR", "/tmp/user_data")
 
-    try:
-        with open(filepath, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        return jsonify(data)
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+_app = None
 
 
-@app.route("/api/user/data", methods=["POST"])
-def save_user_data():
-    data = request.get_json()
-    username = data.get("username")
-    filepath = get_user_filepath(username)
-    if not filepath:
-        return jsonify({"error": "Invalid username"}), 400
+def server_app():
+    """第一次用到时才导入 server.py 的 Flask 应用。"""
+    global _app
+    if _app is None:
+        from server import app as flask_app
 
-    if not os.path.exists(USER_DATA_DIR):
-        os.makedirs(USER_DATA_DIR)
+        _app = flask_app
+    return _app
 
-    try:
-        with open(filepath, "w", encoding="utf-8") as f:
-            json.dump(data.get("payload"), f, ensure_ascii=False, indent=4)
-        return jsonify({"message": "Data saved successfully"}), 200
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
 
+# WSGI 入口，Vercel 会自动处理这个应用
+def app(environ, start_response):
+    return server_app()(environ, start_response)
 
-# 确保用户数据目录存在
-if not os.path.exists(USER_DATA_DIR):
-    os.makedirs(USER_DATA_DIR)
 
-# Vercel 会自动处理这个 Flask 应用
 if __name__ == "__main__":
-    app.run(debug=True)
+    from wsgiref.simple_server import make_server
+
+    print("Serving on http://127.0.0.1:5000")
+    make_server("127.0.0.1", 5000, app).serve_forever()
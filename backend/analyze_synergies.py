@@ -1,36 +1,36 @@
-import json
 from collections import Counter
+import argparse
 import os
 
+from json_stream import iter_records
 
-def analyze_synergy_tags():
+
+DEFAULT_JSON_PATH = os.path.join(
+    os.path.dirname(__file__), "..", "data", "anime", "all_cards.json"
+)
+
+
+def analyze_synergy_tags(json_path=DEFAULT_JSON_PATH):
     """
     Reads the all_cards.json file, counts the occurrences of each synergy tag,
     and prints a sorted list of the counts.
     """
-    # Correctly locate the JSON file from the backend directory
-    json_path = os.path.join(
-        os.path.dirname(__file__), "..", "data", "anime", "all_cards.json"
-    )
 
+    # Use a Counter to efficiently count all tags, streaming the cards one by one
+    tag_counts = Counter()
     try:
-        with open(json_path, "r", encoding="utf-8") as f:
-            all_cards = json.load(f)
+        for card in iter_records(json_path):
+            # Safely get synergy_tags, defaulting to an empty list if it doesn't exist
+            tags = card.get("synergy_tags", [])
+            if tags:
+                tag_counts.update(tags)
     except FileNotFoundError:
         print(f"Error: Could not find all_cards.json at path: {json_path}")
         return
-    except json.JSONDecodeError:
+    except ValueError:  # includes json.JSONDecodeError
         print(f"Error: Could not decode JSON from file: {json_path}")
         return
 
-    # Use a Counter to efficiently count all tags
-    tag_counts = Counter()
-    for card in all_cards:
-        # Safely get synergy_tags, defaulting to an empty list if it doesn't exist
-        tags = card.get("synergy_tags", [])
-        if tags:
-            tag_counts.update(tags)
-
     if not tag_counts:
         print("No synergy tags found in the data.")
         return
@@ -43,4 +43,8 @@ def analyze_synergy_tags():
 
 
 if __name__ == "__main__":
-    analyze_synergy_tags()
+    parser = argparse.ArgumentParser(description="Count synergy tags in a card catalog")
+    parser.add_argument(
+        "-i", "--input", default=DEFAULT_JSON_PATH, help="Path to all_cards.json"
+    )
+    analyze_synergy_tags(parser.parse_args().input)
@@ -0,0 +1,73 @@
+"""
+Atomic file replacement.
+
+``AtomicFile`` writes to a uniquely named temp file in the target's directory
+and renames it over the target on ``commit()``, so readers never see a
+partial file, a failed write leaves the old one in place, and concurrent
+writers of one path never share a temp file.
+
+``tempfile.mkstemp`` creates its file owner-only (0600).  The outputs written
+this way (catalogs, card stores, user saves) are read by other users such as
+the web server, so the temp file gets the mode a plain ``open()`` would have
+given the target (0666 minus the umask) before it is renamed into place.
+
+    with AtomicFile("data/anime/all_cards.json", "w", encoding="utf-8") as f:
+        f.write(text)
+"""
+
+import os
+import tempfile
+from typing import Optional
+
+
+def _file_mode() -> int:
+    # The umask can only be read by setting it; done once, at import
+    umask = os.umask(0o022)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+FILE_MODE = _file_mode()
+
+
+class AtomicFile:
+    """A temp file next to ``path`` that replaces ``path`` when committed."""
+
+    def __init__(
+        self, path: str, mode: str = "wb", encoding: Optional[str] = None, suffix: str = ""
+    ):
+        self.path = str(path)
+        dir_name = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(dir_name, exist_ok=True)
+        fd, self.tmp_path = tempfile.mkstemp(prefix=".tmp_", suffix=suffix, dir=dir_name)
+        try:
+            os.chmod(self.tmp_path, FILE_MODE)
+            self.file = os.fdopen(fd, mode, encoding=encoding)
+        except BaseException:
+            os.close(fd)
+            os.remove(self.tmp_path)
+            raise
+
+    def commit(self):
+        """Close the temp file and rename it over the target."""
+        self.file.close()
+        os.replace(self.tmp_path, self.path)
+
+    def discard(self):
+        """Close and remove the temp file, leaving the target untouched."""
+        self.file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+    def __enter__(self):
+        return self.file
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            try:
+                self.commit()
+            except BaseException:
+                self.discard()
+                raise
+        else:
+            self.discard()
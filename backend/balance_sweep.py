@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+平衡参数扫描脚本
+
+调整 RARITY_PERCENTILES、COST_DISTRIBUTION、CLAMP_LOW/HIGH、RARITY_INT_BONUS、
+TOP_CHAR_PER_ANIME 等常量时，不必反复修改 create_curated_dataset.py 再整体重跑：
+本脚本只读取并预排序一次输入数据，然后在多个工作进程中并行评估一组配置，
+输出每个配置的分布指标（稀有度/费用直方图、points 分布、角色数量）。
+只有通过 --apply 选中的配置才会写入 data/selected_*。
+
+网格文件为 JSON，可以是 “参数 -> 候选值列表” 的字典（取笛卡尔积），
+也可以是显式的覆盖配置列表：
+
+    {"CLAMP_LOW": [-2, -1], "CLAMP_HIGH": [1, 2], "TOP_CHAR_PER_ANIME": [3, 5]}
+    [{"CLAMP_LOW": -2}, {"COST_DISTRIBUTION": {"1": 0.2, "2": 0.3, "3": 0.5}}]
+
+用法（在项目根目录执行）：
+    python backend/balance_sweep.py --grid sweep.json --workers 4
+    python backend/balance_sweep.py --grid sweep.json --apply 3
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import os
+import statistics
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+import create_curated_dataset as curated
+
+RARITY_ORDER = ["UR", "HR", "SSR", "SR", "R", "N"]
+
+# 工作进程内的只读输入，由 _init_worker 设置
+_inputs: Optional[dict] = None
+
+
+def load_grid(path: str) -> List[dict]:
+    """读取网格文件，展开为覆盖配置列表。"""
+    with open(path, "r", encoding="utf-8") as f:
+        grid = json.load(f)
+    if isinstance(grid, list):
+        return grid
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*grid.values())]
+
+
+def build_config(overrides: dict) -> dict:
+    """以当前常量为基准，应用一组覆盖项。JSON 中的费用键会被转回整数。"""
+    config = curated.default_config()
+    unknown = set(overrides) - set(config)
+    if unknown:
+        raise ValueError(f"未知的平衡参数: {', '.join(sorted(unknown))}")
+    config.update(overrides)
+    config["COST_DISTRIBUTION"] = {
+        int(k): v for k, v in config["COST_DISTRIBUTION"].items()
+    }
+    return config
+
+
+def load_inputs(configs: List[dict]) -> dict:
+    """读取并预排序输入：评分人数最多的番剧取所有配置中最大的 TOP_ANIME_COUNT。"""
+    max_count = max(config["TOP_ANIME_COUNT"] for config in configs)
+    stats = {}
+    top_rated = curated.load_top_rated_anime(max_count, stats)
+    candidates, edge_char, edge_anime = curated.load_character_candidates(
+        {a["id"] for a in top_rated}, stats
+    )
+    logging.info(
+        f"已加载 {len(top_rated)} 部番剧（共 {stats['rated_count']} 部有评分）、"
+        f"{len(candidates)} 个候选角色（共 {stats['total_characters']} 个）。"
+    )
+    return {
+        "top_rated": top_rated,
+        "candidates": candidates,
+        "edge_char": edge_char,
+        "edge_anime": edge_anime,
+    }
+
+
+def curate(inputs: dict, config: dict):
+    """按给定配置生成精选番剧与角色（不写文件）。"""
+    anime = curated.curate_anime(inputs["top_rated"], config)
+    characters = curated.curate_characters(
+        inputs["candidates"],
+        inputs["edge_char"],
+        inputs["edge_anime"],
+        {a["id"]: a for a in anime},
+        config,
+    )
+    return anime, characters
+
+
+def _histogram(values, order=None) -> Dict[str, int]:
+    counts = Counter(values)
+    keys = order if order else sorted(counts)
+    return {str(k): counts[k] for k in keys if counts.get(k)}
+
+
+def distribution_metrics(anime: List[dict], characters: List[dict]) -> dict:
+    """计算一个配置的分布指标。"""
+    points = [a["points"] for a in anime]
+    points_by_cost = {}
+    for cost in sorted({a["cost"] for a in anime}):
+        group = [a["points"] for a in anime if a["cost"] == cost]
+        points_by_cost[str(cost)] = {
+            "min": min(group),
+            "max": max(group),
+            "mean": round(statistics.fmean(group), 3),
+        }
+    return {
+        "anime_count": len(anime),
+        "anime_rarity": _histogram([a["rarity"] for a in anime], RARITY_ORDER),
+        "anime_cost": _histogram([a["cost"] for a in anime]),
+        "points": {
+            "min": min(points) if points else 0,
+            "max": max(points) if points else 0,
+            "mean": round(statistics.fmean(points), 3) if points else 0,
+            "stdev": round(statistics.pstdev(points), 3) if points else 0,
+        },
+        "points_by_cost": points_by_cost,
+        "character_count": len(characters),
+        "character_rarity": _histogram([c["rarity"] for c in characters], RARITY_ORDER),
+    }
+
+
+def _init_worker(inputs: dict):
+    global _inputs
+    _inputs = inputs
+
+
+def _evaluate(config: dict) -> dict:
+    return distribution_metrics(*curate(_inputs, config))
+
+
+def run_sweep(overrides_list: List[dict], workers: int) -> List[dict]:
+    """并行评估所有配置，返回 [{index, overrides, metrics}]。"""
+    configs = [build_config(o) for o in overrides_list]
+    inputs = load_inputs(configs)
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(inputs,)
+    ) as pool:
+        results = list(pool.map(_evaluate, configs))
+    return [
+        {"index": i, "overrides": overrides, "metrics": metrics}
+        for i, (overrides, metrics) in enumerate(zip(overrides_list, results))
+    ]
+
+
+def print_report(results: List[dict]):
+    print(f"{'#':>3}  {'稀有度(番剧)':<28} {'费用分布':<30} {'points 均值±标准差':<18} {'角色数':>6}  覆盖项")
+    for r in results:
+        m = r["metrics"]
+        rarity = "/".join(f"{k}{v}" for k, v in m["anime_rarity"].items())
+        costs = " ".join(f"{k}:{v}" for k, v in m["anime_cost"].items())
+        points = f"{m['points']['mean']:.2f}±{m['points']['stdev']:.2f}"
+        overrides = json.dumps(r["overrides"], ensure_ascii=False)
+        print(
+            f"{r['index']:>3}  {rarity:<28} {costs:<30} {points:<18} {m['character_count']:>6}  {overrides}"
+        )
+
+
+def apply_config(overrides: dict):
+    """用选中的配置重新生成并写入 data/selected_*。"""
+    config = build_config(overrides)
+    anime, characters = curate(load_inputs([config]), config)
+    curated.save_json(anime, curated.ANIME_OUTPUT_PATH)
+    curated.log_rarity_distribution(anime, "番剧")
+    curated.save_json(characters, curated.CHARACTER_OUTPUT_PATH)
+    curated.log_rarity_distribution(characters, "角色")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="平衡参数扫描")
+    parser.add_argument("-g", "--grid", required=True, help="参数网格 JSON 文件")
+    parser.add_argument(
+        "-w", "--workers", type=int, default=os.cpu_count(), help="工作进程数"
+    )
+    parser.add_argument(
+        "-r",
+        "--report",
+        default="data/balance_sweep_report.json",
+        help="指标报告输出路径",
+    )
+    parser.add_argument(
+        "-a",
+        "--apply",
+        type=int,
+        default=None,
+        help="将第 N 个配置写入 data/selected_*（不再重新扫描）",
+    )
+    args = parser.parse_args()
+
+    overrides_list = load_grid(args.grid)
+    if args.apply is not None:
+        logging.info(f"应用配置 #{args.apply}: {overrides_list[args.apply]}")
+        apply_config(overrides_list[args.apply])
+        return
+
+    logging.info(f"开始扫描 {len(overrides_list)} 个配置...")
+    results = run_sweep(overrides_list, args.workers)
+    print_report(results)
+
+    os.makedirs(os.path.dirname(args.report) or ".", exist_ok=True)
+    with open(args.report, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    logging.info(f"指标报告已保存到: {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,16 @@
+import threading
+import time
+
 import requests
-from typing import Optional, List, Union
-from .config import get_default_headers
+from typing import Any, List, Optional, Type, Union
+
+from pydantic import BaseModel
+
+from backend.instrumentation import count, sleep, span
+from .config import BASE_URL, RECORD_DIR, get_default_headers
+from .fixtures import FixtureStore
 from .models import (
+    RatingCount,
     Subject,
     PagedSubject,
     RelatedPerson,
@@ -18,6 +27,285 @@ from .models import (
 )
 
 
+class RateLimiter:
+    """令牌桶限速：平均每秒 rate 个请求，最多连续突发 burst 个。线程安全。"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """取一个令牌；不足时预支并等待到令牌补足为止。"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            sleep(wait)
+
+
+# 所有请求共享的限速器，由 set_rate_limit 设置；None 表示不限速
+_rate_limiter: Optional[RateLimiter] = None
+
+# API 根地址，可指向本地回放服务器（见 replay_server.py）
+_base_url = BASE_URL
+# 录制模式下保存响应的夹具存储（见 fixtures.py）
+_recorder: Optional[FixtureStore] = FixtureStore(RECORD_DIR) if RECORD_DIR else None
+
+# 遇到限流或服务端错误时的重试：最多 _max_retries 次，等待 Retry-After 或指数退避
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_RETRY_AFTER = 60.0
+_max_retries = 3
+_retry_backoff = 1.0
+
+
+def set_rate_limit(rate: Optional[float], burst: int = 1):
+    """为之后的所有请求设置全局速率上限（每秒请求数），传 None 取消限速。"""
+    global _rate_limiter
+    _rate_limiter = RateLimiter(rate, burst) if rate else None
+
+
+def set_base_url(url: str):
+    """切换 API 根地址，例如 http://127.0.0.1:8765。"""
+    global _base_url
+    _base_url = url.rstrip("/")
+
+
+def set_recorder(directory: Optional[str]):
+    """把之后的响应录制到 directory 作为夹具，传 None 停止录制。"""
+    global _recorder
+    _recorder = FixtureStore(directory) if directory else None
+
+
+def set_retries(max_retries: int, backoff: float = 1.0):
+    """设置限流 / 服务端错误 / 连接失败时的最大重试次数与退避基数（秒）。"""
+    global _max_retries, _retry_backoff
+    _max_retries = max_retries
+    _retry_backoff = backoff
+
+
+def add_arguments(parser):
+    """为抓取脚本添加 --base-url、--record 与 --retries 参数。"""
+    parser.add_argument(
+        "--base-url",
+        default=None,
+        help=f"Bangumi API 根地址（默认 {BASE_URL}，可设环境变量 BANGUMI_BASE_URL）",
+    )
+    parser.add_argument(
+        "--record", default=None, metavar="DIR", help="把所有 API 响应录制到 DIR 作为回放夹具"
+    )
+    parser.add_argument(
+        "--retries", type=int, default=None, help=f"限流与服务端错误的重试次数（默认 {_max_retries}）"
+    )
+
+
+def configure(args):
+    """应用 add_arguments 添加的参数。"""
+    if getattr(args, "base_url", None):
+        set_base_url(args.base_url)
+    if getattr(args, "record", None):
+        set_recorder(args.record)
+    if getattr(args, "retries", None) is not None:
+        set_retries(args.retries, _retry_backoff)
+
+
+def _retry_delay(response: Optional[requests.Response], attempt: int) -> float:
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), MAX_RETRY_AFTER)
+        except ValueError:
+            pass
+    return _retry_backoff * 2**attempt
+
+
+def _send(method: str, url: str, **kwargs) -> requests.Response:
+    """
+    发送请求并检查状态码。网络耗时计入 http.<method> 区段。
+    限流（429）、服务端错误与连接失败会按 set_retries 的设置重试，重试次数计入 http.retry。
+    """
+    attempt = 0
+    while True:
+        if _rate_limiter is not None:
+            _rate_limiter.acquire()
+        try:
+            with span(f"http.{method.lower()}"):
+                response = requests.request(method, url, **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            if attempt >= _max_retries:
+                raise
+            response = None
+        else:
+            count(f"http.status.{response.status_code}")
+            if response.status_code not in RETRY_STATUSES or attempt >= _max_retries:
+                break
+        count("http.retry")
+        sleep(_retry_delay(response, attempt))
+        attempt += 1
+
+    if _recorder is not None and response.status_code not in RETRY_STATUSES:
+        _recorder.record(response)
+    response.raise_for_status()
+    return response
+
+
+# 校验模式："full" 对每个响应做完整的 pydantic 校验；"light" 只校验流水线用到的字段，
+# 批量抓取时省去深层模型（infobox、tags、RatingCount…）校验再 dump 回 JSON 的往返
+VALIDATION_MODES = ("full", "light")
+_validation = "full"
+
+
+def _strict(kind: type):
+    """严格类型检查：只接受 kind 的实例（int 不接受 bool），不做 str()/int() 之类的转换。"""
+
+    def check(value):
+        if not isinstance(value, kind) or (kind is int and isinstance(value, bool)):
+            raise TypeError(f"应为 {kind.__name__}，实际为 {type(value).__name__}")
+        return value
+
+    return check
+
+
+def _strict_enum(enum: type):
+    """整数枚举：先严格检查是 int，再要求是合法的枚举值。"""
+    check_int = _strict(int)
+    return lambda value: enum(check_int(value))
+
+
+_int, _str = _strict(int), _strict(str)
+
+# light 模式下各模型实际校验的字段：字段名 -> 检查函数（类型不符或为 None 时抛错）。
+# 这些字段在模型中都是必填且不可为 None 的。未列出的模型仍做完整校验
+LIGHT_FIELDS = {
+    Subject: {"id": _int, "type": _strict_enum(SubjectType), "name": _str, "name_cn": _str},
+    SubjectRelation: {"id": _int, "type": _int, "name": _str, "relation": _str},
+    V0RelatedSubject: {"id": _int, "type": _strict_enum(SubjectType), "staff": _str},
+    RelatedCharacter: {"id": _int, "name": _str, "relation": _str},
+    Character: {"id": _int, "name": _str},
+    RelatedPerson: {"id": _int, "name": _str, "relation": _str},
+    CharacterPerson: {
+        "id": _int,
+        "name": _str,
+        "subject_id": _int,
+        "subject_type": _strict_enum(SubjectType),
+    },
+}
+# 模型 -> [(原始 JSON 中的键, 字段名, FieldInfo)]，供 LazyRecord.model_dump 使用
+_DUMP_FIELDS = {}
+
+# 完整校验后不带 by_alias 的 dump 会把评分分布的 "1".."10" 写成 one..ten，light 模式照做
+_RATING_COUNT_NAMES = {
+    field.alias: name for name, field in RatingCount.model_fields.items() if field.alias
+}
+
+
+def set_validation(mode: str):
+    """设置之后所有请求的响应校验模式（见 VALIDATION_MODES）。"""
+    global _validation
+    if mode not in VALIDATION_MODES:
+        raise ValueError(f"未知的校验模式: {mode}")
+    _validation = mode
+
+
+def _dump_fields(model_cls: Type[BaseModel]) -> list:
+    fields = _DUMP_FIELDS.get(model_cls)
+    if fields is None:
+        fields = [
+            (field.alias or name, name, field) for name, field in model_cls.model_fields.items()
+        ]
+        _DUMP_FIELDS[model_cls] = fields
+    return fields
+
+
+class LazyRecord:
+    """
+    light 模式返回的记录：保留原始 JSON，LIGHT_FIELDS 中的字段已严格校验并可按属性访问；
+    访问其他属性时才对整条记录做一次完整校验。
+
+    model_dump(mode="json") 不经过 pydantic，按模型的顶层字段重组原始 JSON：
+    丢弃 API 新增而模型没有的键，缺失的可选字段填默认值，缺失必填字段时退回完整校验
+    （从而抛出 ValidationError）。与完整校验后的 dump 相比，仍有两点不同：
+    嵌套对象原样保留（其中多出的键不会被丢弃），未校验字段的值也不做类型转换。
+    """
+
+    __slots__ = ("raw", "model_cls", "_fields", "_model")
+
+    def __init__(self, raw: dict, model_cls: Type[BaseModel]):
+        fields = {}
+        for name, convert in LIGHT_FIELDS[model_cls].items():
+            try:
+                fields[name] = convert(raw[name])
+            except (KeyError, TypeError, ValueError) as e:
+                raise ValueError(f"{model_cls.__name__}.{name} 校验失败: {e!r}") from None
+        self.raw = raw
+        self.model_cls = model_cls
+        self._fields = fields
+        self._model = None
+
+    @property
+    def model(self) -> BaseModel:
+        """完整校验后的模型（首次访问时校验）。"""
+        if self._model is None:
+            count("pydantic.lazy_validate")
+            self._model = self.model_cls.model_validate(self.raw)
+        return self._model
+
+    def __getattr__(self, name: str):
+        fields = self._fields
+        if name in fields:
+            return fields[name]
+        return getattr(self.model, name)
+
+    def model_dump(self, mode: str = "python", by_alias: bool = False, **kwargs) -> dict:
+        if mode != "json" or kwargs:
+            return self.model.model_dump(mode=mode, by_alias=by_alias, **kwargs)
+        raw = self.raw
+        data = {}
+        for key, name, field in _dump_fields(self.model_cls):
+            if key in raw:
+                data[key if by_alias else name] = raw[key]
+                continue
+            default = None if field.is_required() else field.get_default(call_default_factory=True)
+            if field.is_required() or not isinstance(default, (str, int, float, list, type(None))):
+                return self.model.model_dump(mode=mode, by_alias=by_alias)
+            data[key if by_alias else name] = default
+        rating = data.get("rating")
+        if not by_alias and isinstance(rating, dict) and isinstance(rating.get("count"), dict):
+            data["rating"] = {
+                **rating,
+                "count": {_RATING_COUNT_NAMES.get(k, k): v for k, v in rating["count"].items()},
+            }
+        return data
+
+    def __repr__(self) -> str:
+        return f"LazyRecord[{self.model_cls.__name__}]({self._fields})"
+
+
+def _parse(
+    response: requests.Response, model: Type[BaseModel], many: bool = False
+) -> Any:
+    """
+    解析响应 JSON 并用 pydantic 模型校验，两步分别计入 json.parse 与 pydantic.validate。
+    light 模式下支持的模型返回 LazyRecord，只校验用到的字段（计入 light.validate）。
+    """
+    with span("json.parse"):
+        data = response.json()
+    if _validation == "light" and model in LIGHT_FIELDS:
+        with span("light.validate"):
+            if many:
+                return [LazyRecord(item, model) for item in data]
+            return LazyRecord(data, model)
+    with span("pydantic.validate"):
+        if many:
+            return [model.model_validate(item) for item in data]
+        return model.model_validate(data)
+
+
 def get_subject_by_id(subject_id: int, access_token: Optional[str] = None) -> Subject:
     """
     使用 requests 库根据条目 ID 从 Bangumi API 获取单个条目的详细信息。
@@ -48,7 +336,7 @@ def get_subject_by_id(subject_id: int, access_token: Optional[str] = None) -> Su
         ... except requests.exceptions.HTTPError as e:
         ...     print(f"发生错误: {e}")
     """
-    api_url = f"https://api.bgm.tv/v0/subjects/{subject_id}"
+    api_url = f"{_base_url}/v0/subjects/{subject_id}"
 
     headers = get_default_headers()
 
@@ -57,10 +345,9 @@ def get_subject_by_id(subject_id: int, access_token: Optional[str] = None) -> Su
 
     proxies = {"http": None, "https": None}
 
-    response = requests.get(api_url, headers=headers, timeout=10, proxies=proxies)
-    response.raise_for_status()
+    response = _send("GET", api_url, headers=headers, timeout=10, proxies=proxies)
 
-    return Subject.model_validate(response.json())
+    return _parse(response, Subject)
 
 
 def search_subjects(
@@ -81,7 +368,7 @@ def search_subjects(
     Returns:
         PagedSubject: 搜索结果。
     """
-    api_url = "https://api.bgm.tv/v0/search/subjects"
+    api_url = f"{_base_url}/v0/search/subjects"
     headers = get_default_headers()
     if access_token:
         headers["Authorization"] = f"Bearer {access_token}"
@@ -94,7 +381,8 @@ def search_subjects(
 
     proxies = {"http": None, "https": None}
 
-    response = requests.post(
+    response = _send(
+        "POST",
         api_url,
         headers=headers,
         params=params,
@@ -102,8 +390,7 @@ def search_subjects(
         timeout=30,
         proxies=proxies,
     )
-    response.raise_for_status()
-    return PagedSubject.model_validate(response.json())
+    return _parse(response, PagedSubject)
 
 
 def get_subjects(
@@ -136,7 +423,7 @@ def get_subjects(
     Returns:
         PagedSubject: 条目列表。
     """
-    api_url = "https://api.bgm.tv/v0/subjects"
+    api_url = f"{_base_url}/v0/subjects"
     headers = get_default_headers()
     if access_token:
         headers["Authorization"] = f"Bearer {access_token}"
@@ -161,11 +448,10 @@ def get_subjects(
 
     proxies = {"http": None, "https": None}
 
-    response = requests.get(
-        api_url, headers=headers, params=params, timeout=10, proxies=proxies
+    response = _send(
+        "GET", api_url, headers=headers, params=params, timeout=10, proxies=proxies
     )
-    response.raise_for_status()
-    return PagedSubject.model_validate(response.json())
+    return _parse(response, PagedSubject)
 
 
 def get_subject_image(
@@ -182,7 +468,7 @@ def get_subject_image(
     Returns:
         str: 图片的 URL。
     """
-    api_url = f"https://api.bgm.tv/v0/subjects/{subject_id}/image"
+    api_url = f"{_base_url}/v0/subjects/{subject_id}/image"
     headers = get_default_headers()
     if access_token:
         headers["Authorization"] = f"Bearer {access_token}"
@@ -190,7 +476,8 @@ def get_subject_image(
     params = {"type": image_type.value}
     proxies = {"http": None, "https": None}
 
-    response = requests.get(
+    response = _send(
+        "GET",
         api_url,
         headers=headers,
         params=params,
@@ -198,7 +485,6 @@ def get_subject_image(
         proxies=proxies,
         allow_redirects=False,
     )
-    response.raise_for_status()
     if response.status_code == 302:
         return response.headers.get("Location", "")
     return ""
@@ -217,18 +503,16 @@ def get_related_persons(
     Returns:
         List[RelatedPerson]: 关联人物列表。
     """
-    api_url = f"https://api.bgm.tv/v0/subjects/{subject_id}/persons"
+    api_url = f"{_base_url}/v0/subjects/{subject_id}/persons"
     headers = get_default_headers()
     if access_token:
         headers["Authorization"] = f"Bearer {access_token}"
 
     proxies = {"http": None, "https": None}
 
-    response = requests.get(api_url, headers=headers, timeout=10, proxies=proxies)
-    response.raise_for_status()
+    response = _send("GET", api_url, headers=headers, timeout=10, proxies=proxies)
 
-    data = response.json()
-    return [RelatedPerson.model_validate(item) for item in data]
+    return _parse(response, RelatedPerson, many=True)
 
 
 def get_related_characters(
@@ -244,18 +528,16 @@ def get_related_characters(
     Returns:
         List[RelatedCharacter]: 关联角色列表。
     """
-    api_url = f"https://api.bgm.tv/v0/subjects/{subject_id}/characters"
+    api_url = f"{_base_url}/v0/subjects/{subject_id}/characters"
     headers = get_default_headers()
     if access_token:
         headers["Authorization"] = f"Bearer {access_token}"
 
     proxies = {"http": None, "https": None}
 
-    response = requests.get(api_url, headers=headers, timeout=10, proxies=proxies)
-    response.raise_for_status()
+    response = _send("GET", api_url, headers=headers, timeout=10, proxies=proxies)
 
-    data = response.json()
-    return [RelatedCharacter.model_validate(item) for item in data]
+    return _parse(response, RelatedCharacter, many=True)
 
 
 def get_related_subjects(
@@ -271,18 +553,16 @@ def get_related_subjects(
     Returns:
         List[SubjectRelation]: 关联条目列表。
     """
-    api_url = f"https://api.bgm.tv/v0/subjects/{subject_id}/subjects"
+    api_url = f"{_base_url}/v0/subjects/{subject_id}/subjects"
     headers = get_default_headers()
     if access_token:
         headers["Authorization"] = f"Bearer {access_token}"
 
     proxies = {"http": None, "https": None}
 
-    response = requests.get(api_url, headers=headers, timeout=10, proxies=proxies)
-    response.raise_for_status()
+    response = _send("GET", api_url, headers=headers, timeout=10, proxies=proxies)
 
-    data = response.json()
-    return [SubjectRelation.model_validate(item) for item in data]
+    return _parse(response, SubjectRelation, many=True)
 
 
 def search_characters(
@@ -303,7 +583,7 @@ def search_characters(
     Returns:
         PagedCharacter: 搜索结果。
     """
-    api_url = "https://api.bgm.tv/v0/search/characters"
+    api_url = f"{_base_url}/v0/search/characters"
     headers = get_default_headers()
     if access_token:
         headers["Authorization"] = f"Bearer {access_token}"
@@ -316,7 +596,8 @@ def search_characters(
 
     proxies = {"http": None, "https": None}
 
-    response = requests.post(
+    response = _send(
+        "POST",
         api_url,
         headers=headers,
         params=params,
@@ -324,8 +605,7 @@ def search_characters(
         timeout=30,
         proxies=proxies,
     )
-    response.raise_for_status()
-    return PagedCharacter.model_validate(response.json())
+    return _parse(response, PagedCharacter)
 
 
 def get_character_by_id(
@@ -341,7 +621,7 @@ def get_character_by_id(
     Returns:
         Character: 角色详情。
     """
-    api_url = f"https://api.bgm.tv/v0/characters/{character_id}"
+    api_url = f"{_base_url}/v0/characters/{character_id}"
     headers = get_default_headers()
 
     if access_token:
@@ -349,10 +629,9 @@ def get_character_by_id(
 
     proxies = {"http": None, "https": None}
 
-    response = requests.get(api_url, headers=headers, timeout=10, proxies=proxies)
-    response.raise_for_status()
+    response = _send("GET", api_url, headers=headers, timeout=10, proxies=proxies)
 
-    return Character.model_validate(response.json())
+    return _parse(response, Character)
 
 
 def get_character_image(
@@ -369,7 +648,7 @@ def get_character_image(
     Returns:
         str: 图片的 URL。
     """
-    api_url = f"https://api.bgm.tv/v0/characters/{character_id}/image"
+    api_url = f"{_base_url}/v0/characters/{character_id}/image"
     headers = get_default_headers()
     if access_token:
         headers["Authorization"] = f"Bearer {access_token}"
@@ -377,7 +656,8 @@ def get_character_image(
     params = {"type": image_type.value}
     proxies = {"http": None, "https": None}
 
-    response = requests.get(
+    response = _send(
+        "GET",
         api_url,
         headers=headers,
         params=params,
@@ -385,7 +665,6 @@ def get_character_image(
         proxies=proxies,
         allow_redirects=False,
     )
-    response.raise_for_status()
     if response.status_code == 302:
         return response.headers.get("Location", "")
     return ""
@@ -404,18 +683,16 @@ def get_character_related_subjects(
     Returns:
         List[V0RelatedSubject]: 关联条目列表。
     """
-    api_url = f"https://api.bgm.tv/v0/characters/{character_id}/subjects"
+    api_url = f"{_base_url}/v0/characters/{character_id}/subjects"
     headers = get_default_headers()
     if access_token:
         headers["Authorization"] = f"Bearer {access_token}"
 
     proxies = {"http": None, "https": None}
 
-    response = requests.get(api_url, headers=headers, timeout=10, proxies=proxies)
-    response.raise_for_status()
+    response = _send("GET", api_url, headers=headers, timeout=10, proxies=proxies)
 
-    data = response.json()
-    return [V0RelatedSubject.model_validate(item) for item in data]
+    return _parse(response, V0RelatedSubject, many=True)
 
 
 def get_character_related_persons(
@@ -431,15 +708,13 @@ def get_character_related_persons(
     Returns:
         List[CharacterPerson]: 关联人物列表。
     """
-    api_url = f"https://api.bgm.tv/v0/characters/{character_id}/persons"
+    api_url = f"{_base_url}/v0/characters/{character_id}/persons"
     headers = get_default_headers()
     if access_token:
         headers["Authorization"] = f"Bearer {access_token}"
 
     proxies = {"http": None, "https": None}
 
-    response = requests.get(api_url, headers=headers, timeout=10, proxies=proxies)
-    response.raise_for_status()
+    response = _send("GET", api_url, headers=headers, timeout=10, proxies=proxies)
 
-    data = response.json()
-    return [CharacterPerson.model_validate(item) for item in data]
+    return _parse(response, CharacterPerson, many=True)
@@ -1,6 +1,10 @@
+import os
 from typing import Dict
 
-BASE_URL = "https://api.bgm.tv"
+# 可用环境变量指向本地回放服务器（见 replay_server.py）
+BASE_URL = os.environ.get("BANGUMI_BASE_URL", "https://api.bgm.tv").rstrip("/")
+# 设置后，所有响应都会录制到该目录（见 fixtures.py）
+RECORD_DIR = os.environ.get("BANGUMI_RECORD_DIR") or None
 # 请记得替换为您的项目地址
 DEFAULT_USER_AGENT = "Aririgi/private-0.1.0"
 ACCESS_TOKEN = "kNbNoYz0cMEjQSLd6qzCeq2PdrrV96WLVDE2VGXA"
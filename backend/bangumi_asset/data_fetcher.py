@@ -1,6 +1,6 @@
 import argparse
 import json
-import time
+from contextlib import nullcontext
 from pathlib import Path
 import requests
 from tqdm import tqdm
@@ -10,6 +10,8 @@ import sys
 project_root = Path(__file__).resolve().parent.parent.parent
 sys.path.insert(0, str(project_root))
 
+from backend import instrumentation
+from backend.instrumentation import span
 from backend.bangumi_asset import bangumi_api
 from backend.bangumi_asset.models import (
     SubjectType,
@@ -31,15 +33,120 @@ def download_image(url: str, path: Path):
     if not url or path.exists():
         return
     try:
-        response = requests.get(url, stream=True, timeout=15)
-        response.raise_for_status()
-        with open(path, "wb") as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
+        with span("http.image"):
+            response = requests.get(url, stream=True, timeout=15)
+            response.raise_for_status()
+            with open(path, "wb") as f:
+                for chunk in response.iter_content(chunk_size=8192):
+                    f.write(chunk)
+        instrumentation.count("images.downloaded")
     except requests.exceptions.RequestException as e:
         print(f"Warning: Could not download image {url}. Error: {e}")
 
 
+def load_anime(anime_id: int, force_update: bool = False) -> dict:
+    """Full subject data: the saved file, or a fresh fetch if missing or forced."""
+    anime_file = ANIME_DIR / f"{anime_id}.json"
+    if not anime_file.exists() or force_update:
+        return bangumi_api.get_subject_by_id(anime_id).model_dump(mode="json")
+    with span("io.read"), open(anime_file, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_anime(
+    anime_id: int,
+    anime_data: dict,
+    download_images: bool = False,
+    force_update: bool = False,
+    lock=None,
+    delay: float = 0.5,
+    progress: bool = True,
+) -> list:
+    """
+    Fetch an anime's main characters, link both sides and write them out.
+
+    Character files are shared between anime, so concurrent callers pass a
+    ``lock`` that guards their read-modify-write.  ``delay`` is the pause
+    between character requests (0 when the caller rate-limits requests
+    itself).  Returns the main characters.
+    """
+    anime_file = ANIME_DIR / f"{anime_id}.json"
+    anime_name = anime_data.get("name_cn") or anime_data.get("name")
+
+    # Download anime image
+    if download_images:
+        img_path = IMG_ANIME_DIR / f"{anime_id}.jpg"
+        if not img_path.exists() or force_update:
+            image_url = bangumi_api.get_subject_image(anime_id, ImageType.LARGE)
+            download_image(image_url, img_path)
+
+    # Fetch and process characters
+    related_chars = bangumi_api.get_related_characters(anime_id)
+
+    # Filter for main characters ("主角")
+    main_characters = [char for char in related_chars if char.relation == "主角"]
+    main_character_ids = [char.id for char in main_characters]
+
+    if progress:
+        tqdm.write(f"  > Found {len(main_characters)} main character(s) for '{anime_name}'.")
+
+    for char_summary in tqdm(
+        main_characters,
+        desc=f"  - Chars for {anime_name}",
+        leave=False,
+        disable=not progress,
+    ):
+        char_id = char_summary.id
+        char_file = CHAR_DIR / f"{char_id}.json"
+
+        # Check and fetch character data
+        with lock or nullcontext():
+            cached = char_file.exists() and not force_update
+            if cached:
+                instrumentation.count("characters.cached")
+                with span("io.update"), open(char_file, "r+", encoding="utf-8") as f:
+                    char_data = json.load(f)
+                    if anime_id not in char_data.get("anime_ids", []):
+                        char_data.setdefault("anime_ids", []).append(anime_id)
+                        f.seek(0)
+                        json.dump(char_data, f, ensure_ascii=False, indent=4)
+                        f.truncate()
+        if not cached:
+            char_data_model = bangumi_api.get_character_by_id(char_id)
+            char_data = char_data_model.model_dump(mode="json")
+            with lock or nullcontext():
+                # Another worker may have written it meanwhile; keep its links
+                if char_file.exists() and not force_update:
+                    with open(char_file, "r", encoding="utf-8") as f:
+                        char_data["anime_ids"] = json.load(f).get("anime_ids", [])
+                anime_ids = char_data.setdefault("anime_ids", [])
+                if anime_id not in anime_ids:
+                    anime_ids.append(anime_id)
+                with span("io.write"), open(char_file, "w", encoding="utf-8") as f:
+                    json.dump(char_data, f, ensure_ascii=False, indent=4)
+            instrumentation.count("characters.fetched")
+
+        # Download character image
+        if download_images:
+            img_path = IMG_CHAR_DIR / f"{char_id}.jpg"
+            if not img_path.exists() or force_update:
+                image_url = bangumi_api.get_character_image(char_id, ImageType.LARGE)
+                download_image(image_url, img_path)
+
+        if delay:
+            instrumentation.sleep(delay)  # Rate limiting
+
+    # Finalize anime data with main character IDs and details
+    anime_data["main_character_ids"] = main_character_ids
+    anime_data["main_characters"] = [
+        char.model_dump(mode="json", by_alias=True) for char in main_characters
+    ]
+    with span("io.write"), open(anime_file, "w", encoding="utf-8") as f:
+        json.dump(anime_data, f, ensure_ascii=False, indent=4)
+    instrumentation.count("anime.processed")
+    return main_characters
+
+
 def main():
     """Main function to fetch and process data from the Bangumi API."""
     parser = argparse.ArgumentParser(
@@ -78,13 +185,29 @@ def main():
         action="store_true",
         help="Enable this flag to download anime and character images.",
     )
+    parser.add_argument(
+        "--validation",
+        choices=bangumi_api.VALIDATION_MODES,
+        default="full",
+        help="Response validation: full pydantic models (default), or only the fields used (light).",
+    )
     parser.add_argument(
         "--force-update",
         action="store_true",
         help="Enable this flag to re-fetch and overwrite existing data.",
     )
+    bangumi_api.add_arguments(parser)
+    instrumentation.add_arguments(parser)
     args = parser.parse_args()
+    bangumi_api.configure(args)
+
+    bangumi_api.set_validation(args.validation)
+    with instrumentation.session("data_fetcher", args):
+        fetch(args)
+
 
+def fetch(args):
+    """Search for anime and fetch their details, main characters and images."""
     # --- Directory Setup ---
     ANIME_DIR.mkdir(parents=True, exist_ok=True)
     CHAR_DIR.mkdir(parents=True, exist_ok=True)
@@ -131,7 +254,7 @@ def main():
                     break
 
                 offset += page_size
-                time.sleep(1)  # Rate limiting
+                instrumentation.sleep(1)  # Rate limiting
 
             except Exception as e:
                 print(f"\nAn error occurred during anime search: {e}")
@@ -141,84 +264,19 @@ def main():
     print(f"\nFound {len(all_anime_summaries)} anime. Starting data processing...")
     for anime_summary in tqdm(all_anime_summaries, desc="Processing Anime"):
         anime_id = anime_summary.id
-        anime_file = ANIME_DIR / f"{anime_id}.json"
-
         try:
-            # Fetch full anime data if it doesn't exist or if force-update is on
-            if not anime_file.exists() or args.force_update:
-                anime_data_model = bangumi_api.get_subject_by_id(anime_id)
-                anime_data = anime_data_model.model_dump(mode="json")
-            else:
-                with open(anime_file, "r", encoding="utf-8") as f:
-                    anime_data = json.load(f)
-
-            # Download anime image
-            if args.download_images:
-                img_path = IMG_ANIME_DIR / f"{anime_id}.jpg"
-                if not img_path.exists() or args.force_update:
-                    image_url = bangumi_api.get_subject_image(anime_id, ImageType.LARGE)
-                    download_image(image_url, img_path)
-
-            # Fetch and process characters
-            related_chars = bangumi_api.get_related_characters(anime_id)
-
-            # Filter for main characters ("主角")
-            main_characters = [
-                char for char in related_chars if char.relation == "主角"
-            ]
-            main_character_ids = [char.id for char in main_characters]
-
-            tqdm.write(
-                f"  > Found {len(main_characters)} main character(s) for '{anime_summary.name_cn or anime_summary.name}'."
+            anime_data = load_anime(anime_id, args.force_update)
+            save_anime(
+                anime_id,
+                anime_data,
+                download_images=args.download_images,
+                force_update=args.force_update,
             )
-
-            for char_summary in tqdm(
-                main_characters,
-                desc=f"  - Chars for {anime_summary.name_cn or anime_summary.name}",
-                leave=False,
-            ):
-                char_id = char_summary.id
-                char_file = CHAR_DIR / f"{char_id}.json"
-
-                # Check and fetch character data
-                if char_file.exists() and not args.force_update:
-                    with open(char_file, "r+", encoding="utf-8") as f:
-                        char_data = json.load(f)
-                        if anime_id not in char_data.get("anime_ids", []):
-                            char_data.setdefault("anime_ids", []).append(anime_id)
-                            f.seek(0)
-                            json.dump(char_data, f, ensure_ascii=False, indent=4)
-                            f.truncate()
-                else:
-                    char_data_model = bangumi_api.get_character_by_id(char_id)
-                    char_data = char_data_model.model_dump(mode="json")
-                    char_data["anime_ids"] = [anime_id]
-                    with open(char_file, "w", encoding="utf-8") as f:
-                        json.dump(char_data, f, ensure_ascii=False, indent=4)
-
-                # Download character image
-                if args.download_images:
-                    img_path = IMG_CHAR_DIR / f"{char_id}.jpg"
-                    if not img_path.exists() or args.force_update:
-                        image_url = bangumi_api.get_character_image(
-                            char_id, ImageType.LARGE
-                        )
-                        download_image(image_url, img_path)
-
-                time.sleep(0.5)  # Rate limiting
-
-            # Finalize anime data with main character IDs and details
-            anime_data["main_character_ids"] = main_character_ids
-            anime_data["main_characters"] = [
-                char.model_dump(mode="json", by_alias=True) for char in main_characters
-            ]
-            with open(anime_file, "w", encoding="utf-8") as f:
-                json.dump(anime_data, f, ensure_ascii=False, indent=4)
-
-            time.sleep(1)  # Rate limiting
+            instrumentation.sleep(1)  # Rate limiting
 
         except Exception as e:
             print(f"Warning: Failed to process anime ID {anime_id}. Error: {e}")
+            instrumentation.count("anime.failed")
             continue
 
     print("\nData fetching and processing complete!")
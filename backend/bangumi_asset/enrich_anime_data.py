@@ -1,6 +1,6 @@
+import argparse
 import json
 import os
-import time
 import requests
 import sys
 from pathlib import Path
@@ -8,6 +8,9 @@ from pathlib import Path
 project_root = Path(__file__).resolve().parent.parent.parent
 sys.path.append(str(project_root))
 
+from backend import instrumentation
+from backend.instrumentation import span
+from backend.bangumi_asset import bangumi_api
 from backend.bangumi_asset.bangumi_api import (
     get_related_characters,
     get_character_by_id,
@@ -45,7 +48,7 @@ def enrich_anime_data():
         print("请先运行 get_bangumi_top_ranked.py 脚本生成该文件。")
         return
 
-    with open(INPUT_ANIME_FILE, "r", encoding="utf-8") as f:
+    with span("io.read"), open(INPUT_ANIME_FILE, "r", encoding="utf-8") as f:
         anime_list = json.load(f)
     print(f"成功加载 {len(anime_list)} 条动画数据。")
 
@@ -65,9 +68,10 @@ def enrich_anime_data():
         # 1. 获取关联角色
         try:
             related_characters = get_related_characters(anime_id)
-            time.sleep(1)  # 遵守API速率限制
+            instrumentation.sleep(1)  # 遵守API速率限制
         except requests.exceptions.RequestException as e:
             print(f"  获取角色失败: {e}。跳过此动画。")
+            instrumentation.count("anime.failed")
             continue
 
         # 2. 筛选主角
@@ -87,6 +91,7 @@ def enrich_anime_data():
             char_name = char_summary.name
 
             if char_id in existing_character_ids:
+                instrumentation.count("characters.cached")
                 print(
                     f"    - 主角 '{char_name}' (ID: {char_id}) 的数据已存在，跳过获取。"
                 )
@@ -95,11 +100,11 @@ def enrich_anime_data():
             print(f"    - 正在获取主角 '{char_name}' (ID: {char_id}) 的详细信息...")
             try:
                 character_details = get_character_by_id(char_id)
-                time.sleep(1)
+                instrumentation.sleep(1)
 
                 # 存储角色详情
                 char_path = CHARACTERS_DIR / f"{char_id}.json"
-                with open(char_path, "w", encoding="utf-8") as f:
+                with span("io.write"), open(char_path, "w", encoding="utf-8") as f:
                     json.dump(
                         character_details.model_dump(
                             mode="json", by_alias=True, exclude_none=True
@@ -110,20 +115,23 @@ def enrich_anime_data():
                     )
 
                 existing_character_ids.add(char_id)
+                instrumentation.count("characters.fetched")
                 print(f"      √ 已保存到 {char_path}")
 
             except requests.exceptions.RequestException as e:
                 print(f"      × 获取角色 {char_id} 详情失败: {e}")
+                instrumentation.count("characters.failed")
 
         # 4. 保存增强后的单个动画数据 (card)
         card_path = OUTPUT_CARDS_DIR / f"{anime_id}.json"
-        with open(card_path, "w", encoding="utf-8") as f:
+        with span("io.write"), open(card_path, "w", encoding="utf-8") as f:
             json.dump(anime_data, f, ensure_ascii=False, indent=4)
 
         all_cards.append(anime_data)
+        instrumentation.count("anime.processed")
 
     # 5. 保存所有处理过的动画数据
-    with open(ALL_CARDS_FILE, "w", encoding="utf-8") as f:
+    with span("io.write"), open(ALL_CARDS_FILE, "w", encoding="utf-8") as f:
         json.dump(all_cards, f, ensure_ascii=False, indent=4)
 
     print(f"\n--- 处理完成 ---")
@@ -133,4 +141,10 @@ def enrich_anime_data():
 
 
 if __name__ == "__main__":
-    enrich_anime_data()
+    parser = argparse.ArgumentParser(description="为番剧补充主角信息并抓取角色详情")
+    bangumi_api.add_arguments(parser)
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    bangumi_api.configure(args)
+    with instrumentation.session("enrich_anime_data", args):
+        enrich_anime_data()
@@ -0,0 +1,105 @@
+"""
+Bangumi API 响应的录制夹具（fixture）存储。
+
+bangumi_api 在录制模式下（--record / BANGUMI_RECORD_DIR）把每个真实响应存成一个
+JSON 文件，replay_server.py 再按同样的键把它们回放出来，供离线基准与回归测试使用。
+
+键由规范化后的请求决定：方法 + 路径 + 排序后的查询参数 + 规范化的 JSON 请求体，
+与 base URL 无关，因此对 api.bgm.tv 录制的夹具可以原样用于本地回放。
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+from typing import Optional, Tuple, Union
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+
+def canonical_request(
+    method: str, url: str, body: Union[bytes, str, None] = None
+) -> Tuple[str, str, str, str]:
+    """(方法, 路径, 排序后的查询串, 规范化请求体)；url 可以是完整 URL 或 path?query。"""
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    if isinstance(body, bytes):
+        body = body.decode("utf-8")
+    body = body or ""
+    if body:
+        try:
+            body = json.dumps(json.loads(body), sort_keys=True, ensure_ascii=False)
+        except ValueError:
+            pass
+    return method.upper(), parts.path, query, body
+
+
+def fixture_key(method: str, path: str, query: str, body: str) -> str:
+    digest = hashlib.sha1(f"{method} {path}?{query}\n{body}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class FixtureStore:
+    """一个目录，每个录制的请求对应一个 <键>.json。写入是原子的，可多线程并发录制。"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def save(self, method: str, url: str, body, status: int, headers: dict, content: str) -> str:
+        """录制一次响应，返回其键。同一请求重复录制时以最后一次为准。"""
+        method, path, query, body = canonical_request(method, url, body)
+        key = fixture_key(method, path, query, body)
+        fixture = {
+            "method": method,
+            "path": path,
+            "query": query,
+            "body": body,
+            "status": status,
+            "headers": headers,
+            "content": content,
+        }
+        fd, tmp_path = tempfile.mkstemp(prefix=".tmp_", suffix=".json", dir=self.directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(fixture, f, ensure_ascii=False)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return key
+
+    def record(self, response) -> str:
+        """录制一个 requests.Response（按实际发出的请求计算键）。"""
+        request = response.request
+        headers = {
+            name: response.headers[name]
+            for name in ("Content-Type", "Location")
+            if name in response.headers
+        }
+        return self.save(
+            request.method,
+            request.url,
+            request.body,
+            response.status_code,
+            headers,
+            response.text,
+        )
+
+    def load(self, method: str, url: str, body=None) -> Optional[dict]:
+        """按请求查找夹具，没有录制过时返回 None。"""
+        key = fixture_key(*canonical_request(method, url, body))
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def __len__(self) -> int:
+        return sum(
+            1 for name in os.listdir(self.directory)
+            if name.endswith(".json") and not name.startswith(".tmp_")
+        )
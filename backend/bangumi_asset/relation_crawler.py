@@ -0,0 +1,364 @@
+"""
+Expand the anime dataset by walking Bangumi's relation graph.
+
+Starting from a seed set (the anime already saved, or ``--seed-ids``), the
+crawler does a breadth-first search over two kinds of edges:
+
+- subject relations (sequel, prequel, spin-off, ...) from
+  ``get_related_subjects``;
+- character appearances: the main characters of an anime, then the other
+  anime they star in (``get_character_related_subjects``).
+
+Each BFS level is fetched concurrently by a thread pool, while one shared
+token bucket (``bangumi_api.set_rate_limit``) keeps the total request rate
+within budget.  Visited anime and characters are tracked in id-indexed
+bitsets (Bangumi ids are dense, so ~100 KB covers the whole id space).
+Anime below the popularity cut-off are neither saved nor expanded, and
+``--max-depth`` / ``--limit`` bound the crawl.  Seeds that are already saved
+are only expanded: they are not written again and don't count toward
+``--limit``.
+
+Records are written exactly like ``data_fetcher.py`` does, so the rest of the
+pipeline picks them up unchanged.
+"""
+
+import argparse
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+import sys
+
+from tqdm import tqdm
+
+# Add project root to the Python path to allow absolute imports
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from backend import instrumentation
+from backend.instrumentation import span
+from backend.bangumi_asset import bangumi_api
+from backend.bangumi_asset.data_fetcher import (
+    ANIME_DIR,
+    CHAR_DIR,
+    IMG_ANIME_DIR,
+    IMG_CHAR_DIR,
+    load_anime,
+    save_anime,
+)
+from backend.bangumi_asset.models import SubjectType
+
+# Subject relations worth following; others ("角色出演", "片头曲", ...) lead away
+# from the franchise or out of anime altogether
+FOLLOW_RELATIONS = {
+    "前传",
+    "续集",
+    "总集篇",
+    "全集",
+    "番外篇",
+    "衍生",
+    "主线故事",
+    "相同世界观",
+    "不同演绎",
+    "外传",
+}
+# Character roles whose other appearances are followed
+FOLLOW_ROLES = {"主角"}
+# Where saved anime records live: data_fetcher.py writes to data/anime/, the
+# processing pipeline reads data/anime/raw_cards/
+SAVED_ANIME_DIRS = (ANIME_DIR, ANIME_DIR / "raw_cards")
+
+
+class IdSet:
+    """A growable bitset of non-negative integer ids."""
+
+    def __init__(self, capacity: int = 1 << 20):
+        self._bits = bytearray((capacity + 7) // 8)
+        self._count = 0
+
+    def __contains__(self, item: int) -> bool:
+        byte = item >> 3
+        return byte < len(self._bits) and bool(self._bits[byte] & (1 << (item & 7)))
+
+    def add(self, item: int) -> bool:
+        """Set ``item``; returns False if it was already present."""
+        byte = item >> 3
+        if byte >= len(self._bits):
+            self._bits.extend(bytes(max(byte + 1, 2 * len(self._bits)) - len(self._bits)))
+        mask = 1 << (item & 7)
+        if self._bits[byte] & mask:
+            return False
+        self._bits[byte] |= mask
+        self._count += 1
+        return True
+
+    def __len__(self) -> int:
+        return self._count
+
+
+def existing_anime_ids() -> list:
+    """Ids of the anime already saved, in any of ``SAVED_ANIME_DIRS``."""
+    ids = set()
+    for directory in SAVED_ANIME_DIRS:
+        if directory.is_dir():
+            ids.update(int(path.stem) for path in directory.glob("*.json") if path.stem.isdigit())
+    return sorted(ids)
+
+
+def saved_anime(anime_id: int) -> Optional[dict]:
+    """The saved record of an anime, or None if it was never saved."""
+    for directory in SAVED_ANIME_DIRS:
+        path = directory / f"{anime_id}.json"
+        if path.exists():
+            with span("io.read"), open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+    return None
+
+
+def is_popular(anime_data: dict, min_votes: int, max_rank: int) -> bool:
+    """Whether an anime passes the popularity cut-off (0 disables a bound)."""
+    rating = anime_data.get("rating") or {}
+    if min_votes and (rating.get("total") or 0) < min_votes:
+        return False
+    if max_rank and not 0 < (rating.get("rank") or 0) <= max_rank:
+        return False
+    return True
+
+
+class Crawler:
+    """BFS state shared by the worker threads."""
+
+    def __init__(self, args):
+        self.args = args
+        self.seen_anime = IdSet()
+        self.seen_characters = IdSet()
+        self.saved = 0
+        self._lock = threading.Lock()
+        self._char_lock = threading.Lock()
+
+    def _claim_anime(self, anime_id: int) -> bool:
+        with self._lock:
+            return self.seen_anime.add(anime_id)
+
+    def _claim_character(self, char_id: int) -> bool:
+        with self._lock:
+            return self.seen_characters.add(char_id)
+
+    def _reserve_slot(self) -> bool:
+        """Count one more saved anime, unless --limit is reached."""
+        with self._lock:
+            if self.args.limit and self.saved >= self.args.limit:
+                return False
+            self.saved += 1
+            return True
+
+    def visit_seed(self, anime_id: int, expand: bool) -> list:
+        """
+        Expand a seed anime.  A saved seed is read back, not fetched or saved
+        again; a new one is fetched and saved without the popularity cut-off.
+        Neither counts toward ``--limit``.
+        """
+        anime_data = None if self.args.force_update else saved_anime(anime_id)
+        if anime_data is None:
+            return self.visit(anime_id, expand, seed=True)
+        if not expand:
+            return []
+        try:
+            return self._expand(anime_id, anime_data.get("main_character_ids") or [])
+        except Exception as e:
+            tqdm.write(f"Warning: Failed to crawl anime ID {anime_id}. Error: {e}")
+            instrumentation.count("crawl.failed")
+            return []
+
+    def visit(self, anime_id: int, expand: bool, seed: bool = False) -> list:
+        """
+        Fetch and save one anime; return the unseen anime ids it leads to
+        (empty when it is filtered out or ``expand`` is off).
+        """
+        args = self.args
+        try:
+            anime_data = load_anime(anime_id, args.force_update)
+            if anime_data.get("type", SubjectType.ANIME.value) != SubjectType.ANIME.value:
+                instrumentation.count("crawl.skipped_type")
+                return []
+            if not seed:
+                if not is_popular(anime_data, args.min_votes, args.max_rank):
+                    instrumentation.count("crawl.skipped_unpopular")
+                    return []
+                if not self._reserve_slot():
+                    return []
+            main_characters = save_anime(
+                anime_id,
+                anime_data,
+                download_images=args.download_images,
+                force_update=args.force_update,
+                lock=self._char_lock,
+                delay=0,
+                progress=False,
+            )
+            if not expand:
+                return []
+            return self._expand(anime_id, [char.id for char in main_characters])
+
+        except Exception as e:
+            tqdm.write(f"Warning: Failed to crawl anime ID {anime_id}. Error: {e}")
+            instrumentation.count("crawl.failed")
+            return []
+
+    def _expand(self, anime_id: int, character_ids: list) -> list:
+        """Claim and return the unseen anime one anime leads to."""
+        found = []
+        with span("crawl.relations"):
+            for related in bangumi_api.get_related_subjects(anime_id):
+                if related.type == SubjectType.ANIME.value and related.relation in FOLLOW_RELATIONS:
+                    found.append(related.id)
+        if self.args.via_characters:
+            with span("crawl.appearances"):
+                for char_id in character_ids:
+                    if not self._claim_character(char_id):
+                        continue
+                    for subject in bangumi_api.get_character_related_subjects(char_id):
+                        if subject.type == SubjectType.ANIME and subject.staff in FOLLOW_ROLES:
+                            found.append(subject.id)
+        return [i for i in found if self._claim_anime(i)]
+
+    def run(self, seeds: list):
+        frontier = [i for i in seeds if self._claim_anime(i)]
+        with ThreadPoolExecutor(max_workers=self.args.workers) as pool:
+            for depth in range(self.args.max_depth + 1):
+                if not frontier:
+                    break
+                if self.args.limit and self.saved >= self.args.limit:
+                    print(f"Reached the limit of {self.args.limit} anime.")
+                    break
+                expand = depth < self.args.max_depth
+                visit = self.visit_seed if depth == 0 else self.visit
+                next_frontier = []
+                with tqdm(total=len(frontier), desc=f"Depth {depth}") as pbar:
+                    for found in pool.map(lambda i: visit(i, expand), frontier):
+                        next_frontier.extend(found)
+                        pbar.update(1)
+                instrumentation.count("crawl.levels")
+                print(
+                    f"Depth {depth}: visited {len(frontier)}, "
+                    f"{len(next_frontier)} new anime queued, {self.saved} saved so far."
+                )
+                frontier = next_frontier
+
+
+def main():
+    """Crawl the relation graph outward from a seed set of anime."""
+    parser = argparse.ArgumentParser(
+        description="Expand the dataset by BFS over Bangumi subject relations and character appearances.",
+        formatter_class=argparse.RawTextHelpFormatter,
+    )
+    parser.add_argument(
+        "--seed-ids",
+        type=str,
+        help="Comma-separated anime IDs to start from. Defaults to every anime already saved\n"
+        "(data/anime and data/anime/raw_cards).",
+    )
+    parser.add_argument(
+        "-d",
+        "--max-depth",
+        type=int,
+        default=2,
+        help="How many relation hops to follow from the seeds. Defaults to 2.",
+    )
+    parser.add_argument(
+        "-l",
+        "--limit",
+        type=int,
+        default=500,
+        help="Maximum number of new anime to save (seeds not counted). 0 for no limit. "
+        "Defaults to 500.",
+    )
+    parser.add_argument(
+        "--min-votes",
+        type=int,
+        default=500,
+        help="Skip anime rated by fewer users than this. 0 disables. Defaults to 500.",
+    )
+    parser.add_argument(
+        "--max-rank",
+        type=int,
+        default=0,
+        help="Skip anime ranked below this (or unranked). 0 disables. Defaults to 0.",
+    )
+    parser.add_argument(
+        "--no-characters",
+        dest="via_characters",
+        action="store_false",
+        help="Only follow subject relations, not main characters' other appearances.",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=4,
+        help="Concurrent requests in flight. Defaults to 4.",
+    )
+    parser.add_argument(
+        "-r",
+        "--rate",
+        type=float,
+        default=2.0,
+        help="Request budget in requests per second, shared by all workers. Defaults to 2.",
+    )
+    parser.add_argument(
+        "--validation",
+        choices=bangumi_api.VALIDATION_MODES,
+        default="light",
+        help="Response validation: full pydantic models, or only the fields used (light). Defaults to light.",
+    )
+    parser.add_argument(
+        "--download-images",
+        action="store_true",
+        help="Enable this flag to download anime and character images.",
+    )
+    parser.add_argument(
+        "--force-update",
+        action="store_true",
+        help="Enable this flag to re-fetch and overwrite existing data.",
+    )
+    bangumi_api.add_arguments(parser)
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    bangumi_api.configure(args)
+
+    with instrumentation.session("relation_crawler", args):
+        crawl(args)
+
+
+def crawl(args):
+    ANIME_DIR.mkdir(parents=True, exist_ok=True)
+    CHAR_DIR.mkdir(parents=True, exist_ok=True)
+    if args.download_images:
+        IMG_ANIME_DIR.mkdir(parents=True, exist_ok=True)
+        IMG_CHAR_DIR.mkdir(parents=True, exist_ok=True)
+
+    if args.seed_ids:
+        seeds = [int(i) for i in args.seed_ids.split(",") if i.strip()]
+    else:
+        seeds = existing_anime_ids()
+    if not seeds:
+        print("No seed anime. Run data_fetcher.py first or pass --seed-ids.")
+        return
+
+    bangumi_api.set_rate_limit(args.rate, burst=args.workers)
+    bangumi_api.set_validation(args.validation)
+    print(
+        f"Crawling from {len(seeds)} seed anime, depth <= {args.max_depth}, "
+        f"{args.workers} workers at {args.rate:g} req/s..."
+    )
+    crawler = Crawler(args)
+    crawler.run(seeds)
+    print(
+        f"\nCrawl complete: {crawler.saved} anime saved, {len(crawler.seen_anime)} anime and "
+        f"{len(crawler.seen_characters)} characters visited."
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+本地 Bangumi API 替身：回放录制的夹具，用于离线基准与回归测试。
+
+先对真实 API 录制一遍（任何抓取脚本加 --record，或设环境变量 BANGUMI_RECORD_DIR）：
+
+    python backend/bangumi_asset/data_fetcher.py -l 50 --record data/fixtures/bangumi
+
+再启动回放服务器，把抓取脚本指向它（--base-url 或 BANGUMI_BASE_URL）：
+
+    python backend/bangumi_asset/replay_server.py -f data/fixtures/bangumi --latency 80 --jitter 30 \\
+        --throttle-rate 0.05 --error-rate 0.02 --seed 1
+    python backend/bangumi_asset/data_fetcher.py -l 50 --base-url http://127.0.0.1:8765 --trace
+
+可配置的行为：
+- 每个请求的延迟（--latency 毫秒，±--jitter 均匀抖动）；
+- 按比例注入 429（带 Retry-After）与 500/502/503，随机数由 --seed 决定，可复现；
+- /image 端点的重定向：record 原样返回录制的 302 Location；local 重定向到本服务器的
+  /_images/ 占位图（无需外网即可走完下载流程）；none 返回 404。
+没有录制过的请求返回 404。GET /_stats 返回已处理请求、注入错误与未命中的计数。
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlsplit
+
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from backend.bangumi_asset.fixtures import FixtureStore  # noqa: E402
+
+IMAGE_MODES = ("record", "local", "none")
+INJECTED_ERRORS = (500, 502, 503)
+# 最小的合法 JPEG（SOI + EOI），作为 /_images/ 的占位图
+PLACEHOLDER_JPEG = b"\xff\xd8\xff\xd9"
+
+
+class ReplayState:
+    """回放配置与计数器，由所有请求线程共享。"""
+
+    def __init__(self, args):
+        self.store = FixtureStore(args.fixtures)
+        self.latency = args.latency / 1000.0
+        self.jitter = args.jitter / 1000.0
+        self.throttle_rate = args.throttle_rate
+        self.error_rate = args.error_rate
+        self.retry_after = args.retry_after
+        self.images = args.images
+        self._rng = random.Random(args.seed)
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "served": 0, "misses": 0, "throttled": 0, "errors": 0}
+
+    def roll(self):
+        """决定本次请求的延迟与注入的错误（None 表示正常响应）。"""
+        with self._lock:
+            self.stats["requests"] += 1
+            delay = max(self.latency + self._rng.uniform(-self.jitter, self.jitter), 0.0)
+            draw = self._rng.random()
+            if draw < self.throttle_rate:
+                self.stats["throttled"] += 1
+                return delay, 429
+            if draw < self.throttle_rate + self.error_rate:
+                self.stats["errors"] += 1
+                return delay, self._rng.choice(INJECTED_ERRORS)
+            return delay, None
+
+    def bump(self, name: str):
+        with self._lock:
+            self.stats[name] += 1
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    server_version = "BangumiReplay/1.0"
+    state: ReplayState = None
+    verbose = False
+
+    def do_GET(self):
+        self._handle()
+
+    def do_POST(self):
+        self._handle()
+
+    def log_message(self, format, *args):
+        if self.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status: int, body: bytes = b"", headers: dict = None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status: int, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self._send(status, body, {"Content-Type": "application/json"})
+
+    def _handle(self):
+        state = self.state
+        path = urlsplit(self.path).path
+        if path == "/_stats":
+            return self._send_json(200, {**state.stats, "fixtures": len(state.store)})
+        if path.startswith("/_images/"):
+            return self._send(200, PLACEHOLDER_JPEG, {"Content-Type": "image/jpeg"})
+
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        delay, injected = state.roll()
+        if delay:
+            time.sleep(delay)
+        if injected == 429:
+            headers = {"Content-Type": "application/json"}
+            if state.retry_after:
+                headers["Retry-After"] = f"{state.retry_after:g}"
+            return self._send(429, b'{"title": "Too Many Requests"}', headers)
+        if injected is not None:
+            return self._send_json(
+                injected, {"title": "Server Error", "description": "injected by replay server"}
+            )
+
+        if path.endswith("/image"):
+            return self._handle_image(path, body)
+
+        fixture = state.store.load(self.command, self.path, body)
+        if fixture is None:
+            state.bump("misses")
+            return self._send_json(
+                404, {"title": "Not Found", "description": f"no fixture for {self.path}"}
+            )
+        state.bump("served")
+        self._send(fixture["status"], fixture["content"].encode("utf-8"), fixture["headers"])
+
+    def _handle_image(self, path: str, body: bytes):
+        state = self.state
+        if state.images == "none":
+            state.bump("misses")
+            return self._send_json(404, {"title": "Not Found"})
+        if state.images == "local":
+            state.bump("served")
+            name = path.strip("/").replace("/", "_") + ".jpg"
+            host = self.headers.get("Host") or f"127.0.0.1:{self.server.server_port}"
+            return self._send(302, headers={"Location": f"http://{host}/_images/{name}"})
+        fixture = state.store.load(self.command, self.path, body)
+        if fixture is None:
+            state.bump("misses")
+            return self._send_json(404, {"title": "Not Found"})
+        state.bump("served")
+        self._send(fixture["status"], fixture["content"].encode("utf-8"), fixture["headers"])
+
+
+def make_server(args) -> ThreadingHTTPServer:
+    handler = type(
+        "Handler", (ReplayHandler,), {"state": ReplayState(args), "verbose": args.verbose}
+    )
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="回放录制的 Bangumi API 响应")
+    parser.add_argument(
+        "-f",
+        "--fixtures",
+        default=str(project_root / "data" / "fixtures" / "bangumi"),
+        help="夹具目录（由 --record 录制）",
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("-p", "--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="每个请求的延迟（毫秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="延迟的均匀抖动幅度（毫秒）")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="注入 429 的比例")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="注入 5xx 的比例")
+    parser.add_argument(
+        "--retry-after", type=float, default=1.0, help="429 响应的 Retry-After 秒数（0 不带）"
+    )
+    parser.add_argument(
+        "--images", choices=IMAGE_MODES, default="local", help="/image 端点的重定向行为"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="错误注入与抖动的随机种子")
+    parser.add_argument("-v", "--verbose", action="store_true", help="打印每个请求")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.fixtures):
+        print(f"夹具目录不存在: {args.fixtures}")
+        return
+    server = make_server(args)
+    print(
+        f"回放 {len(server.RequestHandlerClass.state.store)} 个夹具: "
+        f"http://{args.host}:{server.server_port}  (Ctrl+C 停止)"
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(server.RequestHandlerClass.state.stats, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
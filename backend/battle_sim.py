@@ -0,0 +1,590 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+无界面对战模拟器
+
+把 Vue 客户端（frontend-vue/src/core/battle、stores/battle.ts）中的对战规则移植为
+纯 Python 引擎，读取精选番剧卡（data/selected_anime/all_cards.json），
+让两套脚本化策略用各自的卡组对战，并在多个工作进程中批量运行带种子的对局，
+按卡牌、费用、稀有度汇总胜率，用来检验 compute_integer_points 给出的
+cost / points 曲线是否平衡。
+
+移植的规则：
+- 声望 30、起手 5 张、手牌上限 10、牌库不足时不抽；
+- 第 N 回合双方 TP 上限为 N + 1 并回满，行动方抽 1 张，共 12 回合；
+- 每回合行动方发起一次交锋：友好安利 +0 费、辛辣点评 +1 费；
+  防守方可用卡牌应对（赞同 +0 费、反驳 +1 费）或放弃（视为强度 0 的赞同）；
+- 强度差按 碾压(≥5) / 优势(≥1) / 平局 / 劣势(≥-4) / 被碾压 查表结算声望与话题偏向；
+- 声望归零或话题偏向达到 ±10 立即分出胜负，12 回合后比较声望；
+- 带“日常”标签的番剧卡打出时抽 1 张（客户端唯一的卡面效果）。
+
+未移植：角色卡的技能与光环、持续效果。强度只取番剧卡的 points。
+
+卡组可由 --decks 指定（与 aiProfiles.ts 相同的 [{"name", "anime": [id...]}] 格式），
+否则每局按客户端 randomAIDeckGenerator 的费用曲线随机组 30 张。
+每局的随机数只由 (--seed, 对局序号) 决定，同样的参数总能复现同样的报告；
+座位（先手）在相邻两局之间轮换，以抵消先手优势。
+
+用法（在项目根目录执行）：
+    python backend/battle_sim.py --games 20000 --workers 4
+    python backend/battle_sim.py --decks decks.json --policy-a ai --policy-b greedy
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from json_stream import iter_records
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+
+ANIME_INPUT_PATH = "data/selected_anime/all_cards.json"
+REPORT_PATH = "data/battle_sim_report.json"
+RARITY_ORDER = ["UR", "HR", "SSR", "SR", "R", "N"]
+
+# --- 规则常量（与客户端一致） ---
+INITIAL_REPUTATION = 30
+INITIAL_HAND_SIZE = 5
+HAND_LIMIT = 10
+MAX_TURNS = 12
+BIAS_LIMIT = 10
+DECK_SIZE = 30
+DRAW_TAG = "日常"
+
+# 随机卡组的理想费用曲线（randomAIDeckGenerator.ts）
+IDEAL_MANA_CURVE = {1: 4, 2: 6, 3: 6, 4: 5, 5: 4, 6: 3, 7: 2}
+
+FRIENDLY = "友好安利"
+HARSH = "辛辣点评"
+AGREE = "赞同"
+REBUT = "反驳"
+STYLE_EXTRA_COST = {FRIENDLY: 0, HARSH: 1, AGREE: 0, REBUT: 1}
+
+OUTCOMES = ["crush", "advantage", "draw", "defender_advantage", "defender_crush"]
+
+# (防守风格, 进攻风格) -> 各结果的 (进攻方声望, 防守方声望, 话题偏向)
+# 话题偏向以进攻方为正方向，结算时再按座位换算为 playerA 视角
+REWARDS = {
+    (AGREE, FRIENDLY): [(1, -4, 2), (0, -3, 1), (0, 0, 0), (-3, 0, 0), (-4, 0, 0)],
+    (AGREE, HARSH): [(0, -6, 3), (0, -5, 2), (0, 0, 1), (-5, 0, 0), (-6, 0, 1)],
+    (REBUT, FRIENDLY): [(1, -5, 2), (0, -4, 1), (-1, 1, 0), (-2, 0, 0), (-3, 0, 0)],
+    (REBUT, HARSH): [(0, -7, 3), (0, -6, 2), (0, 0, 0), (-4, 0, 0), (-5, 0, 0)],
+}
+
+# 工作进程内的只读输入，由 _init_worker 设置
+_inputs: Optional[dict] = None
+
+
+def classify(diff: int) -> int:
+    """强度差 -> OUTCOMES 下标。"""
+    if diff >= 5:
+        return 0
+    if diff >= 1:
+        return 1
+    if diff == 0:
+        return 2
+    if diff >= -4:
+        return 3
+    return 4
+
+
+class Player:
+    """对局中一方的状态。牌库末尾为牌顶。"""
+
+    __slots__ = ("deck", "hand", "reputation", "tp", "played")
+
+    def __init__(self, deck: List[dict]):
+        self.deck = deck
+        self.hand: List[dict] = []
+        self.reputation = INITIAL_REPUTATION
+        self.tp = 0
+        self.played: List[int] = []
+
+    def draw(self, count: int):
+        if len(self.deck) < count:
+            return
+        for _ in range(count):
+            if len(self.hand) >= HAND_LIMIT:
+                break
+            self.hand.append(self.deck.pop())
+
+    def play(self, index: int, style: str) -> dict:
+        card = self.hand.pop(index)
+        self.tp -= card["cost"] + STYLE_EXTRA_COST[style]
+        self.played.append(card["id"])
+        if DRAW_TAG in card["tags"]:
+            self.draw(1)
+        return card
+
+
+# --- 策略 ---
+# 进攻策略: (player, rng) -> (手牌下标, 风格) 或 None（结束回合）
+# 防守策略: (player, 进攻卡, rng) -> (手牌下标, 风格) 或 None（放弃应对）
+
+
+def _affordable(player: Player) -> List[int]:
+    return [i for i, card in enumerate(player.hand) if card["cost"] <= player.tp]
+
+
+def _efficiency(card: dict) -> float:
+    return card["points"] / max(card["cost"], 1)
+
+
+def ai_attack(player: Player, rng: random.Random):
+    """AIController.decideAttack：按性价比排序，30% 取最优，否则在前三中随机。"""
+    options = sorted(_affordable(player), key=lambda i: _efficiency(player.hand[i]), reverse=True)
+    if not options:
+        return None
+    index = options[0] if rng.random() < 0.3 else rng.choice(options[:3])
+    card = player.hand[index]
+    if player.tp >= card["cost"] + 1 and card["points"] >= 4 and rng.random() < 0.6:
+        return index, HARSH
+    return index, FRIENDLY
+
+
+def ai_defend(player: Player, attack_card: dict, rng: random.Random):
+    """AIController.decideDefense：选性价比最高的可负担卡，手牌少且卡弱时可能放弃。"""
+    options = _affordable(player)
+    if not options:
+        return None
+    index = max(options, key=lambda i: _efficiency(player.hand[i]))
+    card = player.hand[index]
+    if len(player.hand) <= 2 and card["points"] < 2 and rng.random() < 0.3:
+        return None
+    if player.tp >= card["cost"] + 1 and attack_card["points"] >= 3 and rng.random() < 0.7:
+        return index, REBUT
+    return index, AGREE
+
+
+def greedy_attack(player: Player, rng: random.Random):
+    """总是打出可负担的最高 points，能多付 1 费就用辛辣点评。"""
+    options = _affordable(player)
+    if not options:
+        return None
+    index = max(options, key=lambda i: player.hand[i]["points"])
+    return index, HARSH if player.tp >= player.hand[index]["cost"] + 1 else FRIENDLY
+
+
+def greedy_defend(player: Player, attack_card: dict, rng: random.Random):
+    """总是用可负担的最高 points 应对，能多付 1 费就反驳。"""
+    options = _affordable(player)
+    if not options:
+        return None
+    index = max(options, key=lambda i: player.hand[i]["points"])
+    return index, REBUT if player.tp >= player.hand[index]["cost"] + 1 else AGREE
+
+
+def random_attack(player: Player, rng: random.Random):
+    options = _affordable(player)
+    if not options:
+        return None
+    index = rng.choice(options)
+    can_harsh = player.tp >= player.hand[index]["cost"] + 1
+    return index, HARSH if can_harsh and rng.random() < 0.5 else FRIENDLY
+
+
+def random_defend(player: Player, attack_card: dict, rng: random.Random):
+    options = _affordable(player)
+    if not options or rng.random() < 0.2:
+        return None
+    index = rng.choice(options)
+    can_rebut = player.tp >= player.hand[index]["cost"] + 1
+    return index, REBUT if can_rebut and rng.random() < 0.5 else AGREE
+
+
+POLICIES: Dict[str, Tuple[Callable, Callable]] = {
+    "ai": (ai_attack, ai_defend),
+    "greedy": (greedy_attack, greedy_defend),
+    "random": (random_attack, random_defend),
+}
+
+
+# --- 对局 ---
+
+
+def play_game(
+    deck_a: List[dict],
+    deck_b: List[dict],
+    policy_a: str,
+    policy_b: str,
+    rng: random.Random,
+) -> dict:
+    """模拟一局。返回 {winner: 0/1/None, reason, turns, played: [A 打出的卡, B 打出的卡]}。"""
+    players = [Player(list(deck_a)), Player(list(deck_b))]
+    policies = [POLICIES[policy_a], POLICIES[policy_b]]
+    for player in players:
+        rng.shuffle(player.deck)
+        player.draw(INITIAL_HAND_SIZE)
+
+    bias = 0  # playerA 视角的话题偏向
+    winner, reason = None, "turn_limit"
+    turn = 1
+    while turn <= MAX_TURNS:
+        active = (turn - 1) % 2
+        for player in players:
+            player.tp = turn + 1
+        attacker, defender = players[active], players[1 - active]
+        attacker.draw(1)
+
+        decision = policies[active][0](attacker, rng)
+        if decision is not None:
+            attack_card = attacker.play(*decision)
+            attack_style = decision[1]
+            response = policies[1 - active][1](defender, attack_card, rng)
+            if response is None:
+                defense_points, defense_style = 0, AGREE
+            else:
+                defense_points = defender.play(*response)["points"]
+                defense_style = response[1]
+
+            outcome = classify(attack_card["points"] - defense_points)
+            attacker_rep, defender_rep, bias_delta = REWARDS[(defense_style, attack_style)][outcome]
+            attacker.reputation += attacker_rep
+            defender.reputation += defender_rep
+            bias += bias_delta if active == 0 else -bias_delta
+            bias = max(-BIAS_LIMIT, min(BIAS_LIMIT, bias))
+
+            if players[0].reputation <= 0 or players[1].reputation <= 0:
+                # 一次交锋只会扣一方的声望，不会同时归零
+                winner, reason = (1 if players[0].reputation <= 0 else 0), "reputation"
+                break
+            if abs(bias) >= BIAS_LIMIT:
+                winner, reason = (0 if bias > 0 else 1), "topic_bias"
+                break
+        turn += 1
+
+    if reason == "turn_limit":
+        turn = MAX_TURNS
+        a, b = players[0].reputation, players[1].reputation
+        winner = 0 if a > b else 1 if b > a else None
+    return {
+        "winner": winner,
+        "reason": reason,
+        "turns": turn,
+        "played": [players[0].played, players[1].played],
+    }
+
+
+# --- 卡组 ---
+
+
+def load_catalog(path: str = ANIME_INPUT_PATH) -> Dict[int, dict]:
+    """读取精选番剧卡，只保留对战用到的字段。"""
+    catalog = {}
+    for item in iter_records(path):
+        catalog[item["id"]] = {
+            "id": item["id"],
+            "name": item.get("name", ""),
+            "cost": int(item["cost"]),
+            "points": int(item["points"]),
+            "rarity": item.get("rarity", "N"),
+            "tags": frozenset(item.get("synergy_tags") or ()),
+        }
+    return catalog
+
+
+def load_decks(path: str, catalog: Dict[int, dict]) -> List[dict]:
+    """读取卡组文件，丢弃目录中不存在的卡牌 ID。"""
+    with open(path, "r", encoding="utf-8") as f:
+        raw = json.load(f)
+    decks = []
+    for i, entry in enumerate(raw):
+        ids = [card_id for card_id in entry["anime"] if card_id in catalog]
+        missing = len(entry["anime"]) - len(ids)
+        name = entry.get("name") or entry.get("id") or f"deck_{i}"
+        if missing:
+            logging.warning(f"卡组 {name} 中有 {missing} 张卡不在目录中，已忽略。")
+        if ids:
+            decks.append({"name": name, "anime": ids})
+    if len(decks) < 1:
+        raise ValueError(f"{path} 中没有可用的卡组")
+    return decks
+
+
+def random_deck(by_cost: Dict[int, List[int]], all_ids: List[int], rng: random.Random) -> List[int]:
+    """按理想费用曲线不重复地抽 30 张，某费段不足时从剩余卡牌中随机补齐。"""
+    chosen: List[int] = []
+    for cost, count in IDEAL_MANA_CURVE.items():
+        pool = by_cost.get(cost, [])
+        chosen.extend(rng.sample(pool, min(count, len(pool))))
+    if len(chosen) < DECK_SIZE:
+        taken = set(chosen)
+        rest = [card_id for card_id in all_ids if card_id not in taken]
+        chosen.extend(rng.sample(rest, min(DECK_SIZE - len(chosen), len(rest))))
+    return chosen
+
+
+# --- 批量运行 ---
+
+
+def _init_worker(inputs: dict):
+    global _inputs
+    _inputs = inputs
+
+
+def _game_rng(seed: int, index: int) -> random.Random:
+    return random.Random(f"{seed}:{index}")
+
+
+def _run_chunk(task: Tuple[int, int]) -> dict:
+    """在工作进程中运行 [start, stop) 号对局，返回局部统计。"""
+    start, stop = task
+    inputs = _inputs
+    catalog = inputs["catalog"]
+    decks = inputs["decks"]
+    policies = inputs["policies"]
+    stats = _empty_stats()
+
+    for index in range(start, stop):
+        rng = _game_rng(inputs["seed"], index)
+        if decks:
+            deck_ids = [rng.choice(decks)["anime"] for _ in range(2)]
+        else:
+            deck_ids = [random_deck(inputs["by_cost"], inputs["all_ids"], rng) for _ in range(2)]
+        # 偶数局 0 号策略先手，奇数局交换座位
+        seats = (0, 1) if index % 2 == 0 else (1, 0)
+        result = play_game(
+            [catalog[i] for i in deck_ids[seats[0]]],
+            [catalog[i] for i in deck_ids[seats[1]]],
+            policies[seats[0]],
+            policies[seats[1]],
+            rng,
+        )
+        _record(stats, result, [deck_ids[s] for s in seats], seats)
+    return stats
+
+
+def _new_entry() -> list:
+    # [入选卡组次数, 入选时得分, 打出次数, 打出时得分]
+    return [0, 0.0, 0, 0.0]
+
+
+def _empty_stats() -> dict:
+    return {
+        "games": 0,
+        "first_player_score": 0.0,
+        "policy_score": [0.0, 0.0],
+        "draws": 0,
+        "turns": 0,
+        "reasons": Counter(),
+        # 卡牌 ID -> _new_entry()
+        "cards": defaultdict(_new_entry),
+    }
+
+
+def _record(stats: dict, result: dict, seat_decks: List[List[int]], seats: Tuple[int, int]):
+    """胜 1 分、平 0.5 分、负 0 分，按座位累计到策略与卡牌上。"""
+    winner = result["winner"]
+    scores = [0.5, 0.5] if winner is None else [1.0 - winner, float(winner)]
+    stats["games"] += 1
+    stats["draws"] += winner is None
+    stats["turns"] += result["turns"]
+    stats["reasons"][result["reason"]] += 1
+    stats["first_player_score"] += scores[0]
+    for seat in range(2):
+        score = scores[seat]
+        stats["policy_score"][seats[seat]] += score
+        # 同一张卡在卡组中只计一次，重复打出也只计一次
+        for card_id in set(seat_decks[seat]):
+            entry = stats["cards"][card_id]
+            entry[0] += 1
+            entry[1] += score
+        for card_id in set(result["played"][seat]):
+            entry = stats["cards"][card_id]
+            entry[2] += 1
+            entry[3] += score
+
+
+def _merge(total: dict, part: dict):
+    for key in ("games", "first_player_score", "draws", "turns"):
+        total[key] += part[key]
+    for i in range(2):
+        total["policy_score"][i] += part["policy_score"][i]
+    total["reasons"].update(part["reasons"])
+    for card_id, values in part["cards"].items():
+        entry = total["cards"][card_id]
+        for i, value in enumerate(values):
+            entry[i] += value
+
+
+def _rate(score: float, games: int) -> Optional[float]:
+    return round(score / games, 4) if games else None
+
+
+def build_report(stats: dict, catalog: Dict[int, dict], meta: dict) -> dict:
+    """整理为报告：总体、按卡牌、按费用、按稀有度的胜率。"""
+    cards = []
+    groups = {"cost": defaultdict(_new_entry), "rarity": defaultdict(_new_entry)}
+    for card_id, (in_deck, deck_score, played, played_score) in stats["cards"].items():
+        card = catalog[card_id]
+        cards.append(
+            {
+                "id": card_id,
+                "name": card["name"],
+                "cost": card["cost"],
+                "points": card["points"],
+                "rarity": card["rarity"],
+                "in_deck": in_deck,
+                "deck_win_rate": _rate(deck_score, in_deck),
+                "played": played,
+                "played_win_rate": _rate(played_score, played),
+            }
+        )
+        for field in groups:
+            entry = groups[field][card[field]]
+            entry[0] += in_deck
+            entry[1] += deck_score
+            entry[2] += played
+            entry[3] += played_score
+    cards.sort(key=lambda c: (c["played_win_rate"] is None, -(c["played_win_rate"] or 0)))
+
+    def summarize(group: dict, order: List) -> Dict[str, dict]:
+        return {
+            str(key): {
+                "in_deck": group[key][0],
+                "deck_win_rate": _rate(group[key][1], group[key][0]),
+                "played": group[key][2],
+                "played_win_rate": _rate(group[key][3], group[key][2]),
+            }
+            for key in order
+            if key in group
+        }
+
+    games = stats["games"]
+    return {
+        "meta": meta,
+        "summary": {
+            "games": games,
+            "policy_win_rate": {
+                meta["policies"][i]: _rate(stats["policy_score"][i], games) for i in range(2)
+            }
+            if meta["policies"][0] != meta["policies"][1]
+            else None,
+            "first_player_win_rate": _rate(stats["first_player_score"], games),
+            "draw_rate": _rate(stats["draws"], games),
+            "mean_turns": round(stats["turns"] / games, 2) if games else None,
+            "end_reasons": dict(stats["reasons"]),
+        },
+        "by_cost": summarize(groups["cost"], sorted(groups["cost"])),
+        "by_rarity": summarize(groups["rarity"], RARITY_ORDER),
+        "cards": cards,
+    }
+
+
+def run_simulation(
+    catalog: Dict[int, dict],
+    games: int,
+    workers: int,
+    seed: int,
+    policies: Tuple[str, str],
+    decks: Optional[List[dict]] = None,
+    chunk_size: int = 500,
+) -> dict:
+    """把对局按序号切块分给工作进程，合并各块的统计。"""
+    by_cost: Dict[int, List[int]] = defaultdict(list)
+    for card_id, card in catalog.items():
+        by_cost[card["cost"]].append(card_id)
+    inputs = {
+        "catalog": catalog,
+        "decks": decks,
+        "policies": policies,
+        "seed": seed,
+        "by_cost": dict(by_cost),
+        "all_ids": sorted(catalog),
+    }
+    tasks = [(start, min(start + chunk_size, games)) for start in range(0, games, chunk_size)]
+    total = _empty_stats()
+    if workers <= 1:
+        _init_worker(inputs)
+        for task in tasks:
+            _merge(total, _run_chunk(task))
+        return total
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(inputs,)
+    ) as pool:
+        for part in pool.map(_run_chunk, tasks):
+            _merge(total, part)
+    return total
+
+
+def _fmt_rate(rate: Optional[float]) -> str:
+    return "   -  " if rate is None else f"{rate * 100:5.1f}%"
+
+
+def print_report(report: dict, top: int = 10):
+    summary = report["summary"]
+    print(
+        f"共 {summary['games']} 局，先手胜率 {_fmt_rate(summary['first_player_win_rate'])}，"
+        f"平局率 {_fmt_rate(summary['draw_rate'])}，平均 {summary['mean_turns']} 回合，"
+        f"结束原因 {summary['end_reasons']}"
+    )
+    if summary["policy_win_rate"]:
+        print("策略胜率: " + "  ".join(
+            f"{name} {_fmt_rate(rate)}" for name, rate in summary["policy_win_rate"].items()
+        ))
+    for title, key in (("费用", "by_cost"), ("稀有度", "by_rarity")):
+        print(f"\n{title:<6} {'入选':>8} {'入选胜率':>8} {'打出':>8} {'打出胜率':>8}")
+        for name, row in report[key].items():
+            print(
+                f"{name:<8} {row['in_deck']:>8} {_fmt_rate(row['deck_win_rate']):>10}"
+                f" {row['played']:>8} {_fmt_rate(row['played_win_rate']):>10}"
+            )
+    ranked = [c for c in report["cards"] if c["played"]]
+    for title, rows in (("打出胜率最高", ranked[:top]), ("打出胜率最低", ranked[-top:][::-1])):
+        print(f"\n{title}:")
+        for c in rows:
+            print(
+                f"  {_fmt_rate(c['played_win_rate'])}  打出 {c['played']:>6}  "
+                f"{c['rarity']:<3} {c['cost']}费/{c['points']}点  {c['name']}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="无界面对战模拟")
+    parser.add_argument("-n", "--games", type=int, default=10000, help="对局数")
+    parser.add_argument(
+        "-w", "--workers", type=int, default=os.cpu_count(), help="工作进程数"
+    )
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    parser.add_argument("-i", "--input", default=ANIME_INPUT_PATH, help="精选番剧卡文件")
+    parser.add_argument("-d", "--decks", default=None, help="卡组文件（默认每局随机组卡）")
+    parser.add_argument("--policy-a", choices=sorted(POLICIES), default="ai", help="0 号策略")
+    parser.add_argument("--policy-b", choices=sorted(POLICIES), default="ai", help="1 号策略")
+    parser.add_argument("-r", "--report", default=REPORT_PATH, help="报告输出路径")
+    args = parser.parse_args()
+
+    catalog = load_catalog(args.input)
+    decks = load_decks(args.decks, catalog) if args.decks else None
+    policies = (args.policy_a, args.policy_b)
+    logging.info(
+        f"已加载 {len(catalog)} 张番剧卡，开始模拟 {args.games} 局"
+        f"（{policies[0]} vs {policies[1]}，{args.workers} 个进程）..."
+    )
+    stats = run_simulation(catalog, args.games, args.workers, args.seed, policies, decks)
+    report = build_report(
+        stats,
+        catalog,
+        {
+            "input": args.input,
+            "decks": args.decks,
+            "policies": list(policies),
+            "seed": args.seed,
+        },
+    )
+    print_report(report)
+
+    os.makedirs(os.path.dirname(args.report) or ".", exist_ok=True)
+    with open(args.report, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    logging.info(f"模拟报告已保存到: {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+serverless 冷启动基准测试：导入耗时与首个请求耗时
+
+每一轮都启动一个全新的 Python 进程，模拟一次冷启动：
+进程启动 → 导入入口模块（计时：import）→ 直接调用其 WSGI app 处理第一个请求
+（计时：first_request）→ 再处理同一请求一次（计时：warm_request）。
+另外记录父进程看到的整个子进程耗时（process，含解释器启动）。
+每个阶段报告多轮的中位数与 p90（毫秒）。
+
+可以同时测多个入口做对比，例如与 baseline 的入口比较：
+    git show baseline:api/index.py > /tmp/index_flask.py
+    python backend/benchmarks/bench_cold_start.py -m api/index.py -m /tmp/index_flask.py
+
+默认请求 /api/all_animes?limit=50（需先运行 api/build_snapshot.py）。
+
+用法（在项目根目录执行）：
+    python backend/benchmarks/bench_cold_start.py
+    python backend/benchmarks/bench_cold_start.py -r "/api/user/data?username=demo" -n 30 -o report.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent.parent
+
+DEFAULT_MODULE = project_root / "api" / "index.py"
+DEFAULT_ROUTE = "/api/all_animes?limit=50"
+
+# 子进程中执行：导入入口模块并用 WSGI 调用处理请求，打印各阶段耗时（秒）
+CHILD = r"""
+import importlib.util, io, json, sys, time
+start = time.perf_counter()
+path, route = sys.argv[1], sys.argv[2]
+spec = importlib.util.spec_from_file_location("cold_start_entry", path)
+module = importlib.util.module_from_spec(spec)
+sys.modules[spec.name] = module
+spec.loader.exec_module(module)
+imported = time.perf_counter()
+
+def call(route):
+    path, _, query = route.partition("?")
+    environ = {
+        "REQUEST_METHOD": "GET", "PATH_INFO": path, "QUERY_STRING": query,
+        "SERVER_NAME": "localhost", "SERVER_PORT": "80", "SERVER_PROTOCOL": "HTTP/1.1",
+        "wsgi.input": io.BytesIO(), "wsgi.errors": sys.stderr, "wsgi.url_scheme": "http",
+        "wsgi.version": (1, 0), "wsgi.multithread": False, "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    status = []
+    body = b"".join(module.app(environ, lambda s, h, exc_info=None: status.append(s)))
+    return status[0], len(body)
+
+status, size = call(route)
+first = time.perf_counter()
+call(route)
+warm = time.perf_counter()
+print(json.dumps({
+    "import": imported - start, "first_request": first - imported,
+    "warm_request": warm - first, "status": status, "bytes": size,
+    "modules": len(sys.modules),
+}))
+"""
+
+PHASES = ("process", "import", "first_request", "warm_request")
+
+
+def run_once(module: Path, route: str) -> dict:
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD, str(module), route],
+        capture_output=True,
+        text=True,
+        cwd=str(module.parent),
+    )
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"{module} 运行失败:\n{result.stderr}")
+    sample = json.loads(result.stdout.strip().splitlines()[-1])
+    sample["process"] = elapsed
+    return sample
+
+
+def summarize(samples: list) -> dict:
+    summary = {}
+    for phase in PHASES:
+        values = sorted(s[phase] * 1000 for s in samples)
+        p90 = values[min(len(values) - 1, int(round(0.9 * (len(values) - 1))))]
+        summary[phase] = {"median_ms": round(statistics.median(values), 2), "p90_ms": round(p90, 2)}
+    summary["status"] = samples[-1]["status"]
+    summary["bytes"] = samples[-1]["bytes"]
+    summary["modules"] = samples[-1]["modules"]
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="serverless 冷启动基准测试")
+    parser.add_argument(
+        "-m",
+        "--module",
+        action="append",
+        default=None,
+        help="入口模块路径（需导出 WSGI app），可重复；默认 api/index.py",
+    )
+    parser.add_argument("-r", "--route", default=DEFAULT_ROUTE, help="首个请求的路径与查询串")
+    parser.add_argument("-n", "--runs", type=int, default=20, help="每个入口的冷启动次数")
+    parser.add_argument("-o", "--output", default=None, help="JSON 报告输出路径")
+    args = parser.parse_args()
+
+    modules = [Path(m).resolve() for m in (args.module or [DEFAULT_MODULE])]
+    report = {"route": args.route, "runs": args.runs, "python": sys.version.split()[0], "modules": {}}
+    for module in modules:
+        print(f"测量 {module}（{args.runs} 次冷启动，请求 {args.route}）...")
+        run_once(module, args.route)  # 预热磁盘缓存，不计入结果
+        samples = [run_once(module, args.route) for _ in range(args.runs)]
+        report["modules"][str(module)] = summarize(samples)
+
+    print(f"\n{'入口':<40}{'阶段':<16}{'中位数(ms)':>12}{'p90(ms)':>12}")
+    for module, summary in report["modules"].items():
+        name = module if len(module) <= 38 else "..." + module[-35:]
+        for phase in PHASES:
+            print(
+                f"{name:<40}{phase:<16}{summary[phase]['median_ms']:>12.2f}"
+                f"{summary[phase]['p90_ms']:>12.2f}"
+            )
+            name = ""
+        print(
+            f"{'':<40}{'响应':<16}{summary['status']:>12}，{summary['bytes']} 字节，"
+            f"已加载 {summary['modules']} 个模块"
+        )
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"报告已保存到: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
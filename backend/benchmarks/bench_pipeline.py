@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据管线基准测试
+
+对每个规模（默认 1k / 10k，可加 100k）：
+1. 以子进程运行 synthetic_data.py，在临时目录生成 raw_cards；
+2. 以该临时目录为工作目录，依次以子进程运行各管线脚本：
+   process_cards → process_character_data → create_curated_dataset
+   → analyze_synergies → synergy_index → balance_sweep（小网格）；
+3. 记录每个阶段的耗时、子进程峰值 RSS 与退出码，以及整条管线的总耗时；
+   支持 --trace 的脚本还会附上其内部各区段的耗时（见 instrumentation.py）。
+
+Linux 的 ru_maxrss 会继承 fork 时父进程的驻留内存，因此本脚本自身不持有
+生成的数据，所有工作都放在子进程中完成。
+
+结果写入 JSON 报告（附带 git 提交、Python 版本与平台信息），
+用 --compare 指定旧报告即可逐阶段对比耗时与内存变化。
+
+用法（在项目根目录执行）：
+    python backend/benchmarks/bench_pipeline.py --scales 1000 10000 100000
+    python backend/benchmarks/bench_pipeline.py --compare old_report.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+project_root = Path(__file__).resolve().parent.parent.parent
+
+BACKEND_DIR = project_root / "backend"
+DEFAULT_SCALES = [1000, 10000]
+SWEEP_GRID = {"CLAMP_LOW": [-2, -1], "TOP_CHAR_PER_ANIME": [3, 5]}
+
+
+def pipeline_stages(data_root: Path) -> List[dict]:
+    """各阶段的命令行，均以 data_root 为工作目录运行。"""
+    py = sys.executable
+    return [
+        {
+            "name": "process_cards",
+            "cmd": [py, str(BACKEND_DIR / "process_cards.py")],
+            "traced": True,
+        },
+        {
+            "name": "process_character_data",
+            "cmd": [py, str(BACKEND_DIR / "process_character_data.py")],
+            "traced": True,
+        },
+        {
+            "name": "create_curated_dataset",
+            "cmd": [py, str(BACKEND_DIR / "create_curated_dataset.py")],
+            "traced": True,
+        },
+        {
+            "name": "analyze_synergies",
+            "cmd": [
+                py,
+                str(BACKEND_DIR / "analyze_synergies.py"),
+                "--input",
+                str(data_root / "data" / "anime" / "all_cards.json"),
+            ],
+        },
+        {
+            "name": "synergy_index",
+            "cmd": [
+                py,
+                str(BACKEND_DIR / "synergy_index.py"),
+                "--input",
+                str(data_root / "data" / "anime" / "all_cards.json"),
+                "--output",
+                str(data_root / "data" / "cache" / "anime.synergy.npz"),
+            ],
+        },
+        {
+            "name": "balance_sweep",
+            "cmd": [
+                py,
+                str(BACKEND_DIR / "balance_sweep.py"),
+                "--grid",
+                str(data_root / "sweep_grid.json"),
+                "--workers",
+                "2",
+                "--report",
+                str(data_root / "data" / "balance_sweep_report.json"),
+            ],
+        },
+    ]
+
+
+def run_stage(cmd: List[str], cwd: Path, log_path: Path) -> dict:
+    """运行一个阶段，返回 {seconds, peak_rss_mb, returncode}。"""
+    env = dict(os.environ, PYTHONPATH=str(BACKEND_DIR))
+    with open(log_path, "w", encoding="utf-8") as log:
+        start = time.perf_counter()
+        proc = subprocess.Popen(cmd, cwd=cwd, env=env, stdout=log, stderr=subprocess.STDOUT)
+        # wait4 拿到的是该子进程（含其已回收的子进程）的资源占用
+        _, status, usage = os.wait4(proc.pid, 0)
+        seconds = time.perf_counter() - start
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    return {
+        "seconds": round(seconds, 3),
+        # Linux 上 ru_maxrss 单位为 KB，macOS 上为字节
+        "peak_rss_mb": round(
+            usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1
+        ),
+        "returncode": proc.returncode,
+    }
+
+
+def bench_scale(anime_count: int, seed: int, keep: bool) -> dict:
+    work_dir = Path(tempfile.mkdtemp(prefix=f"animeplay_bench_{anime_count}_"))
+    try:
+        generated = run_stage(
+            [
+                sys.executable,
+                str(Path(__file__).resolve().parent / "synthetic_data.py"),
+                "--anime",
+                str(anime_count),
+                "--output",
+                str(work_dir),
+                "--seed",
+                str(seed),
+            ],
+            work_dir,
+            work_dir / "generate.log",
+        )
+        if generated["returncode"] != 0:
+            raise RuntimeError(f"生成合成数据失败，日志见 {work_dir / 'generate.log'}")
+        character_count = len(os.listdir(work_dir / "data" / "character" / "raw_cards"))
+        with open(work_dir / "sweep_grid.json", "w", encoding="utf-8") as f:
+            json.dump(SWEEP_GRID, f)
+        print(
+            f"[{anime_count}] 已生成 {anime_count} 部番剧、{character_count} 个角色"
+            f"（{generated['seconds']:.1f}s）: {work_dir}"
+        )
+
+        stages: Dict[str, dict] = {}
+        total = 0.0
+        for stage in pipeline_stages(work_dir):
+            cmd = stage["cmd"]
+            trace_path = work_dir / f"{stage['name']}.trace.json"
+            if stage.get("traced"):
+                cmd = cmd + ["--trace", str(trace_path)]
+            result = run_stage(cmd, work_dir, work_dir / f"{stage['name']}.log")
+            if trace_path.exists():
+                with open(trace_path, "r", encoding="utf-8") as f:
+                    trace = json.load(f)
+                result["spans"] = {
+                    name: {
+                        "calls": span["calls"],
+                        "self_seconds": round(span["self_seconds"], 3),
+                    }
+                    for name, span in trace["spans"].items()
+                }
+            stages[stage["name"]] = result
+            total += result["seconds"]
+            print(
+                f"[{anime_count}] {stage['name']:<24} {result['seconds']:>8.2f}s"
+                f"  {result['peak_rss_mb']:>8.1f} MB  exit={result['returncode']}"
+            )
+            if result["returncode"] != 0:
+                print(f"[{anime_count}] 阶段失败，日志见 {work_dir / (stage['name'] + '.log')}")
+                keep = True
+                break
+
+        return {
+            "anime": anime_count,
+            "characters": character_count,
+            "generate_seconds": generated["seconds"],
+            "pipeline_seconds": round(total, 3),
+            "peak_rss_mb": max(s["peak_rss_mb"] for s in stages.values()),
+            "stages": stages,
+        }
+    finally:
+        if keep:
+            print(f"[{anime_count}] 保留工作目录: {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=project_root,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _delta(new: float, old: float) -> str:
+    if not old:
+        return "   n/a"
+    return f"{(new - old) / old * 100:+6.1f}%"
+
+
+def compare_reports(new: dict, old: dict):
+    """逐规模、逐阶段打印与旧报告的差异。"""
+    print(f"\n对比 {old['meta'].get('commit')} → {new['meta'].get('commit')}")
+    print(f"{'规模/阶段':<32} {'耗时(s)':>18} {'变化':>8} {'峰值RSS(MB)':>20} {'变化':>8}")
+    for scale, result in new["scales"].items():
+        previous = old["scales"].get(scale)
+        if not previous:
+            continue
+        rows = [("total", result["pipeline_seconds"], previous["pipeline_seconds"],
+                 result["peak_rss_mb"], previous["peak_rss_mb"])]
+        for name, stage in result["stages"].items():
+            prev_stage = previous["stages"].get(name)
+            if prev_stage:
+                rows.append((name, stage["seconds"], prev_stage["seconds"],
+                             stage["peak_rss_mb"], prev_stage["peak_rss_mb"]))
+        for name, secs, old_secs, rss, old_rss in rows:
+            print(
+                f"{scale + '/' + name:<32} {old_secs:>8.2f} → {secs:<8.2f}{_delta(secs, old_secs):>8}"
+                f" {old_rss:>9.1f} → {rss:<9.1f}{_delta(rss, old_rss):>8}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="数据管线基准测试")
+    parser.add_argument(
+        "-s", "--scales", type=int, nargs="+", default=DEFAULT_SCALES, help="番剧数量规模"
+    )
+    parser.add_argument("--seed", type=int, default=42, help="合成数据随机种子")
+    parser.add_argument(
+        "-o",
+        "--output",
+        default=None,
+        help="报告输出路径（默认 data/benchmarks/pipeline_<commit>.json）",
+    )
+    parser.add_argument("-c", "--compare", default=None, help="与之对比的旧报告")
+    parser.add_argument("--keep", action="store_true", help="保留生成的临时数据目录")
+    args = parser.parse_args()
+
+    commit = git_commit()
+    report = {
+        "meta": {
+            "commit": commit,
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "seed": args.seed,
+        },
+        "scales": {},
+    }
+    for scale in args.scales:
+        report["scales"][str(scale)] = bench_scale(scale, args.seed, args.keep)
+
+    output = args.output or str(
+        project_root / "data" / "benchmarks" / f"pipeline_{commit or 'unknown'}.json"
+    )
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n基准报告已保存到: {output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare_reports(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
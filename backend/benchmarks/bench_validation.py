@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+响应校验基准测试：完整 pydantic 校验 vs light 模式（见 bangumi_api.set_validation）
+
+输入是录制的原始 API 响应（fixtures.py 的夹具目录，见 data_fetcher.py --record）：
+每个番剧取条目详情 /v0/subjects/<id> 与关联角色列表 /v0/subjects/<id>/characters，
+按抓取脚本的实际用法逐条回放：_parse → 读取用到的字段 → model_dump(mode="json")。
+两种模式交替各跑若干轮（取最快一轮），另测只做 json 解析的基线，
+报告每条响应的耗时、扣除 json 解析后的校验开销与加速比，
+并逐条核对 light 模式 dump 出的 JSON 与完整校验的结果一致。
+
+没有夹具时退回 --input：把 data_fetcher.py 落盘的记录还原成响应。这些记录本身就是
+完整校验的 dump 结果，API 新增的字段与类型偏差已被抹掉，只能用来测速，
+一致性核对在这种输入下没有意义。
+
+用法（在项目根目录执行）：
+    python backend/benchmarks/bench_validation.py --fixtures data/fixtures/bangumi
+    python backend/benchmarks/bench_validation.py --input /tmp/bench_10k/data/anime/raw_cards -r 3
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from backend.bangumi_asset import bangumi_api  # noqa: E402
+from backend.bangumi_asset.models import RelatedCharacter, Subject  # noqa: E402
+
+DEFAULT_INPUT = project_root / "data" / "anime" / "raw_cards"
+DEFAULT_FIXTURES = project_root / "data" / "fixtures" / "bangumi"
+SUBJECT_PATH = re.compile(r"^/v0/subjects/(\d+)(/characters)?$")
+
+
+class RecordedResponse:
+    """只实现 _parse 用到的 json()，每次都从原始字节重新解析。"""
+
+    def __init__(self, body: bytes):
+        self.body = body
+
+    def json(self):
+        return json.loads(self.body)
+
+
+def load_fixtures(fixture_dir: Path, limit: int) -> List[Tuple[bytes, bytes]]:
+    """从录制的夹具中取出 (条目响应, 关联角色响应) 的原始字节，只保留两者都录到的番剧。"""
+    subjects, characters = {}, {}
+    for path in fixture_dir.glob("*.json"):
+        if path.name.startswith(".tmp_"):
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            fixture = json.load(f)
+        match = SUBJECT_PATH.match(fixture.get("path", ""))
+        if not match or fixture.get("method") != "GET" or fixture.get("status") != 200:
+            continue
+        target = characters if match.group(2) else subjects
+        target[int(match.group(1))] = fixture["content"].encode("utf-8")
+    ids = sorted(subjects.keys() & characters.keys())[: limit or None]
+    return [(subjects[i], characters[i]) for i in ids]
+
+
+def load_responses(input_dir: Path, limit: int) -> List[Tuple[bytes, bytes]]:
+    """把落盘的番剧记录还原成 (条目响应, 关联角色响应) 的原始字节（仅用于测速）。"""
+    aliases = {name: alias for alias, name in bangumi_api._RATING_COUNT_NAMES.items()}
+    responses = []
+    for path in sorted(input_dir.glob("*.json"))[: limit or None]:
+        with open(path, "r", encoding="utf-8") as f:
+            record = json.load(f)
+        characters = record.pop("main_characters", None) or []
+        record.pop("main_character_ids", None)
+        rating = record.get("rating")
+        if rating and isinstance(rating.get("count"), dict):
+            rating["count"] = {aliases.get(k, k): v for k, v in rating["count"].items()}
+        responses.append(
+            (
+                json.dumps(record, ensure_ascii=False).encode("utf-8"),
+                json.dumps(characters, ensure_ascii=False).encode("utf-8"),
+            )
+        )
+    return responses
+
+
+def replay(responses) -> list:
+    """按 data_fetcher.save_anime 的用法处理每对响应，返回 dump 出的 JSON。"""
+    dumps = []
+    for subject_body, characters_body in responses:
+        subject = bangumi_api._parse(RecordedResponse(subject_body), Subject)
+        characters = bangumi_api._parse(
+            RecordedResponse(characters_body), RelatedCharacter, many=True
+        )
+        main = [c for c in characters if c.relation == "主角"]
+        anime_data = subject.model_dump(mode="json")
+        anime_data["main_character_ids"] = [c.id for c in main]
+        anime_data["main_characters"] = [c.model_dump(mode="json", by_alias=True) for c in main]
+        dumps.append(anime_data)
+    return dumps
+
+
+def parse_only(responses) -> list:
+    """基线：只做 json 解析。"""
+    return [(json.loads(a), json.loads(b)) for a, b in responses]
+
+
+def bench(responses, rounds: int) -> Tuple[dict, dict]:
+    """各模式交替运行，返回 {模式: 最快一轮秒数} 与各模式的 dump 结果。"""
+    best = {"json": float("inf")}
+    best.update({mode: float("inf") for mode in bangumi_api.VALIDATION_MODES})
+    dumps = {}
+    for _ in range(rounds):
+        start = time.perf_counter()
+        parse_only(responses)
+        best["json"] = min(best["json"], time.perf_counter() - start)
+        for mode in bangumi_api.VALIDATION_MODES:
+            bangumi_api.set_validation(mode)
+            start = time.perf_counter()
+            dumps[mode] = replay(responses)
+            best[mode] = min(best[mode], time.perf_counter() - start)
+    bangumi_api.set_validation("full")
+    return best, dumps
+
+
+def main():
+    parser = argparse.ArgumentParser(description="响应校验基准测试")
+    parser.add_argument(
+        "-f", "--fixtures", default=str(DEFAULT_FIXTURES), help="录制的原始响应夹具目录"
+    )
+    parser.add_argument(
+        "-i",
+        "--input",
+        default=str(DEFAULT_INPUT),
+        help="没有夹具时使用的 data_fetcher.py 落盘番剧目录（仅测速）",
+    )
+    parser.add_argument("-n", "--limit", type=int, default=0, help="最多使用的记录数（0 为全部）")
+    parser.add_argument("-r", "--rounds", type=int, default=5, help="每种模式的轮数，取最快一轮")
+    parser.add_argument("-o", "--output", default=None, help="JSON 报告输出路径")
+    args = parser.parse_args()
+
+    responses = []
+    if os.path.isdir(args.fixtures):
+        responses = load_fixtures(Path(args.fixtures), args.limit)
+    recorded = bool(responses)
+    if not recorded:
+        print(f"{args.fixtures} 下没有录制的响应，改用 {args.input}（一致性核对不可信）。")
+        responses = load_responses(Path(args.input), args.limit)
+    if not responses:
+        print(f"{args.input} 下没有记录。")
+        return
+    n = len(responses)
+    size = sum(len(a) + len(b) for a, b in responses)
+    print(f"回放 {n} 对响应（{size / 1e6:.1f} MB），每种模式 {args.rounds} 轮...")
+
+    best, dumps = bench(responses, args.rounds)
+    results = {}
+    for mode, seconds in best.items():
+        overhead = max(seconds - best["json"], 0.0)
+        results[mode] = {
+            "seconds": round(seconds, 4),
+            "us_per_record": round(seconds / n * 1e6, 1),
+            "overhead_us_per_record": round(overhead / n * 1e6, 1),
+        }
+
+    mismatches = sum(1 for a, b in zip(dumps["full"], dumps["light"]) if a != b)
+    full, light = best["full"], best["light"]
+    overhead_ratio = (full - best["json"]) / max(light - best["json"], 1e-9)
+    print(f"\n{'模式':<8}{'总耗时(s)':>12}{'每条(us)':>12}{'校验开销(us)':>14}")
+    for mode, result in results.items():
+        print(
+            f"{mode:<8}{result['seconds']:>12.3f}{result['us_per_record']:>12.1f}"
+            f"{result['overhead_us_per_record']:>14.1f}"
+        )
+    print(
+        f"\n端到端加速比: {full / light:.1f}x；扣除 json 解析后: {overhead_ratio:.1f}x；"
+        f"dump 结果不一致的记录: {mismatches}/{n}" + ("" if recorded else "（输入非原始响应）")
+    )
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        report = {
+            "source": "fixtures" if recorded else "raw_cards",
+            "records": n,
+            "bytes": size,
+            "rounds": args.rounds,
+            "modes": results,
+            "speedup": round(full / light, 2),
+            "overhead_speedup": round(overhead_ratio, 2),
+            "mismatches": mismatches,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"报告已保存到: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
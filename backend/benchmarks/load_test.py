@@ -0,0 +1,562 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+后端 HTTP 压测工具：一个 server.py 进程能同时服务多少玩家
+
+只依赖标准库，基于 asyncio 实现一个极简的 HTTP/1.1 keep-alive 客户端。
+每个虚拟用户（-c 个）是一个闭环：按权重挑一个场景执行，等待一段思考时间
+（指数分布，均值 --think 毫秒），再挑下一个，直到 -d 秒结束。与浏览器一样，
+每个虚拟用户最多并行 6 条连接。
+
+场景按前端的真实请求方式编写（frontend-vue/src/stores）：
+
+- cold_boot：进入游戏时并行请求 /api/all_animes?limit=1000 与
+  /api/all_characters?limit=1000，另取一次存档；
+- images：卡牌列表一屏的图片 /data/images/{anime|character}/<id>.jpg，
+  一次 12 张并行；本地没有 data/images 时这些请求是 404，
+  报告中单独记为 missing，不算错误；
+- autosave：连续抽卡时的存档突发，短间隔内多次 POST /api/user/data，
+  存档取 data/user_data 中最大的真实存档（约 200KB），没有时按 --doc-kb 合成；
+- batch：POST /api/anime/batch 与 /api/characters/batch，每次各 50 个 ID。
+
+报告每个请求与场景的吞吐量、延迟分位数（p50/p90/p99/max）、错误率、状态码
+分布与传输字节数。--compare 与旧报告（例如提交在仓库中的基线
+backend/benchmarks/baselines/load_test.json）对比，p90 延迟或吞吐量变差超过
+--tolerance，或错误率上升时以非零状态退出。
+
+压测会写入 loadtest<n> 用户的存档，请用内存存储启动服务，以免写进 data/user_data：
+    USER_STORE_URL=memory:// python backend/server.py
+    python backend/benchmarks/load_test.py -u http://127.0.0.1:5001 -c 20 -d 30
+    python backend/benchmarks/load_test.py -s autosave -s batch -c 50 -o report.json
+    python backend/benchmarks/load_test.py --compare   # 与仓库中的基线对比
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+project_root = Path(__file__).resolve().parent.parent.parent
+
+DEFAULT_URL = "http://127.0.0.1:5001"
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baselines" / "load_test.json"
+# 场景 -> 默认权重（一个虚拟用户每轮按权重挑选）
+SCENARIO_WEIGHTS = {"cold_boot": 1, "images": 4, "autosave": 3, "batch": 2}
+MAX_CONNECTIONS = 6  # 浏览器对同一主机的并发连接上限
+IMAGES_PER_SCREEN = 12
+BATCH_SIZE = 50
+AUTOSAVE_BURST = 4
+AUTOSAVE_GAP = 0.25  # 一次突发中相邻两次存档的间隔（秒）
+
+
+# --- 极简 HTTP/1.1 客户端 ---
+class Connection:
+    """一条 keep-alive 连接，请求串行执行。"""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+
+    async def _connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+    async def request(
+        self, method: str, path: str, body: bytes = None, headers: Dict[str, str] = None
+    ) -> Tuple[int, bytes]:
+        """发送一个请求并读完响应；服务端关掉的空闲连接会重连一次。"""
+        for attempt in (0, 1):
+            fresh = self.writer is None
+            if fresh:
+                await self._connect()
+            try:
+                return await self._roundtrip(method, path, body, headers)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                self.close()
+                if fresh or attempt:
+                    raise
+
+    async def _roundtrip(self, method, path, body, headers) -> Tuple[int, bytes]:
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {self.host}:{self.port}"]
+        for name, value in (headers or {}).items():
+            lines.append(f"{name}: {value}")
+        if body is not None:
+            lines.append(f"Content-Length: {len(body)}")
+        head = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+        self.writer.write(head + body if body is not None else head)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionResetError("connection closed by server")
+        version, status = status_line.split(None, 2)[:2]
+        response_headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            response_headers[name.strip().lower()] = value.strip()
+
+        if response_headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await self.reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    await self.reader.readline()
+                    break
+                chunks.append(await self.reader.readexactly(size))
+                await self.reader.readline()
+            payload = b"".join(chunks)
+        elif "content-length" in response_headers:
+            payload = await self.reader.readexactly(int(response_headers["content-length"]))
+        else:
+            payload = await self.reader.read()
+            self.close()
+            return int(status), payload
+
+        connection = response_headers.get("connection", "").lower()
+        if connection == "close" or (version == b"HTTP/1.0" and connection != "keep-alive"):
+            self.close()
+        return int(status), payload
+
+
+class ConnectionPool:
+    """一个虚拟用户的连接池，最多 MAX_CONNECTIONS 条连接同时在用。"""
+
+    def __init__(self, host: str, port: int, size: int = MAX_CONNECTIONS):
+        self.host = host
+        self.port = port
+        self._idle: List[Connection] = []
+        self._slots = asyncio.Semaphore(size)
+
+    async def request(self, method, path, body=None, headers=None) -> Tuple[int, bytes]:
+        async with self._slots:
+            conn = self._idle.pop() if self._idle else Connection(self.host, self.port)
+            try:
+                result = await conn.request(method, path, body, headers)
+            except BaseException:
+                conn.close()
+                raise
+            self._idle.append(conn)
+            return result
+
+    def close(self):
+        for conn in self._idle:
+            conn.close()
+        self._idle.clear()
+
+
+# --- 结果统计 ---
+class Recorder:
+    """按请求名与场景名汇总延迟、状态码与字节数。"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Counter] = defaultdict(Counter)
+        self.bytes: Dict[str, int] = defaultdict(int)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.missing: Dict[str, int] = defaultdict(int)
+        self.scenarios: Dict[str, List[float]] = defaultdict(list)
+        self.scenario_errors: Dict[str, int] = defaultdict(int)
+        self.recording = True
+
+    def request(self, name: str, seconds: float, status, size: int, allow_missing=False):
+        if not self.recording:
+            return
+        self.latencies[name].append(seconds)
+        self.statuses[name][str(status)] += 1
+        self.bytes[name] += size
+        if allow_missing and status == 404:
+            self.missing[name] += 1
+        elif not isinstance(status, int) or status >= 400:
+            self.errors[name] += 1
+
+    def scenario(self, name: str, seconds: float, failed: bool):
+        if not self.recording:
+            return
+        self.scenarios[name].append(seconds)
+        if failed:
+            self.scenario_errors[name] += 1
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def latency_summary(samples: List[float], duration: float) -> dict:
+    values = sorted(s * 1000 for s in samples)
+    return {
+        "count": len(values),
+        "rps": round(len(values) / duration, 2) if duration else 0.0,
+        "mean_ms": round(sum(values) / len(values), 2) if values else 0.0,
+        "p50_ms": round(percentile(values, 0.50), 2),
+        "p90_ms": round(percentile(values, 0.90), 2),
+        "p99_ms": round(percentile(values, 0.99), 2),
+        "max_ms": round(values[-1], 2) if values else 0.0,
+    }
+
+
+def summarize(recorder: Recorder, duration: float) -> dict:
+    requests = {}
+    for name in sorted(recorder.latencies):
+        summary = latency_summary(recorder.latencies[name], duration)
+        count = summary["count"]
+        summary.update(
+            errors=recorder.errors[name],
+            error_rate=round(recorder.errors[name] / count, 4) if count else 0.0,
+            missing=recorder.missing[name],
+            statuses=dict(sorted(recorder.statuses[name].items())),
+            bytes=recorder.bytes[name],
+        )
+        requests[name] = summary
+    scenarios = {}
+    for name in sorted(recorder.scenarios):
+        summary = latency_summary(recorder.scenarios[name], duration)
+        summary["errors"] = recorder.scenario_errors[name]
+        scenarios[name] = summary
+
+    total = sum(r["count"] for r in requests.values())
+    errors = sum(r["errors"] for r in requests.values())
+    everything = [s for samples in recorder.latencies.values() for s in samples]
+    totals = latency_summary(everything, duration)
+    totals.update(
+        errors=errors,
+        error_rate=round(errors / total, 4) if total else 0.0,
+        bytes=sum(recorder.bytes.values()),
+    )
+    return {"totals": totals, "requests": requests, "scenarios": scenarios}
+
+
+# --- 场景 ---
+class LoadTest:
+    def __init__(self, base_url: str, doc: dict, seed: int, think: float):
+        url = urlsplit(base_url)
+        self.host = url.hostname or "127.0.0.1"
+        self.port = url.port or 80
+        self.prefix = url.path.rstrip("/")
+        self.doc = doc
+        self.think = think
+        self.random = random.Random(seed)
+        self.recorder = Recorder()
+        self.anime_ids: List[int] = []
+        self.character_ids: List[int] = []
+
+    async def call(
+        self,
+        pool: ConnectionPool,
+        name: str,
+        method: str,
+        path: str,
+        payload=None,
+        allow_missing: bool = False,
+    ) -> Tuple[Optional[int], bytes]:
+        body = headers = None
+        if payload is not None:
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            headers = {"Content-Type": "application/json"}
+        start = time.perf_counter()
+        try:
+            status, data = await pool.request(method, self.prefix + path, body, headers)
+        except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+            self.recorder.request(name, time.perf_counter() - start, type(e).__name__, 0)
+            return None, b""
+        self.recorder.request(name, time.perf_counter() - start, status, len(data), allow_missing)
+        return status, data
+
+    async def cold_boot(self, pool: ConnectionPool, user: str) -> bool:
+        results = await asyncio.gather(
+            self.call(pool, "GET all_animes?limit=1000", "GET", "/api/all_animes?limit=1000"),
+            self.call(
+                pool, "GET all_characters?limit=1000", "GET", "/api/all_characters?limit=1000"
+            ),
+            self.call(pool, "GET user/data", "GET", f"/api/user/data?username={user}"),
+        )
+        return all(status == 200 for status, _ in results)
+
+    async def images(self, pool: ConnectionPool, user: str) -> bool:
+        calls = []
+        for _ in range(IMAGES_PER_SCREEN):
+            kind, ids = self.random.choice(
+                [("anime", self.anime_ids), ("character", self.character_ids)]
+            )
+            card_id = self.random.choice(ids) if ids else 1
+            calls.append(
+                self.call(
+                    pool,
+                    f"GET images/{kind}",
+                    "GET",
+                    f"/data/images/{kind}/{card_id}.jpg",
+                    allow_missing=True,
+                )
+            )
+        results = await asyncio.gather(*calls)
+        return all(status in (200, 304, 404) for status, _ in results)
+
+    async def autosave(self, pool: ConnectionPool, user: str) -> bool:
+        ok = True
+        for i in range(AUTOSAVE_BURST):
+            if i:
+                await asyncio.sleep(AUTOSAVE_GAP)
+            status, _ = await self.call(
+                pool,
+                "POST user/data",
+                "POST",
+                "/api/user/data",
+                {"username": user, "payload": self.doc},
+            )
+            ok = ok and status == 200
+        return ok
+
+    async def batch(self, pool: ConnectionPool, user: str) -> bool:
+        anime = self.random.sample(self.anime_ids, min(BATCH_SIZE, len(self.anime_ids)))
+        characters = self.random.sample(
+            self.character_ids, min(BATCH_SIZE, len(self.character_ids))
+        )
+        results = await asyncio.gather(
+            self.call(pool, "POST anime/batch", "POST", "/api/anime/batch", {"ids": anime}),
+            self.call(
+                pool, "POST characters/batch", "POST", "/api/characters/batch", {"ids": characters}
+            ),
+        )
+        return all(status == 200 for status, _ in results)
+
+    async def prepare(self):
+        """预先取一次卡牌列表，得到图片与批量查询要用的 ID（不计入结果）。"""
+        pool = ConnectionPool(self.host, self.port)
+        self.recorder.recording = False
+        try:
+            _, animes = await self.call(pool, "prepare", "GET", "/api/all_animes?limit=1000")
+            _, characters = await self.call(
+                pool, "prepare", "GET", "/api/all_characters?limit=1000"
+            )
+        finally:
+            self.recorder.recording = True
+            pool.close()
+        try:
+            self.anime_ids = [a["id"] for a in json.loads(animes)]
+            self.character_ids = [c["id"] for c in json.loads(characters)["characters"]]
+        except (ValueError, KeyError, TypeError):
+            raise SystemExit(f"无法从 {self.host}:{self.port} 取得卡牌列表，服务是否已启动？")
+
+    async def virtual_user(self, index: int, weights: Dict[str, int], deadline: float):
+        pool = ConnectionPool(self.host, self.port)
+        user = f"loadtest{index}"
+        names, counts = list(weights), list(weights.values())
+        # 错开各虚拟用户的启动时间，避免第一轮请求同时到达
+        await asyncio.sleep(self.random.uniform(0, max(self.think, 0.05)))
+        try:
+            while time.perf_counter() < deadline:
+                name = self.random.choices(names, counts)[0]
+                start = time.perf_counter()
+                ok = await getattr(self, name)(pool, user)
+                self.recorder.scenario(name, time.perf_counter() - start, not ok)
+                if self.think:
+                    await asyncio.sleep(self.random.expovariate(1 / self.think))
+        finally:
+            pool.close()
+
+    async def run(self, concurrency: int, duration: float, weights: Dict[str, int]) -> float:
+        await self.prepare()
+        start = time.perf_counter()
+        deadline = start + duration
+        await asyncio.gather(
+            *(self.virtual_user(i, weights, deadline) for i in range(concurrency))
+        )
+        return time.perf_counter() - start
+
+
+def load_document(doc_kb: int, seed: int) -> Tuple[dict, str]:
+    """存档场景使用的文档：最大的真实存档，没有时合成一个约 doc_kb KB 的存档。"""
+    user_dir = project_root / "data" / "user_data"
+    files = sorted(user_dir.glob("*.json"), key=lambda p: p.stat().st_size, reverse=True)
+    for path in files:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f), str(path.relative_to(project_root))
+        except (OSError, ValueError):
+            continue
+
+    rng = random.Random(seed)
+    doc = {
+        "state": {"level": 30, "gold": 123456, "watchedAnime": [], "savedDecks": {}},
+        "animeCollection": [],
+        "characterCollection": [],
+        "animeHistory": [],
+        "characterHistory": [],
+    }
+    while len(json.dumps(doc)) < doc_kb * 1024:
+        card_id = rng.randint(1, 500000)
+        doc["characterCollection"].append([card_id, {"id": card_id, "count": rng.randint(1, 9)}])
+        doc["characterHistory"].append(
+            {"id": card_id, "rarity": rng.choice(["N", "R", "SR", "SSR"]), "time": rng.random()}
+        )
+    return doc, f"synthetic ({doc_kb} KB)"
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=project_root,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(report: dict):
+    header = (
+        f"{'请求':<32}{'次数':>8}{'rps':>9}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}"
+        f"{'错误率':>9}{'missing':>9}"
+    )
+    print("\n" + header)
+    rows = list(report["requests"].items()) + [("total", report["totals"])]
+    for name, r in rows:
+        print(
+            f"{name:<32}{r['count']:>8}{r['rps']:>9.1f}{r['p50_ms']:>9.1f}{r['p90_ms']:>9.1f}"
+            f"{r['p99_ms']:>9.1f}{r['max_ms']:>9.1f}{r['error_rate'] * 100:>8.2f}%"
+            f"{r.get('missing', ''):>9}"
+        )
+    print(f"\n{'场景':<32}{'次数':>8}{'rps':>9}{'p50':>9}{'p90':>9}{'p99':>9}{'失败':>9}")
+    for name, r in report["scenarios"].items():
+        print(
+            f"{name:<32}{r['count']:>8}{r['rps']:>9.1f}{r['p50_ms']:>9.1f}{r['p90_ms']:>9.1f}"
+            f"{r['p99_ms']:>9.1f}{r['errors']:>9}"
+        )
+    print("（延迟单位 ms）")
+
+
+def _delta(new: float, old: float) -> str:
+    if not old:
+        return "   n/a"
+    return f"{(new - old) / old * 100:+6.1f}%"
+
+
+def compare_reports(new: dict, old: dict, tolerance: float) -> List[str]:
+    """逐请求打印与旧报告的差异，返回超出容差的回归项。"""
+    print(f"\n对比 {old['meta'].get('commit')} → {new['meta'].get('commit')}（容差 {tolerance:.0%}）")
+    print(f"{'请求':<32}{'p90(ms)':>22}{'变化':>8}{'rps':>22}{'变化':>8}{'错误率':>18}")
+    regressions = []
+    rows = list(new["requests"].items()) + [("total", new["totals"])]
+    for name, result in rows:
+        previous = old["totals"] if name == "total" else old["requests"].get(name)
+        if not previous:
+            continue
+        print(
+            f"{name:<32}{previous['p90_ms']:>10.1f} → {result['p90_ms']:<9.1f}"
+            f"{_delta(result['p90_ms'], previous['p90_ms']):>8}"
+            f"{previous['rps']:>10.1f} → {result['rps']:<9.1f}"
+            f"{_delta(result['rps'], previous['rps']):>8}"
+            f"{previous['error_rate'] * 100:>8.2f}% → {result['error_rate'] * 100:.2f}%"
+        )
+        if previous["p90_ms"] and result["p90_ms"] > previous["p90_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p90 {previous['p90_ms']} → {result['p90_ms']} ms")
+        if previous["rps"] and result["rps"] < previous["rps"] * (1 - tolerance):
+            regressions.append(f"{name}: rps {previous['rps']} → {result['rps']}")
+        if result["error_rate"] > previous["error_rate"] + 0.01:
+            regressions.append(
+                f"{name}: 错误率 {previous['error_rate']:.2%} → {result['error_rate']:.2%}"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="后端 HTTP 压测")
+    parser.add_argument("-u", "--url", default=DEFAULT_URL, help="服务地址")
+    parser.add_argument("-c", "--concurrency", type=int, default=20, help="虚拟用户数")
+    parser.add_argument("-d", "--duration", type=float, default=30.0, help="压测时长（秒）")
+    parser.add_argument(
+        "-s",
+        "--scenario",
+        action="append",
+        choices=sorted(SCENARIO_WEIGHTS),
+        default=None,
+        help="只运行指定场景，可重复；默认按权重混合全部场景",
+    )
+    parser.add_argument("--think", type=float, default=500.0, help="平均思考时间（毫秒）")
+    parser.add_argument("--doc-kb", type=int, default=200, help="没有真实存档时合成存档的大小")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    parser.add_argument("-o", "--output", default=None, help="JSON 报告输出路径")
+    parser.add_argument(
+        "--compare",
+        nargs="?",
+        const=str(DEFAULT_BASELINE),
+        default=None,
+        help="与之对比的旧报告（不带路径时使用仓库中的基线）",
+    )
+    parser.add_argument(
+        "--tolerance", type=float, default=0.25, help="p90 延迟与吞吐量允许的相对变化"
+    )
+    args = parser.parse_args()
+
+    weights = (
+        {name: SCENARIO_WEIGHTS[name] for name in args.scenario}
+        if args.scenario
+        else dict(SCENARIO_WEIGHTS)
+    )
+    doc, doc_source = load_document(args.doc_kb, args.seed)
+    test = LoadTest(args.url, doc, args.seed, args.think / 1000.0)
+    print(
+        f"压测 {args.url}：{args.concurrency} 个虚拟用户，{args.duration:g} 秒，"
+        f"场景 {weights}，存档 {doc_source}"
+    )
+    elapsed = asyncio.run(test.run(args.concurrency, args.duration, weights))
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "url": args.url,
+            "concurrency": args.concurrency,
+            "duration": round(elapsed, 2),
+            "think_ms": args.think,
+            "scenarios": weights,
+            "document": doc_source,
+            "document_bytes": len(json.dumps(doc, ensure_ascii=False).encode("utf-8")),
+            "seed": args.seed,
+        },
+        **summarize(test.recorder, elapsed),
+    }
+    print_report(report)
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"报告已保存到: {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare_reports(report, json.load(f), args.tolerance)
+        if regressions:
+            print("\n性能回归：")
+            for line in regressions:
+                print(f"  - {line}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
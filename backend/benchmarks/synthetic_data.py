@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+合成数据生成器
+
+按指定规模生成与 data_fetcher.py 落盘格式一致的 raw_cards：
+- data/anime/raw_cards/{id}.json      Subject 模型字段 + main_character_ids / main_characters
+- data/character/raw_cards/{id}.json  Character 模型字段 + anime_ids
+
+各项分布参照当前真实数据（927 部番剧 / 2623 个角色）：评分约 N(7.6, 0.4)，
+评分人数呈对数正态，每部番 1~12 个主角，约四分之一的角色出现在同系列的多部作品中。
+同一 seed 生成的数据完全相同，便于跨提交对比基准结果。
+
+用法（在项目根目录执行）：
+    python backend/benchmarks/synthetic_data.py --anime 10000 --output /tmp/bench_10k
+"""
+
+import argparse
+import json
+import math
+import random
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+META_TAGS = [
+    ("漫画改", 0.57), ("原创", 0.24), ("奇幻", 0.17), ("战斗", 0.15), ("小说改", 0.14),
+    ("校园", 0.14), ("日常", 0.13), ("科幻", 0.12), ("恋爱", 0.11), ("百合", 0.10),
+    ("游戏改", 0.05), ("后宫", 0.04), ("运动", 0.04), ("机战", 0.035), ("悬疑", 0.03),
+    ("音乐", 0.03), ("冒险", 0.025), ("子供向", 0.02), ("少女向", 0.02), ("少年向", 0.02),
+    ("青年向", 0.016), ("喜剧", 0.014), ("历史", 0.014), ("推理", 0.013), ("剧情", 0.013),
+    ("穿越", 0.011), ("萌系", 0.009), ("职场", 0.008), ("美食", 0.008), ("惊悚", 0.004),
+]
+FREE_TAGS = [
+    "TV", "日本", "2010年", "2015年", "2020年", "京都动画", "MADHOUSE", "A-1Pictures",
+    "治愈", "热血", "搞笑", "催泪", "神作", "轻小说改", "续作", "泡面番", "人外",
+]
+NAME_CHARS = "の光空海風花星月夜雪桜剣魔法少女学園物語戦記伝説恋旅夢心世界王国騎士猫"
+CN_CHARS = "之光空海风花星月夜雪樱剑魔法少女学园物语战记传说恋旅梦心世界王国骑士猫"
+SURNAMES = "佐藤鈴木高橋田中渡辺伊藤山本中村小林加藤吉田山田松本井上木村林清水"
+GIVEN = "さくらゆいあかりみおりんなのはまどかほむら真一翔太健二美咲"
+RATING_KEYS = ["one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten"]
+
+
+def _text(rng: random.Random, alphabet: str, low: int, high: int) -> str:
+    return "".join(rng.choice(alphabet) for _ in range(rng.randint(low, high)))
+
+
+def _images(kind: str, item_id: int, with_common: bool) -> Dict[str, str]:
+    base = f"https://lain.bgm.tv/pic/{kind}/l/{item_id % 97:02x}/{item_id}.jpg"
+    images = {
+        "large": base,
+        "medium": base.replace("/pic/", "/r/400/pic/"),
+        "small": base.replace("/pic/", "/r/100/pic/"),
+        "grid": base.replace("/l/", "/g/"),
+    }
+    if with_common:
+        images["common"] = base.replace("/pic/", "/r/400/pic/")
+    return images
+
+
+def _rating(rng: random.Random, rank: int) -> dict:
+    score = round(min(9.6, max(5.0, rng.gauss(7.6, 0.4))), 1)
+    total = max(10, int(math.exp(rng.gauss(8.0, 0.9))))
+    # 评分分布围绕均分成钟形
+    weights = [math.exp(-((i + 1 - score) ** 2) / 2.0) for i in range(10)]
+    scale = total / sum(weights)
+    count = {k: int(w * scale) for k, w in zip(RATING_KEYS, weights)}
+    return {"rank": rank, "total": total, "count": count, "score": score}
+
+
+def _person(rng: random.Random, person_id: int) -> dict:
+    return {
+        "id": person_id,
+        "name": _text(rng, SURNAMES, 2, 2) + _text(rng, GIVEN, 1, 3),
+        "type": 1,
+        "career": ["seiyu"] if rng.random() < 0.8 else ["seiyu", "artist"],
+        "images": _images("crt", person_id, with_common=False),
+        "short_summary": "日本の声優。" + _text(rng, NAME_CHARS, 10, 40),
+        "locked": False,
+    }
+
+
+def make_character(rng: random.Random, char_id: int, anime_ids: List[int]) -> dict:
+    """生成一个 Character 形状的角色（额外带 anime_ids）。"""
+    name = _text(rng, SURNAMES, 2, 2) + _text(rng, GIVEN, 1, 3)
+    collects = int(math.exp(rng.gauss(3.8, 1.4)))
+    infobox = [
+        {"key": "简体中文名", "value": _text(rng, CN_CHARS, 2, 5)},
+        {"key": "别名", "value": [{"k": "日文名", "v": name}]},
+    ]
+    has_birthday = rng.random() < 0.6
+    if has_birthday:
+        infobox.append({"key": "生日", "value": f"{rng.randint(1, 12)}月{rng.randint(1, 28)}日"})
+    return {
+        "id": char_id,
+        "name": name,
+        "type": 1,
+        "images": _images("crt", char_id, with_common=False),
+        "summary": _text(rng, CN_CHARS + "，。", 20, 400),
+        "locked": False,
+        "infobox": infobox,
+        "gender": rng.choice(["female", "male", None]),
+        "blood_type": rng.choice([None, None, 1, 2, 3, 4]),
+        "birth_year": rng.choice([None, rng.randint(1980, 2010)]),
+        "birth_mon": rng.randint(1, 12) if has_birthday else None,
+        "birth_day": rng.randint(1, 28) if has_birthday else None,
+        "stat": {"comments": collects // rng.randint(5, 20), "collects": collects},
+        "anime_ids": anime_ids,
+    }
+
+
+def make_anime(rng: random.Random, anime_id: int, rank: int, characters: List[dict]) -> dict:
+    """生成一个 Subject 形状的番剧（额外带 main_character_ids / main_characters）。"""
+    name = _text(rng, NAME_CHARS, 2, 10)
+    meta_tags = ["TV", "日本"] + [t for t, p in META_TAGS if rng.random() < p]
+    tags = [
+        {"name": t, "count": int(math.exp(rng.gauss(5, 1.5)))}
+        for t in rng.sample(FREE_TAGS + [t for t, _ in META_TAGS], rng.randint(5, 30))
+    ]
+    eps = rng.choice([12, 12, 12, 13, 24, 25, 26, 50])
+    return {
+        "id": anime_id,
+        "type": 2,
+        "name": name,
+        "name_cn": _text(rng, CN_CHARS, 2, 10),
+        "summary": _text(rng, CN_CHARS + "，。", 50, 600),
+        "nsfw": False,
+        "locked": False,
+        "date": f"{rng.randint(1990, 2024)}-{rng.randint(1, 12):02d}-01",
+        "platform": "TV",
+        "images": _images("cover", anime_id, with_common=True),
+        "infobox": [
+            {"key": "中文名", "value": name},
+            {"key": "话数", "value": str(eps)},
+            {"key": "别名", "value": [{"v": name + " Season"}]},
+        ],
+        "volumes": 0,
+        "eps": eps,
+        "total_episodes": eps,
+        "rating": _rating(rng, rank),
+        "collection": {
+            "wish": rng.randint(0, 10000),
+            "collect": rng.randint(0, 20000),
+            "doing": rng.randint(0, 2000),
+            "on_hold": rng.randint(0, 1000),
+            "dropped": rng.randint(0, 500),
+        },
+        "tags": tags,
+        "meta_tags": meta_tags,
+        "series": False,
+        "main_character_ids": [c["id"] for c in characters],
+        "main_characters": [
+            {
+                "id": c["id"],
+                "name": c["name"],
+                "type": 1,
+                "images": c["images"],
+                "relation": "主角",
+                "actors": c["_actors"],
+            }
+            for c in characters
+        ],
+    }
+
+
+def generate(anime_count: int, seed: int = 42) -> Tuple[List[dict], List[dict]]:
+    """生成 (番剧列表, 角色列表)。"""
+    rng = random.Random(seed)
+    anime_ids = rng.sample(range(1, anime_count * 50), anime_count)
+    next_char_id = 1
+    next_person_id = 1
+    characters: Dict[int, dict] = {}
+    anime: List[dict] = []
+
+    i = 0
+    while i < anime_count:
+        # 同一系列的若干部作品共享一部分主角
+        series_len = min(anime_count - i, rng.choice([1, 1, 1, 2, 2, 3, 4]))
+        cast: List[dict] = []
+        for _ in range(min(12, int(rng.expovariate(1 / 5.0)) + 1)):
+            actors = [_person(rng, next_person_id)]
+            next_person_id += 1
+            char = make_character(rng, next_char_id, [])
+            char["_actors"] = actors
+            characters[next_char_id] = char
+            cast.append(char)
+            next_char_id += 1
+        for j in range(series_len):
+            anime_id = anime_ids[i + j]
+            members = cast if j == 0 else [c for c in cast if rng.random() < 0.6] or cast[:1]
+            for c in members:
+                c["anime_ids"].append(anime_id)
+            anime.append(make_anime(rng, anime_id, i + j + 1, members))
+        i += series_len
+
+    for char in characters.values():
+        del char["_actors"]
+    return anime, list(characters.values())
+
+
+def write_dataset(root: Path, anime: List[dict], characters: List[dict]):
+    """按 data_fetcher.py 的目录结构写入 root/data 下。"""
+    anime_dir = root / "data" / "anime" / "raw_cards"
+    char_dir = root / "data" / "character" / "raw_cards"
+    anime_dir.mkdir(parents=True, exist_ok=True)
+    char_dir.mkdir(parents=True, exist_ok=True)
+    for item in anime:
+        with open(anime_dir / f"{item['id']}.json", "w", encoding="utf-8") as f:
+            json.dump(item, f, ensure_ascii=False, indent=4)
+    for item in characters:
+        with open(char_dir / f"{item['id']}.json", "w", encoding="utf-8") as f:
+            json.dump(item, f, ensure_ascii=False, indent=4)
+
+
+def validate(anime: List[dict], characters: List[dict], sample: int = 200):
+    """用 bangumi_asset.models 校验抽样数据的结构（需要 pydantic）。"""
+    from backend.bangumi_asset.models import Character, RelatedCharacter, Subject
+
+    rating_aliases = {k: str(i + 1) for i, k in enumerate(RATING_KEYS)}
+    for item in anime[:sample]:
+        subject = dict(item)
+        subject["rating"] = dict(item["rating"])
+        subject["rating"]["count"] = {
+            rating_aliases[k]: v for k, v in item["rating"]["count"].items()
+        }
+        Subject.model_validate(subject)
+        for rel in item["main_characters"]:
+            RelatedCharacter.model_validate(rel)
+    for item in characters[:sample]:
+        Character.model_validate(item)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成合成的 Bangumi raw_cards 数据")
+    parser.add_argument("-n", "--anime", type=int, default=1000, help="番剧数量")
+    parser.add_argument("-o", "--output", required=True, help="输出根目录（会在其下创建 data/）")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    parser.add_argument("--validate", action="store_true", help="用 pydantic 模型校验抽样数据")
+    args = parser.parse_args()
+
+    anime, characters = generate(args.anime, args.seed)
+    if args.validate:
+        validate(anime, characters)
+    write_dataset(Path(args.output), anime, characters)
+    print(f"已生成 {len(anime)} 部番剧、{len(characters)} 个角色到 {args.output}/data")
+
+
+if __name__ == "__main__":
+    main()
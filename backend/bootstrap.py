@@ -0,0 +1,153 @@
+"""
+Game-data bundle for ``/api/bootstrap``.
+
+On startup the client needs the selected anime and character cards plus its
+save.  The bundle packs both card lists and the lookup maps the client would
+otherwise derive on every visit (card ids by rarity for the gacha pools, and
+characters by anime) into one compact JSON document, identified by a hash of
+its content.  The client sends back the hash it has cached; when that still
+matches, the response carries only the save.
+
+A bundle is built once per catalog version and kept in memory as encoded
+bytes, together with a gzip compressor primed with the bundle: a gzip
+response costs a copy of that compressor plus compressing the save, not
+recompressing the whole catalog.  Only the last ``BUNDLE_CACHE_SIZE``
+versions are kept, so a hot reload drops the old bundle once no request
+asks for it.  Bundles hold no reference to the card stores they were built
+from.
+"""
+
+import hashlib
+import json
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+from card_store import CardStore, json_array
+
+BUNDLE_CACHE_SIZE = 2
+GZIP_LEVEL = 6
+DEFAULT_RARITY = "N"
+
+_bundles: "OrderedDict[str, Bundle]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def _encode(value) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class Bundle:
+    """One encoded bundle and the response prefixes built around it."""
+
+    def __init__(self, body: bytes, catalog_version: str):
+        self.body = body
+        self.catalog_version = catalog_version
+        self.version = hashlib.sha256(body).hexdigest()[:16]
+        head = b'{"version":' + _encode(self.version)
+        head += b',"catalogVersion":' + _encode(catalog_version)
+        self._fresh = head + b',"fresh":true,"user":'
+        self._stale = head + b',"fresh":false,"bundle":' + body + b',"user":'
+        # wbits=31: gzip framing; the compressor carries the CRC and length
+        # of everything fed so far, so a copy can finish any response
+        self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        self._compressed = self._compressor.compress(self._stale)
+        self._compressed += self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    @property
+    def gzip_size(self) -> int:
+        return len(self._compressed)
+
+    def render(self, stale: bool, user: bytes, gzip: bool = False) -> bytes:
+        """
+        The response body: the bundle (when the client's copy is ``stale``)
+        followed by ``user``, the encoded save fields from ``user_fields``.
+        With ``gzip`` the stale body comes back gzip-compressed.
+        """
+        if not stale:
+            return self._fresh + user
+        if not gzip:
+            return self._stale + user
+        compressor = self._compressor.copy()
+        return self._compressed + compressor.compress(user) + compressor.flush()
+
+
+def user_fields(value, revision: Optional[str]) -> bytes:
+    """The tail of a bootstrap response: the save and its revision."""
+    return _encode(value) + b',"userRevision":' + _encode(revision) + b"}"
+
+
+def _cards(store: Optional[CardStore]) -> Iterable[dict]:
+    return (record.to_dict() for record in store) if store is not None else ()
+
+
+def _ids_by_rarity(cards: List[dict]) -> Dict[str, List[int]]:
+    pools: Dict[str, List[int]] = {}
+    for card in cards:
+        pools.setdefault(card.get("rarity") or DEFAULT_RARITY, []).append(card["id"])
+    return pools
+
+
+def _characters_by_anime(anime: List[dict], characters: List[dict]) -> Dict[str, List[int]]:
+    """
+    Bundled characters of each bundled anime, from both sides of the
+    relation (``main_character_ids`` and ``anime_ids``), as ``graph_index``
+    merges them.
+    """
+    anime_ids = {card["id"] for card in anime}
+    character_ids = {card["id"] for card in characters}
+    links: Dict[int, set] = {}
+    for card in anime:
+        for char_id in card.get("main_character_ids") or ():
+            if int(char_id) in character_ids:
+                links.setdefault(card["id"], set()).add(int(char_id))
+    for card in characters:
+        for anime_id in card.get("anime_ids") or ():
+            if int(anime_id) in anime_ids:
+                links.setdefault(int(anime_id), set()).add(card["id"])
+    return {str(anime_id): sorted(ids) for anime_id, ids in sorted(links.items())}
+
+
+def build_bundle(
+    anime: Optional[CardStore], characters: Optional[CardStore], catalog_version: str
+) -> Bundle:
+    """Encode the bundle for one catalog; a missing store bundles as empty."""
+    anime_cards = list(_cards(anime))
+    character_cards = list(_cards(characters))
+    maps = {
+        "animeByRarity": _ids_by_rarity(anime_cards),
+        "charactersByRarity": _ids_by_rarity(character_cards),
+        "charactersByAnime": _characters_by_anime(anime_cards, character_cards),
+    }
+    body = (
+        b'{"anime":'
+        + (json_array(anime) if anime is not None else b"[]")
+        + b',"characters":'
+        + (json_array(characters) if characters is not None else b"[]")
+        + b',"maps":'
+        + _encode(maps)
+        + b"}"
+    )
+    return Bundle(body, catalog_version)
+
+
+def get_bundle(
+    catalog_version: str, anime: Optional[CardStore], characters: Optional[CardStore]
+) -> Bundle:
+    """
+    The bundle of catalog ``catalog_version``, built from the given stores
+    on first use.  Concurrent first requests wait for one build.
+    """
+    bundle = _bundles.get(catalog_version)
+    if bundle is not None:
+        return bundle
+    with _lock:
+        bundle = _bundles.get(catalog_version)
+        if bundle is None:
+            bundle = build_bundle(anime, characters, catalog_version)
+            _bundles[catalog_version] = bundle
+            while len(_bundles) > BUNDLE_CACHE_SIZE:
+                _bundles.popitem(last=False)
+        return bundle
+
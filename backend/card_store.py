@@ -0,0 +1,306 @@
+"""
+Compact, memory-mapped card store.
+
+A store file holds one catalog (a list of card dicts) in a read-only layout that
+several worker processes can map at the same time and share through the OS
+page cache:
+
+    header | schema (JSON) | rows (fixed width) | id hash table | string heap
+
+Each row keeps a few numeric fields as int64/float64 plus (offset, length)
+references into the string heap.  The full card is kept in the heap as compact
+JSON so endpoints can return it byte-for-byte without re-serializing.  Id
+lookups go through an open-addressing hash table stored in the file, so
+``store.get(card_id)`` is O(1) and allocates nothing until a field is read.
+"""
+
+import json
+import mmap
+import os
+import struct
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+MAGIC = b"APCS"
+FORMAT_VERSION = 1
+
+# magic, version, reserved, row count, slot count, schema length
+_HEADER = struct.Struct("<4sHHIII")
+_SLOT = struct.Struct("<qi")
+_STRING_REF = "QI"
+_EMPTY_SLOT = -1
+_NUMERIC_CODES = {"int": "q", "float": "d"}
+_GOLDEN = 0x9E3779B97F4A7C15
+_MASK64 = 0xFFFFFFFFFFFFFFFF
+
+
+class CardStoreError(Exception):
+    """Raised when a store file is missing, truncated or of another format."""
+
+
+def _slot_bits(row_count: int) -> int:
+    bits = 1
+    while (1 << bits) < row_count * 2:
+        bits += 1
+    return bits
+
+
+def _slot_of(card_id: int, bits: int) -> int:
+    return ((card_id * _GOLDEN) & _MASK64) >> (64 - bits)
+
+
+def _row_struct(schema: dict) -> struct.Struct:
+    fmt = "<" + "".join(_NUMERIC_CODES[kind] for _, kind in schema["numeric"])
+    fmt += _STRING_REF * (len(schema["strings"]) + 1)  # +1: the JSON document
+    return struct.Struct(fmt)
+
+
+def _numeric(value, kind: str):
+    if kind == "float":
+        try:
+            return float(value or 0.0)
+        except (TypeError, ValueError):
+            return 0.0
+    try:
+        return int(value or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def build_store(
+    records: Iterable[dict],
+    path: str,
+    numeric_fields: Dict[str, str],
+    string_fields: Sequence[str] = (),
+    meta: Optional[dict] = None,
+) -> int:
+    """
+    Write ``records`` to ``path`` as a card store and return the row count.
+
+    ``numeric_fields`` maps field name to ``"int"`` or ``"float"`` and must
+    include ``"id"``.  Missing or malformed numbers are stored as 0.  The file
+    is written next to ``path`` and renamed into place, so readers never see a
+    half-written store.
+    """
+    if numeric_fields.get("id") != "int":
+        raise ValueError("numeric_fields must declare an integer 'id' field")
+
+    schema = {
+        "numeric": list(numeric_fields.items()),
+        "strings": list(string_fields),
+        "meta": meta or {},
+    }
+    row_struct = _row_struct(schema)
+
+    rows: List[bytes] = []
+    ids: List[int] = []
+    heap = bytearray()
+
+    def put(data: bytes):
+        offset = len(heap)
+        heap.extend(data)
+        return offset, len(data)
+
+    for record in records:
+        values = [_numeric(record.get(name), kind) for name, kind in schema["numeric"]]
+        for name in schema["strings"]:
+            values.extend(put(str(record.get(name) or "").encode("utf-8")))
+        document = json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+        values.extend(put(document.encode("utf-8")))
+        rows.append(row_struct.pack(*values))
+        ids.append(values[0])
+
+    bits = _slot_bits(len(rows))
+    slots = [(_EMPTY_SLOT, -1)] * (1 << bits)
+    for row, card_id in enumerate(ids):
+        slot = _slot_of(card_id, bits)
+        while slots[slot][0] not in (_EMPTY_SLOT, card_id):
+            slot = (slot + 1) & ((1 << bits) - 1)
+        if slots[slot][0] == _EMPTY_SLOT:  # first occurrence of an id wins
+            slots[slot] = (card_id, row)
+
+    schema_bytes = json.dumps(schema, ensure_ascii=False).encode("utf-8")
+    # Imported here: readers (e.g. the serverless entry) never build stores
+    from atomic_file import AtomicFile
+
+    with AtomicFile(path, suffix=".cards") as f:
+        f.write(
+            _HEADER.pack(MAGIC, FORMAT_VERSION, 0, len(rows), len(slots), len(schema_bytes))
+        )
+        f.write(schema_bytes)
+        for row in rows:
+            f.write(row)
+        for slot in slots:
+            f.write(_SLOT.pack(*slot))
+        f.write(heap)
+    return len(rows)
+
+
+class CardRecord:
+    """
+    Lightweight view of one row.  Numeric and string fields declared in the
+    schema are read straight from the mapped file; anything else is available
+    through ``to_dict()``.
+    """
+
+    __slots__ = ("_store", "_row")
+
+    def __init__(self, store: "CardStore", row: int):
+        self._store = store
+        self._row = row
+
+    def __getattr__(self, name: str):
+        try:
+            return self._store._field(self._row, name)
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __getitem__(self, name: str):
+        return self._store._field(self._row, name)
+
+    def __repr__(self) -> str:
+        return f"<CardRecord id={self.id} row={self._row}>"
+
+    @property
+    def row(self) -> int:
+        return self._row
+
+    def raw_json(self) -> bytes:
+        """The card as compact UTF-8 JSON, exactly as stored."""
+        return self._store._document(self._row)
+
+    def to_dict(self) -> dict:
+        return json.loads(self.raw_json())
+
+
+class CardStore:
+    """Read-only, memory-mapped view over a file written by ``build_store``."""
+
+    def __init__(self, path: str):
+        self.path = path
+        try:
+            self._file = open(path, "rb")
+        except OSError as e:
+            raise CardStoreError(f"cannot open card store {path}: {e}") from e
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._parse()
+        except (ValueError, struct.error, json.JSONDecodeError) as e:
+            self.close()
+            raise CardStoreError(f"corrupt card store {path}: {e}") from e
+
+    def _parse(self):
+        magic, version, _, rows, slots, schema_len = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError("unknown store format")
+        start = _HEADER.size
+        self.schema = json.loads(self._map[start : start + schema_len])
+        self.meta = self.schema.get("meta", {})
+        self._row_struct = _row_struct(self.schema)
+        self._rows_offset = start + schema_len
+        self._row_count = rows
+        self._slots_offset = self._rows_offset + rows * self._row_struct.size
+        self._slot_count = slots
+        self._slot_bits = slots.bit_length() - 1
+        self._heap_offset = self._slots_offset + slots * _SLOT.size
+        if self._heap_offset > len(self._map):
+            raise ValueError("truncated store")
+
+        self._numeric_index = {}
+        for i, (name, _) in enumerate(self.schema["numeric"]):
+            self._numeric_index[name] = i
+        self._string_index = {}
+        first_ref = len(self.schema["numeric"])
+        for i, name in enumerate(self.schema["strings"]):
+            self._string_index[name] = first_ref + 2 * i
+        self._document_index = first_ref + 2 * len(self.schema["strings"])
+
+    def close(self):
+        if getattr(self, "_map", None) is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def __len__(self) -> int:
+        return self._row_count
+
+    def __getitem__(self, row: int) -> CardRecord:
+        if row < 0:
+            row += self._row_count
+        if not 0 <= row < self._row_count:
+            raise IndexError(row)
+        return CardRecord(self, row)
+
+    def __iter__(self) -> Iterator[CardRecord]:
+        for row in range(self._row_count):
+            yield CardRecord(self, row)
+
+    def __contains__(self, card_id: int) -> bool:
+        return self.row_of(card_id) is not None
+
+    def _values(self, row: int) -> tuple:
+        offset = self._rows_offset + row * self._row_struct.size
+        return self._row_struct.unpack_from(self._map, offset)
+
+    def _heap(self, offset: int, length: int) -> bytes:
+        start = self._heap_offset + offset
+        return self._map[start : start + length]
+
+    def _field(self, row: int, name: str):
+        if name in self._numeric_index:
+            return self._values(row)[self._numeric_index[name]]
+        if name in self._string_index:
+            values = self._values(row)
+            i = self._string_index[name]
+            return self._heap(values[i], values[i + 1]).decode("utf-8")
+        raise KeyError(name)
+
+    def _document(self, row: int) -> bytes:
+        values = self._values(row)
+        i = self._document_index
+        return self._heap(values[i], values[i + 1])
+
+    def row_of(self, card_id: int) -> Optional[int]:
+        """Row number of ``card_id``, or None if it is not in the store."""
+        if not self._slot_count:
+            return None
+        mask = self._slot_count - 1
+        slot = _slot_of(card_id, self._slot_bits)
+        while True:
+            stored_id, row = _SLOT.unpack_from(
+                self._map, self._slots_offset + slot * _SLOT.size
+            )
+            if stored_id == card_id:
+                return row
+            if stored_id == _EMPTY_SLOT:
+                return None
+            slot = (slot + 1) & mask
+
+    def get(self, card_id: int) -> Optional[CardRecord]:
+        row = self.row_of(card_id)
+        return None if row is None else CardRecord(self, row)
+
+    def slice(self, offset: int, limit: int) -> List[CardRecord]:
+        start = max(0, offset)
+        stop = min(self._row_count, start + max(0, limit))
+        return [CardRecord(self, row) for row in range(start, stop)]
+
+
+def json_array(records: Iterable[CardRecord]) -> bytes:
+    """Join the stored documents of ``records`` into one JSON array."""
+    return b"[" + b",".join(record.raw_json() for record in records) + b"]"
+
+
+def ndjson_chunks(records: Iterable[CardRecord], chunk_size: int) -> Iterator[bytes]:
+    """
+    The stored documents of ``records`` as newline-delimited JSON, joined
+    ``chunk_size`` records at a time so a consumer sees each chunk as soon
+    as it is read, while only one chunk is held in memory.
+    """
+    chunk: List[bytes] = []
+    for record in records:
+        chunk.append(record.raw_json())
+        if len(chunk) >= chunk_size:
+            yield b"\n".join(chunk) + b"\n"
+            chunk = []
+    if chunk:
+        yield b"\n".join(chunk) + b"\n"
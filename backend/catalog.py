@@ -0,0 +1,584 @@
+"""
+Catalog layer used by the server.
+
+Every catalog the API serves is compiled once into a memory-mapped card store
+(see ``card_store.py``) under ``data/cache``.  A store is rebuilt only when its
+source JSON changes, so worker processes normally just map the existing file
+and share its pages.  Derived indexes (``synergy_index.py``,
+``search_index.py``, ``similarity_index.py``, ``graph_index.py``,
+``person_index.py``) are cached next to the stores and follow the same rebuild-on-change rule.
+
+The process-wide catalog can be replaced while the server runs
+(``reload_catalog``, or a ``CatalogWatcher`` polling the sources): the new
+catalog is built and fully preloaded off to the side, then swapped in with a
+single reference assignment.  Requests that already hold the old catalog keep
+reading it; stores are rebuilt by atomic rename, so its mapped files stay
+valid until the last reference goes away.
+
+A preloaded cache directory is also a deployable snapshot:
+``api/build_snapshot.py`` compiles one for the serverless entry, which serves
+it through ``compiled_sources`` without shipping the source JSON.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+from card_store import CardStore, CardStoreError, build_store
+from graph_index import GraphIndex, open_index as open_graph_index
+from json_stream import iter_records
+from pagination import KeysetIndex, store_keyset
+from person_index import PersonIndex, open_index as open_person_index, persons_from_anime
+from search_index import SearchIndex, open_index as open_search_index
+from similarity_index import SimilarityIndex, open_index as open_similarity_index
+from synergy_index import SynergyIndex, open_index
+
+CACHE_DIRNAME = "cache"
+# Compiled stores opened as-is ("hit") vs rebuilt from a changed source ("miss")
+_store_opens: Dict[str, int] = {"hit": 0, "miss": 0}
+
+ANIME_FIELDS = {
+    "id": "int",
+    "cost": "int",
+    "points": "int",
+    "rating_rank": "int",
+    "rating_score": "float",
+    "rating_total": "int",
+}
+CHARACTER_FIELDS = {
+    "id": "int",
+    "popularity_score": "int",
+    "comprehensive_popularity": "int",
+    "anime_count": "int",
+}
+RAW_CHARACTER_FIELDS = {"id": "int"}
+PERSON_FIELDS = {"id": "int", "type": "int", "character_count": "int"}
+# Catalogs with a full-text index (see search_index.py)
+SEARCHABLE = ("anime", "characters")
+
+
+def _file_signature(path: str) -> Optional[str]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return f"{st.st_size}:{st.st_mtime_ns}"
+
+
+def _dir_signature(path: str) -> Optional[str]:
+    if not os.path.isdir(path):
+        return None
+    count, size, latest = 0, 0, 0
+    with os.scandir(path) as it:
+        for entry in it:
+            if entry.name.endswith(".json"):
+                st = entry.stat()
+                count += 1
+                size += st.st_size
+                latest = max(latest, st.st_mtime_ns)
+    return f"{count}:{size}:{latest}"
+
+
+def _iter_json_dir(path: str) -> Iterator[dict]:
+    for filename in sorted(os.listdir(path)):
+        if not filename.endswith(".json"):
+            continue
+        with open(os.path.join(path, filename), "r", encoding="utf-8") as f:
+            try:
+                yield json.load(f)
+            except json.JSONDecodeError:
+                logging.warning(f"Skipping unreadable card file {filename}")
+
+
+class CatalogSource:
+    """One catalog: where it comes from and how it is compiled."""
+
+    def __init__(
+        self,
+        name: str,
+        path: str,
+        fields: Dict[str, str],
+        strings=("name", "rarity"),
+    ):
+        self.name = name
+        self.path = path
+        self.fields = fields
+        self.strings = strings
+        self.is_dir = not path.endswith(".json")
+
+    def signature(self) -> Optional[str]:
+        return _dir_signature(self.path) if self.is_dir else _file_signature(self.path)
+
+    def records(self) -> Iterator[dict]:
+        return _iter_json_dir(self.path) if self.is_dir else iter_records(self.path)
+
+
+class DerivedSource(CatalogSource):
+    """
+    A catalog read from ``path`` when that file exists, and otherwise
+    computed by ``derive`` from the records of a ``base`` source.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        path: str,
+        fields: Dict[str, str],
+        base: CatalogSource,
+        derive: Callable[[Iterator[dict]], Iterable[dict]],
+        strings=("name", "rarity"),
+    ):
+        super().__init__(name, path, fields, strings)
+        self.base = base
+        self.derive = derive
+
+    def signature(self) -> Optional[str]:
+        signature = super().signature()
+        if signature is not None:
+            return signature
+        base = self.base.signature()
+        return f"derived:{base}" if base is not None else None
+
+    def records(self) -> Iterator[dict]:
+        if os.path.exists(self.path):
+            return super().records()
+        return iter(self.derive(self.base.records()))
+
+
+class CompiledSource(CatalogSource):
+    """
+    A catalog known only by its compiled store in ``cache_dir``, e.g. a
+    deployed snapshot shipped without the source JSON.  Its signature is the
+    one the store was compiled from, so the store and the indexes built next
+    to it open as they are.
+    """
+
+    def __init__(self, source: CatalogSource, cache_dir: str):
+        super().__init__(
+            source.name,
+            os.path.join(cache_dir, f"{source.name}.cards"),
+            source.fields,
+            source.strings,
+        )
+
+    def signature(self) -> Optional[str]:
+        try:
+            store = CardStore(self.path)
+        except CardStoreError:
+            return None
+        try:
+            return store.meta.get("signature")
+        finally:
+            store.close()
+
+    def records(self) -> Iterator[dict]:
+        store = CardStore(self.path)
+        try:
+            for record in store:
+                yield record.to_dict()
+        finally:
+            store.close()
+
+
+def default_sources(data_root: str) -> Dict[str, CatalogSource]:
+    return {
+        source.name: source
+        for source in (
+            CatalogSource(
+                "anime",
+                os.path.join(data_root, "selected_anime", "all_cards.json"),
+                ANIME_FIELDS,
+            ),
+            CatalogSource(
+                "characters",
+                os.path.join(data_root, "selected_character", "all_cards.json"),
+                CHARACTER_FIELDS,
+            ),
+            CatalogSource(
+                "anime_cards",
+                os.path.join(data_root, "anime", "processed_cards"),
+                ANIME_FIELDS,
+            ),
+            CatalogSource(
+                "character_cards",
+                os.path.join(data_root, "character", "raw_cards"),
+                RAW_CHARACTER_FIELDS,
+                strings=("name",),
+            ),
+            # Written by process_person_data.py; without it, the voice actors
+            # embedded in the raw anime cards
+            DerivedSource(
+                "persons",
+                os.path.join(data_root, "person", "all_persons.json"),
+                PERSON_FIELDS,
+                base=CatalogSource(
+                    "raw_anime", os.path.join(data_root, "anime", "raw_cards"), ANIME_FIELDS
+                ),
+                derive=persons_from_anime,
+                strings=("name",),
+            ),
+        )
+    }
+
+
+def compiled_sources(cache_dir: str) -> Dict[str, CatalogSource]:
+    """The default catalogs, read from the stores already compiled into ``cache_dir``."""
+    return {
+        name: CompiledSource(source, cache_dir) for name, source in default_sources("").items()
+    }
+
+
+def open_store(source: CatalogSource, cache_dir: str) -> Optional[CardStore]:
+    """
+    Open the compiled store for ``source``, rebuilding it first if the source
+    changed since it was compiled.  Returns None when the source is missing.
+    """
+    signature = source.signature()
+    if signature is None:
+        return None
+
+    store_path = os.path.join(cache_dir, f"{source.name}.cards")
+    try:
+        store = CardStore(store_path)
+        if store.meta.get("signature") == signature:
+            _store_opens["hit"] += 1
+            return store
+        store.close()
+    except CardStoreError:
+        pass
+
+    _store_opens["miss"] += 1
+
+    count = build_store(
+        source.records(),
+        store_path,
+        source.fields,
+        source.strings,
+        meta={"source": source.path, "signature": signature},
+    )
+    logging.info(f"Compiled {count} {source.name} cards into {store_path}")
+    return CardStore(store_path)
+
+
+class Catalog:
+    """The set of card stores the API reads from."""
+
+    def __init__(
+        self,
+        data_root: str,
+        cache_dir: Optional[str] = None,
+        generation: int = 1,
+        sources: Optional[Dict[str, CatalogSource]] = None,
+    ):
+        self.data_root = data_root
+        # Incremented on every hot reload; reported alongside ``version``
+        self.generation = generation
+        self.loaded_at = time.time()
+        self.cache_dir = cache_dir or os.path.join(data_root, CACHE_DIRNAME)
+        self.sources = sources if sources is not None else default_sources(data_root)
+        self._stores: Dict[str, Optional[CardStore]] = {}
+        self._synergy: Dict[str, Optional[SynergyIndex]] = {}
+        self._search: Dict[str, Optional[SearchIndex]] = {}
+        self._similarity: Dict[str, Optional[SimilarityIndex]] = {}
+        # Graph and person indexes span several catalogs: keyed by kind
+        self._joins: Dict[str, object] = {}
+        self._keysets: Dict[Tuple[str, str], Optional[KeysetIndex]] = {}
+        self._version: Optional[str] = None
+        # Serializes first opens, so concurrent requests on a cold cache build
+        # each store or index once instead of racing on the same files
+        self._lock = threading.RLock()
+
+    def _cached(self, cache: dict, key, load: Callable[[], object]):
+        """``cache[key]``, loaded under the catalog lock on first use."""
+        try:
+            return cache[key]
+        except KeyError:
+            pass
+        with self._lock:
+            if key not in cache:
+                cache[key] = load()
+            return cache[key]
+
+    def store(self, name: str) -> Optional[CardStore]:
+        return self._cached(
+            self._stores, name, lambda: open_store(self.sources[name], self.cache_dir)
+        )
+
+    def synergy(self, name: str = "anime") -> Optional[SynergyIndex]:
+        """Tag co-occurrence index for one catalog."""
+        return self._cached(
+            self._synergy, name, lambda: open_index(self.sources[name], self.cache_dir)
+        )
+
+    def search(self, name: str = "anime") -> Optional[SearchIndex]:
+        """Full-text index over one catalog's names and descriptions."""
+        return self._cached(
+            self._search, name, lambda: open_search_index(self.sources[name], self.cache_dir)
+        )
+
+    def similarity(self, name: str = "anime") -> Optional[SimilarityIndex]:
+        """Precomputed nearest-neighbour table for recommendations."""
+        return self._cached(
+            self._similarity,
+            name,
+            lambda: open_similarity_index(self.sources[name], self.cache_dir),
+        )
+
+    def graph(self) -> Optional[GraphIndex]:
+        """Character <-> anime adjacency over the selected catalogs."""
+        return self._cached(
+            self._joins,
+            "graph",
+            lambda: open_graph_index(
+                self.sources["anime"], self.sources["characters"], self.cache_dir
+            ),
+        )
+
+    def voices(self) -> Optional[PersonIndex]:
+        """Character <-> voice actor join index over the person table."""
+        return self._cached(
+            self._joins,
+            "voices",
+            lambda: open_person_index(self.sources["persons"], self.cache_dir),
+        )
+
+    def keyset(self, name: str, key: str) -> Optional[KeysetIndex]:
+        """Rows of one catalog sorted by ``key``, for cursor pagination."""
+
+        def load():
+            store = self.store(name)
+            return store_keyset(store, key) if store is not None else None
+
+        return self._cached(self._keysets, (name, key), load)
+
+    @property
+    def version(self) -> str:
+        """
+        Short hash of the source signatures the stores were compiled from.
+        Anything derived from the catalog can be cached under this key.
+        """
+        if self._version is None:
+            signatures = []
+            for name in sorted(self.sources):
+                store = self.store(name)
+                signatures.append(f"{name}={store.meta.get('signature') if store else None}")
+            digest = hashlib.sha1("\n".join(signatures).encode("utf-8"))
+            self._version = digest.hexdigest()[:12]
+        return self._version
+
+    def preload(self) -> "Catalog":
+        """
+        Open every store and derived index up front, e.g. in a pre-fork
+        master so workers inherit them instead of each building their own.
+        """
+        for name in self.sources:
+            self.store(name)
+        for name in SEARCHABLE:
+            self.search(name)
+        self.synergy("anime")
+        self.similarity("anime")
+        self.graph()
+        self.voices()
+        self.version
+        return self
+
+    def stats(self) -> Dict[str, int]:
+        """Record counts of the opened stores (missing catalogs are left out)."""
+        return {name: len(store) for name, store in self._stores.items() if store is not None}
+
+    def close(self):
+        with self._lock:
+            for store in self._stores.values():
+                if store is not None:
+                    store.close()
+            self._stores.clear()
+            self._synergy.clear()
+            self._search.clear()
+            self._similarity.clear()
+            self._joins.clear()
+            self._keysets.clear()
+            self._version = None
+
+    @property
+    def anime(self) -> Optional[CardStore]:
+        return self.store("anime")
+
+    @property
+    def characters(self) -> Optional[CardStore]:
+        return self.store("characters")
+
+    @property
+    def anime_cards(self) -> Optional[CardStore]:
+        return self.store("anime_cards")
+
+    @property
+    def character_cards(self) -> Optional[CardStore]:
+        return self.store("character_cards")
+
+    @property
+    def persons(self) -> Optional[CardStore]:
+        return self.store("persons")
+
+
+_catalog: Optional[Catalog] = None
+_reload_lock = threading.Lock()
+_reload_handler: Optional[Callable[[], None]] = None
+_reload_status: Dict[str, object] = {"reloading": False, "last_error": None, "last_seconds": None}
+
+
+def get_catalog(data_root: str, snapshot_dir: Optional[str] = None) -> Catalog:
+    """
+    Process-wide catalog, created on first use.  With ``snapshot_dir`` it
+    serves the stores and indexes a preloaded catalog compiled there (see
+    ``api/build_snapshot.py``) without reading the sources under ``data_root``.
+    """
+    global _catalog
+    if _catalog is None:
+        if snapshot_dir:
+            _catalog = Catalog(data_root, snapshot_dir, sources=compiled_sources(snapshot_dir))
+        else:
+            _catalog = Catalog(data_root)
+    return _catalog
+
+
+def reload_catalog(data_root: str) -> Catalog:
+    """
+    Build a fresh catalog with every store and index preloaded, then make it
+    the process-wide one.  The old catalog is not closed: requests still
+    holding it finish on it, and it is released with the last reference.
+    """
+    global _catalog
+    with _reload_lock:
+        _reload_status["reloading"] = True
+        try:
+            start = time.perf_counter()
+            old = _catalog
+            # Same sources as the catalog it replaces (default or snapshot)
+            catalog = (
+                Catalog(data_root, old.cache_dir, old.generation + 1, old.sources)
+                if old
+                else Catalog(data_root)
+            )
+            catalog.preload()
+            _catalog = catalog
+            _reload_status["last_error"] = None
+            _reload_status["last_seconds"] = round(time.perf_counter() - start, 3)
+        except Exception as e:
+            _reload_status["last_error"] = str(e)
+            raise
+        finally:
+            _reload_status["reloading"] = False
+    logging.info(
+        f"Catalog reloaded: version {catalog.version} (generation {catalog.generation}) "
+        f"in {_reload_status['last_seconds']}s"
+    )
+    return catalog
+
+
+def _reload_in_background(data_root: str):
+    try:
+        reload_catalog(data_root)
+    except Exception:
+        logging.exception("Catalog reload failed; keeping the current catalog")
+
+
+def set_reload_handler(handler: Optional[Callable[[], None]]):
+    """
+    Route reload requests elsewhere, e.g. a pre-fork worker asks its master to
+    roll a new worker generation instead of reloading only itself.
+    """
+    global _reload_handler
+    _reload_handler = handler
+
+
+def request_reload(data_root: str, wait: bool = False) -> bool:
+    """
+    Reload the catalog: through the registered handler if there is one,
+    otherwise on a background thread (or inline with ``wait``).  Returns
+    False when a reload is already running.
+    """
+    if _reload_handler is not None:
+        _reload_handler()
+        return True
+    if wait:
+        reload_catalog(data_root)
+        return True
+    if _reload_lock.locked():
+        return False
+    threading.Thread(
+        target=_reload_in_background, args=(data_root,), name="catalog-reload", daemon=True
+    ).start()
+    return True
+
+
+def store_open_stats() -> Dict[str, int]:
+    return dict(_store_opens)
+
+
+def reload_status() -> Dict[str, object]:
+    catalog = _catalog
+    return {
+        "version": catalog.version if catalog else None,
+        "generation": catalog.generation if catalog else None,
+        "loaded_at": catalog.loaded_at if catalog else None,
+        **_reload_status,
+    }
+
+
+class CatalogWatcher(threading.Thread):
+    """
+    Polls the catalog sources and calls ``on_change`` (a background reload by
+    default) once a change has settled, i.e. the signatures were the same on
+    two consecutive polls, so a source still being written isn't picked up.
+    """
+
+    def __init__(
+        self,
+        data_root: str,
+        interval: float = 2.0,
+        on_change: Optional[Callable[[], None]] = None,
+    ):
+        super().__init__(name="catalog-watcher", daemon=True)
+        self.data_root = data_root
+        self.interval = interval
+        self.on_change = on_change or (lambda: reload_catalog(data_root))
+        self._stopped = threading.Event()
+
+    def signatures(self) -> Dict[str, Optional[str]]:
+        sources = default_sources(self.data_root)
+        return {name: source.signature() for name, source in sources.items()}
+
+    def run(self):
+        current = self.signatures()
+        pending = None
+        while not self._stopped.wait(self.interval):
+            seen = self.signatures()
+            if seen == current:
+                pending = None
+                continue
+            if seen != pending:
+                pending = seen
+                continue
+            changed = sorted(name for name in seen if seen[name] != current[name])
+            current, pending = seen, None
+            logging.info(f"Catalog sources changed ({', '.join(changed)}), reloading")
+            try:
+                self.on_change()
+            except Exception:
+                logging.exception("Catalog reload failed; keeping the current catalog")
+
+    def stop(self):
+        self._stopped.set()
+
+
+def watch_catalog(
+    data_root: str, interval: float = 2.0, on_change: Optional[Callable[[], None]] = None
+) -> CatalogWatcher:
+    """Start a ``CatalogWatcher`` thread and return it."""
+    watcher = CatalogWatcher(data_root, interval, on_change)
+    watcher.start()
+    return watcher
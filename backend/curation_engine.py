@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+精选数据集的向量化计算引擎
+
+create_curated_dataset.py 中的稀有度、费用配额、整数强度与角色综合人气分，
+原先都是逐条目的 Python 循环（整数强度的分层计算甚至是 O(n² log n)）。
+这里把它们改写为基于 NumPy 数组的批量运算：
+
+- percentile_rarity:      按排名百分比划分稀有度
+- assign_costs:           按费用曲线与稀有度占比分配费用
+- integer_points:         同费同稀有度分组，用组内分位数计算分层偏移
+- comprehensive_popularity / select_top_characters:
+                          角色→番剧边数组上的 scatter-max 与每部番 Top N
+
+所有函数的结果与原逐条实现完全一致（包括稳定排序下的并列顺序），
+复杂度为 O(n log n)，十万级条目也能在秒级完成。
+"""
+
+import math
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+RARITY_TIERS = ("UR", "HR", "SSR", "SR", "R")
+
+
+def factorize(labels: Sequence) -> Tuple[List, np.ndarray]:
+    """按首次出现顺序对标签编码，返回 (去重后的标签列表, 编码数组)。"""
+    codes_of: Dict = {}
+    codes = np.fromiter(
+        (codes_of.setdefault(label, len(codes_of)) for label in labels),
+        dtype=np.int64,
+        count=len(labels),
+    )
+    return list(codes_of), codes
+
+
+def rounded_quota(total: int, ratios: Dict) -> Dict:
+    """将比例转为整数配额，处理四舍五入与余数分配。"""
+    raw = {k: total * v for k, v in ratios.items()}
+    rounded = {k: int(math.floor(x)) for k, x in raw.items()}
+    remain = total - sum(rounded.values())
+    # 将余数分配给小数部分最大的几项
+    for k, _ in sorted(
+        raw.items(), key=lambda kv: (kv[1] - math.floor(kv[1])), reverse=True
+    )[:remain]:
+        rounded[k] += 1
+    return rounded
+
+
+def percentile_rarity(n: int, percentiles: Dict[str, float]) -> List[str]:
+    """
+    为已按排名排好序的 n 个条目分配稀有度：排名前 UR% 为 UR，其后到 HR% 为 HR……
+    其余为 R。
+    """
+    ranks = np.arange(n)
+    codes = np.full(n, len(RARITY_TIERS) - 1, dtype=np.int64)
+    # 与 if/elif 链等价：从低档往高档覆盖，靠前的判断优先生效
+    for code in reversed(range(len(RARITY_TIERS) - 1)):
+        cutoff = int(n * percentiles[RARITY_TIERS[code]])
+        codes[ranks < cutoff] = code
+    return [RARITY_TIERS[c] for c in codes]
+
+
+def assign_costs(
+    rarities: Sequence[str],
+    scores: np.ndarray,
+    cost_distribution: Dict[int, float],
+    prior_costs: Optional[Sequence] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    按费用曲线分配费用，并让每个费用段内的稀有度比例与整体近似。
+
+    Args:
+        rarities: 每个条目的稀有度。
+        scores: 每个条目的评分，同稀有度内评分高者先分配到低费段名额。
+        cost_distribution: 费用 -> 比例。
+        prior_costs: 条目原有的 cost 字段，仅在舍入导致补位时参与已用名额的统计。
+
+    Returns:
+        (costs, mask)：mask 为 True 的条目需要写入 costs 中的新费用，
+        其余条目保留原有 cost。
+    """
+    n = len(rarities)
+    costs = np.zeros(n, dtype=np.int64)
+    assigned = np.zeros(n, dtype=bool)
+    if n == 0:
+        return costs, assigned
+
+    # 1) 全局费用配额
+    cost_quota = rounded_quota(n, cost_distribution)
+
+    # 2) 整体稀有度占比（按首次出现顺序，与原实现的字典顺序一致）
+    labels, codes = factorize(rarities)
+    counts = np.bincount(codes, minlength=len(labels))
+    share = {r: counts[k] / n for k, r in enumerate(labels)}
+
+    # 3) 按稀有度分桶：同桶内评分从高到低（稳定排序）
+    order = np.lexsort((-np.asarray(scores, dtype=np.float64), codes))
+    bounds = np.concatenate(([0], np.cumsum(counts)))
+    cursor = bounds[:-1].copy()
+
+    # 4) 逐费用段、逐稀有度配额切片分配
+    for c in sorted(cost_quota):
+        q = cost_quota[c]
+        quota_r = rounded_quota(q, share) if q > 0 else {}
+        for k, r in enumerate(labels):
+            take = min(quota_r.get(r, 0), bounds[k + 1] - cursor[k])
+            if take <= 0:
+                continue
+            picked = order[cursor[k] : cursor[k] + take]
+            costs[picked] = c
+            assigned[picked] = True
+            cursor[k] += take
+
+    # 5) 舍入导致的剩余条目，按剩余名额依次补位
+    remaining = np.flatnonzero(~assigned)
+    if len(remaining):
+        assigned_counts = Counter(costs[assigned].tolist())
+        fill_costs: List[int] = []
+        for c, q in cost_quota.items():
+            used = assigned_counts[c]
+            if prior_costs is not None:
+                used += sum(1 for i in remaining if prior_costs[i] == c)
+            fill_costs += [c] * max(0, q - used)
+        for i, c in zip(remaining, fill_costs):
+            costs[i] = c
+            assigned[i] = True
+
+    return costs, assigned
+
+
+def integer_points(
+    costs: np.ndarray,
+    rarities: Sequence[str],
+    scores: np.ndarray,
+    totals: np.ndarray,
+    rarity_int_bonus: Dict[str, int],
+    clamp_low: int,
+    clamp_high: int,
+) -> np.ndarray:
+    """
+    计算整数 points：
+    S = 2*cost + 1 + 稀有度偏移 + 热度偏移 + 分层偏移，并 clamp 到
+    [2*cost + clamp_low, 2*cost + clamp_high]。
+
+    分层偏移在“同费 + 同稀有度”组内计算：评分不低于组内 70% 分位为 +1，
+    不高于 30% 分位为 -1。分组与分位数通过一次 lexsort 得到。
+    """
+    n = len(costs)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    costs = np.asarray(costs, dtype=np.int64)
+    scores = np.asarray(scores, dtype=np.float64)
+    totals = np.asarray(totals, dtype=np.float64)
+    labels, codes = factorize(rarities)
+
+    # 组内按评分升序排列，组 = (cost, rarity)
+    order = np.lexsort((scores, codes, costs))
+    sorted_costs = costs[order]
+    sorted_codes = codes[order]
+    new_group = np.ones(n, dtype=bool)
+    new_group[1:] = (sorted_costs[1:] != sorted_costs[:-1]) | (
+        sorted_codes[1:] != sorted_codes[:-1]
+    )
+    starts = np.flatnonzero(new_group)
+    sizes = np.diff(np.append(starts, n))
+    group_of_sorted = np.cumsum(new_group) - 1
+
+    sorted_scores = scores[order]
+    q30 = sorted_scores[starts + np.maximum(0, np.floor(sizes * 0.3).astype(np.int64) - 1)]
+    q70 = sorted_scores[starts + np.maximum(0, np.floor(sizes * 0.7).astype(np.int64) - 1)]
+
+    group = np.empty(n, dtype=np.int64)
+    group[order] = group_of_sorted
+    t_offset = np.where(
+        scores >= q70[group], 1, np.where(scores <= q30[group], -1, 0)
+    )
+
+    bonus_of_label = np.array([rarity_int_bonus.get(r, 0) for r in labels], dtype=np.int64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        hot = np.minimum(1, np.floor(np.log10(totals + 1) * 0.3))
+    hot_bonus = np.where(totals > 0, hot, 0).astype(np.int64)
+
+    points = 2 * costs + 1 + bonus_of_label[codes] + hot_bonus + t_offset
+    return np.clip(points, 2 * costs + clamp_low, 2 * costs + clamp_high)
+
+
+def comprehensive_popularity(
+    collects: np.ndarray,
+    edge_char: np.ndarray,
+    edge_anime: np.ndarray,
+    anime_bonus: Dict[int, int],
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    综合人气分 = 收藏数 + 该角色关联的精选番剧中最大的稀有度加成。
+
+    Args:
+        collects: 每个角色的收藏数。
+        edge_char / edge_anime: 角色→番剧边数组（角色下标, 番剧 ID），按原始顺序排列。
+        anime_bonus: 精选番剧 ID -> 稀有度加成。
+
+    Returns:
+        (popularity, selected)：每个角色的综合人气分，以及每条边是否指向精选番剧。
+    """
+    if anime_bonus:
+        bonus_ids = np.fromiter(anime_bonus, dtype=np.int64, count=len(anime_bonus))
+        bonus_values = np.fromiter(
+            anime_bonus.values(), dtype=np.int64, count=len(anime_bonus)
+        )
+        by_id = np.argsort(bonus_ids)
+        bonus_ids, bonus_values = bonus_ids[by_id], bonus_values[by_id]
+        pos = np.clip(np.searchsorted(bonus_ids, edge_anime), 0, len(bonus_ids) - 1)
+        selected = bonus_ids[pos] == edge_anime
+    else:
+        pos = np.zeros(len(edge_anime), dtype=np.int64)
+        bonus_values = np.zeros(1, dtype=np.int64)
+        selected = np.zeros(len(edge_anime), dtype=bool)
+
+    max_bonus = np.zeros(len(collects), dtype=np.int64)
+    np.maximum.at(max_bonus, edge_char[selected], bonus_values[pos[selected]])
+    return np.asarray(collects, dtype=np.int64) + max_bonus, selected
+
+
+def select_top_characters(
+    char_ids: np.ndarray,
+    popularity: np.ndarray,
+    edge_char: np.ndarray,
+    edge_anime: np.ndarray,
+    top_n: int,
+) -> np.ndarray:
+    """
+    每部番剧取综合人气分最高的 top_n 个角色，按角色 ID 去重后
+    再按综合人气分降序排序，返回角色下标数组。
+
+    char_ids 中小于 0 的 ID 视为缺失并被跳过。并列时保持与原实现相同的顺序：
+    番剧按首次出现顺序、番剧内按边的原始顺序；重复 ID 保留首次出现的位置，
+    取人气分最高者（并列取最早）。
+    """
+    if len(edge_char) == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    # 每部番剧内按人气分降序（稳定），番剧按首次出现顺序
+    _, groups = factorize(edge_anime.tolist())
+    edge_pop = popularity[edge_char]
+    order = np.lexsort((-edge_pop, groups))
+    sorted_groups = groups[order]
+    starts = np.flatnonzero(np.r_[True, sorted_groups[1:] != sorted_groups[:-1]])
+    rank = np.arange(len(order)) - np.repeat(starts, np.diff(np.r_[starts, len(order)]))
+    chosen = edge_char[order[rank < top_n]]
+    chosen = chosen[char_ids[chosen] >= 0]
+    if len(chosen) == 0:
+        return chosen
+
+    # 按 ID 去重：位置取首次出现，内容取人气分最高且最早的一条
+    ids = char_ids[chosen]
+    seq = np.arange(len(chosen))
+    _, first_seen = np.unique(ids, return_index=True)
+    best_order = np.lexsort((seq, -popularity[chosen], ids))
+    best_ids = ids[best_order]
+    is_first = np.r_[True, best_ids[1:] != best_ids[:-1]]
+    best = chosen[best_order[is_first]]  # 与 np.unique 一样按 ID 升序
+    unique_chars = best[np.argsort(first_seen, kind="stable")]
+
+    # 最终按综合人气分降序（稳定）
+    return unique_chars[np.argsort(-popularity[unique_chars], kind="stable")]
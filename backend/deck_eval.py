@@ -0,0 +1,185 @@
+"""
+Deck power evaluation.
+
+A deck (``savedDecks`` in user saves) is a list of anime ids plus a list of
+character ids.  ``evaluate`` scores one against the catalog: cost curve,
+points, rarity mix, tag synergy (``SynergyIndex.deck_synergy``) and how many
+of the deck's characters have one of their anime in the deck (``GraphIndex``)
+and which of them share a voice actor (``PersonIndex``).
+
+Results are memoized in a process-wide LRU keyed by the catalog version and a
+canonical hash of the deck, so the same deck saved by many users, or asked for
+again by matchmaking, is computed once per catalog build.
+"""
+
+import hashlib
+import json
+import threading
+from collections import Counter, OrderedDict
+from typing import Dict, List, Sequence, Tuple, Union
+
+DECK_CACHE_SIZE = 4096
+MAX_BATCH_DECKS = 200
+RARITY_ORDER = ["UR", "HR", "SSR", "SR", "R", "N"]
+
+
+class DeckError(ValueError):
+    """The request body is not a deck."""
+
+
+class LRUCache:
+    """A small thread-safe LRU mapping."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return self._data[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+_results = LRUCache(DECK_CACHE_SIZE)
+
+
+def _ids(value, field: str) -> List[int]:
+    if value is None:
+        return []
+    if not isinstance(value, list):
+        raise DeckError(f"{field} must be a list of card IDs")
+    try:
+        return [int(i) for i in value]
+    except (TypeError, ValueError):
+        raise DeckError(f"{field} must be a list of card IDs") from None
+
+
+def parse_deck(body) -> Tuple[List[int], List[int]]:
+    """
+    Accept a saved ``Deck`` object (``{"anime": [...], "character": [...]}``)
+    or a bare list of anime ids.
+    """
+    if isinstance(body, list):
+        return _ids(body, "deck"), []
+    if not isinstance(body, dict):
+        raise DeckError("deck must be an object with anime/character ID lists")
+    return _ids(body.get("anime"), "anime"), _ids(body.get("character"), "character")
+
+
+def deck_hash(anime: Sequence[int], characters: Sequence[int]) -> str:
+    """Order-independent hash of a deck; duplicates count."""
+    canonical = json.dumps([sorted(anime), sorted(characters)], separators=(",", ":"))
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+def _rarity_mix(rarities) -> Dict[str, int]:
+    counts = Counter(rarities)
+    return {r: counts[r] for r in RARITY_ORDER if counts.get(r)}
+
+
+def compute_metrics(catalog, anime: Sequence[int], characters: Sequence[int]) -> dict:
+    """Deck metrics against ``catalog``, uncached."""
+    store = catalog.anime
+    records = [store.get(i) for i in anime] if store is not None else []
+    known = [r for r in records if r is not None]
+    unknown = [i for i, r in zip(anime, records) if r is None]
+
+    costs = [r.cost for r in known]
+    points = [r.points for r in known]
+    total_cost = sum(costs)
+    curve = Counter(costs)
+
+    index = catalog.synergy("anime")
+    synergy = (
+        index.deck_synergy([r.id for r in known])
+        if index is not None
+        else {"score": 0.0, "core_tags": []}
+    )
+
+    # Character side: 1-hop lookups in the character <-> anime graph
+    character_store = catalog.characters
+    graph = catalog.graph()
+    deck_anime = {r.id for r in known}
+    found, available = [], 0
+    if character_store is not None:
+        found = [r for r in (character_store.get(c) for c in characters) if r is not None]
+        available = sum(1 for c in graph.characters_of_many(deck_anime) if c in character_store)
+    found_ids = {r.id for r in found}
+    covered = [r.id for r in found if deck_anime.intersection(graph.anime_of(r.id))]
+    voices = catalog.voices()
+    voice_pairs = voices.voice_pairs(r.id for r in found) if voices is not None else []
+
+    return {
+        "anime_count": len(anime),
+        "unique_anime": len(set(anime)),
+        "unknown_anime": unknown,
+        "cost_curve": {str(cost): curve[cost] for cost in sorted(curve)},
+        "mean_cost": round(total_cost / len(known), 3) if known else 0.0,
+        "total_points": sum(points),
+        "mean_points": round(sum(points) / len(known), 3) if known else 0.0,
+        "points_per_cost": round(sum(points) / total_cost, 3) if total_cost else 0.0,
+        "rarity": _rarity_mix(r.rarity for r in known),
+        "synergy": synergy,
+        "characters": {
+            "count": len(characters),
+            "unknown": [c for c in characters if c not in found_ids],
+            "rarity": _rarity_mix(r.rarity for r in found),
+            "covered": len(covered),
+            "coverage": round(len(covered) / len(found), 3) if found else 0.0,
+            "uncovered": [r.id for r in found if r.id not in covered],
+            "available": available,
+            "same_voice": voice_pairs,
+        },
+    }
+
+
+def evaluate(catalog, deck) -> dict:
+    """Metrics for one deck (any shape ``parse_deck`` accepts), memoized."""
+    anime, characters = parse_deck(deck)
+    digest = deck_hash(anime, characters)
+    key = (catalog.version, digest)
+    metrics = _results.get(key)
+    if metrics is None:
+        metrics = compute_metrics(catalog, anime, characters)
+        _results.put(key, metrics)
+    return {"hash": digest, **metrics}
+
+
+def evaluate_batch(catalog, decks) -> Union[dict, list]:
+    """
+    Evaluate many decks.  ``decks`` is a list, or a name -> deck mapping such
+    as a user's ``savedDecks``; results come back in the same shape.
+    """
+    if not isinstance(decks, (dict, list)):
+        raise DeckError("decks must be a list or an object of decks")
+    if len(decks) > MAX_BATCH_DECKS:
+        raise DeckError(f"At most {MAX_BATCH_DECKS} decks per request")
+    if isinstance(decks, dict):
+        return {name: evaluate(catalog, deck) for name, deck in decks.items()}
+    return [evaluate(catalog, deck) for deck in decks]
+
+
+def cache_stats() -> dict:
+    return {"size": len(_results), "hits": _results.hits, "misses": _results.misses}
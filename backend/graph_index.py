@@ -0,0 +1,268 @@
+"""
+Character <-> anime bipartite graph.
+
+Relations live on both sides of the data: characters carry ``anime_ids`` and
+anime carry ``main_character_ids``.  This module merges the two into one
+undirected graph, built once, stored as CSR adjacency arrays in both
+directions:
+
+- ``anime_indptr`` / ``anime_links``: anime row -> character rows;
+- ``character_indptr`` / ``character_links``: character row -> anime rows.
+
+Node ids map to rows through a dict, so a neighbour query is one slice
+(O(degree)) and a 2-hop query ("anime sharing a character with X") touches
+only the neighbours' neighbour lists.  Names are kept per node so pipeline
+scripts can resolve ids without their own lookup tables.
+
+The server gets it through ``Catalog.graph()``, cached as an ``.npz`` artifact
+next to the card stores; pipeline scripts call ``GraphIndex.build`` on the
+catalogs they already read.
+"""
+
+import logging
+import os
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from atomic_file import AtomicFile
+
+
+def _csr(src: np.ndarray, dst: np.ndarray, n_src: int) -> Tuple[np.ndarray, np.ndarray]:
+    """CSR arrays for edges ``src -> dst`` (destinations sorted within a row)."""
+    order = np.lexsort((dst, src))
+    indptr = np.zeros(n_src + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=n_src), out=indptr[1:])
+    return indptr, dst[order].astype(np.int32)
+
+
+class GraphIndex:
+    """CSR adjacency for the character <-> anime graph."""
+
+    def __init__(
+        self,
+        anime_ids: np.ndarray,
+        anime_names: Sequence[str],
+        character_ids: np.ndarray,
+        character_names: Sequence[str],
+        anime_indptr: np.ndarray,
+        anime_links: np.ndarray,
+        character_indptr: np.ndarray,
+        character_links: np.ndarray,
+        signature: str = "",
+    ):
+        self.anime_ids = anime_ids
+        self.anime_names = list(anime_names)
+        self.character_ids = character_ids
+        self.character_names = list(character_names)
+        self.anime_row = {int(i): row for row, i in enumerate(anime_ids.tolist())}
+        self.character_row = {int(i): row for row, i in enumerate(character_ids.tolist())}
+        self.anime_indptr = anime_indptr
+        self.anime_links = anime_links
+        self.character_indptr = character_indptr
+        self.character_links = character_links
+        self.signature = signature
+
+    # --- construction / persistence ---
+
+    @classmethod
+    def build(
+        cls,
+        anime: Iterable[dict] = (),
+        characters: Iterable[dict] = (),
+        signature: str = "",
+    ) -> "GraphIndex":
+        """
+        Merge the edges of both catalogs.  Either side may be empty; ids that
+        are only referenced (not present as records) still become nodes, with
+        an empty name.
+        """
+        anime_names = {}
+        character_names = {}
+        edges = set()
+        for item in anime:
+            if item.get("id") is None:
+                continue
+            anime_id = int(item["id"])
+            anime_names[anime_id] = item.get("name") or ""
+            for char_id in item.get("main_character_ids") or ():
+                edges.add((anime_id, int(char_id)))
+        for item in characters:
+            if item.get("id") is None:
+                continue
+            char_id = int(item["id"])
+            character_names[char_id] = item.get("name") or ""
+            for anime_id in item.get("anime_ids") or ():
+                edges.add((int(anime_id), char_id))
+
+        anime_ids = np.array(
+            sorted(set(anime_names) | {a for a, _ in edges}), dtype=np.int64
+        )
+        character_ids = np.array(
+            sorted(set(character_names) | {c for _, c in edges}), dtype=np.int64
+        )
+        pairs = np.array(sorted(edges), dtype=np.int64).reshape(-1, 2)
+        anime_rows = np.searchsorted(anime_ids, pairs[:, 0])
+        character_rows = np.searchsorted(character_ids, pairs[:, 1])
+        anime_indptr, anime_links = _csr(anime_rows, character_rows, len(anime_ids))
+        character_indptr, character_links = _csr(character_rows, anime_rows, len(character_ids))
+        return cls(
+            anime_ids,
+            [anime_names.get(i, "") for i in anime_ids.tolist()],
+            character_ids,
+            [character_names.get(i, "") for i in character_ids.tolist()],
+            anime_indptr,
+            anime_links,
+            character_indptr,
+            character_links,
+            signature,
+        )
+
+    def save(self, path: str):
+        """Write the artifact atomically (temp file + rename)."""
+        with AtomicFile(path, suffix=".npz") as f:
+            np.savez(
+                f,
+                anime_ids=self.anime_ids,
+                anime_names=np.array(self.anime_names, dtype=str),
+                character_ids=self.character_ids,
+                character_names=np.array(self.character_names, dtype=str),
+                anime_indptr=self.anime_indptr,
+                anime_links=self.anime_links,
+                character_indptr=self.character_indptr,
+                character_links=self.character_links,
+                signature=np.array(self.signature),
+            )
+
+    @classmethod
+    def load(cls, path: str) -> "GraphIndex":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                data["anime_ids"],
+                data["anime_names"].tolist(),
+                data["character_ids"],
+                data["character_names"].tolist(),
+                data["anime_indptr"],
+                data["anime_links"],
+                data["character_indptr"],
+                data["character_links"],
+                str(data["signature"]),
+            )
+
+    # --- queries ---
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.anime_links)
+
+    def _anime_neighbours(self, row: int) -> np.ndarray:
+        return self.anime_links[self.anime_indptr[row] : self.anime_indptr[row + 1]]
+
+    def _character_neighbours(self, row: int) -> np.ndarray:
+        return self.character_links[self.character_indptr[row] : self.character_indptr[row + 1]]
+
+    def characters_of(self, anime_id: int) -> List[int]:
+        """Ids of the characters linked to one anime."""
+        row = self.anime_row.get(anime_id)
+        if row is None:
+            return []
+        return self.character_ids[self._anime_neighbours(row)].tolist()
+
+    def anime_of(self, character_id: int) -> List[int]:
+        """Ids of the anime one character appears in."""
+        row = self.character_row.get(character_id)
+        if row is None:
+            return []
+        return self.anime_ids[self._character_neighbours(row)].tolist()
+
+    def anime_name(self, anime_id: int) -> Optional[str]:
+        row = self.anime_row.get(anime_id)
+        return None if row is None or not self.anime_names[row] else self.anime_names[row]
+
+    def anime_names_of(self, anime_ids: Iterable[int]) -> List[str]:
+        """Names of the given anime, skipping ids without a named record."""
+        names = []
+        for anime_id in anime_ids:
+            name = self.anime_name(anime_id)
+            if name is not None:
+                names.append(name)
+        return names
+
+    def characters_of_many(self, anime_ids: Iterable[int]) -> List[int]:
+        """Distinct characters linked to any of ``anime_ids``."""
+        rows = [self.anime_row[i] for i in anime_ids if i in self.anime_row]
+        if not rows:
+            return []
+        linked = np.concatenate([self._anime_neighbours(r) for r in rows])
+        return self.character_ids[np.unique(linked)].tolist()
+
+    def related_anime(self, anime_id: int, limit: Optional[int] = None) -> List[dict]:
+        """
+        Anime sharing at least one character with ``anime_id`` (2 hops),
+        most shared characters first: [{id, shared}].
+        """
+        row = self.anime_row.get(anime_id)
+        if row is None:
+            return []
+        characters = self._anime_neighbours(row)
+        if len(characters) == 0:
+            return []
+        reached = np.concatenate([self._character_neighbours(c) for c in characters.tolist()])
+        others, shared = np.unique(reached[reached != row], return_counts=True)
+        order = np.lexsort((others, -shared))[:limit]
+        return [
+            {"id": int(self.anime_ids[others[i]]), "shared": int(shared[i])}
+            for i in order.tolist()
+        ]
+
+    def co_characters(self, character_id: int, limit: Optional[int] = None) -> List[dict]:
+        """
+        Characters appearing in the same anime as ``character_id`` (2 hops),
+        most shared anime first: [{id, shared}].
+        """
+        row = self.character_row.get(character_id)
+        if row is None:
+            return []
+        anime = self._character_neighbours(row)
+        if len(anime) == 0:
+            return []
+        reached = np.concatenate([self._anime_neighbours(a) for a in anime.tolist()])
+        others, shared = np.unique(reached[reached != row], return_counts=True)
+        order = np.lexsort((others, -shared))[:limit]
+        return [
+            {"id": int(self.character_ids[others[i]]), "shared": int(shared[i])}
+            for i in order.tolist()
+        ]
+
+
+def open_index(anime_source, character_source, cache_dir: str) -> Optional[GraphIndex]:
+    """
+    Load the graph artifact for a pair of catalog sources, rebuilding it when
+    either changed.  Returns None when both sources are missing.
+    """
+    anime_signature = anime_source.signature()
+    character_signature = character_source.signature()
+    if anime_signature is None and character_signature is None:
+        return None
+    signature = f"{anime_signature}|{character_signature}"
+
+    path = os.path.join(cache_dir, f"{anime_source.name}-{character_source.name}.graph.npz")
+    if os.path.exists(path):
+        try:
+            index = GraphIndex.load(path)
+            if index.signature == signature:
+                return index
+        except (OSError, ValueError, KeyError):
+            pass
+
+    index = GraphIndex.build(
+        anime_source.records() if anime_signature else (),
+        character_source.records() if character_signature else (),
+        signature=signature,
+    )
+    index.save(path)
+    logging.info(
+        f"Built graph of {len(index.anime_ids)} anime and {len(index.character_ids)} "
+        f"characters ({index.edge_count} edges) into {path}"
+    )
+    return index
@@ -0,0 +1,444 @@
+"""
+管线脚本的分阶段计时与剖析工具
+
+抓取与构建脚本原先只输出进度字符串或 tqdm 进度条，无法判断时间花在了网络、
+JSON 解析、pydantic 校验、磁盘写入还是 sleep 上。本模块提供：
+
+- span(name):        命名区段，可用作上下文管理器或装饰器，支持嵌套（统计自身耗时）
+- count(name, n):    计数器
+- observe(name, v):  直方图（对数分桶，给出近似分位数）
+- sleep(seconds):    计入 "sleep" 区段的 time.sleep
+- add_arguments / session:
+                     为 CLI 添加 --profile / --trace 参数，并在运行结束时打印分阶段
+                     耗时表、按需写出 JSON trace（兼容 chrome://tracing 与 Perfetto）
+
+管线脚本一律以 backend.instrumentation 导入（backend/ 下的脚本先把项目根目录加入
+sys.path），与 bangumi_asset 的模块相同：以另一个名字导入会得到第二份互不相通的记录，
+bangumi_api 的区段就不会出现在脚本的报告里。典型用法：
+
+    from backend import instrumentation
+
+    parser = argparse.ArgumentParser()
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    with instrumentation.session("process_cards", args):
+        with instrumentation.span("io.read"):
+            ...
+
+未进入 session 时各函数照常记录，但不会输出任何内容，开销只有两次 perf_counter。
+"""
+
+import cProfile
+import json
+import math
+import os
+import pstats
+import signal
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+DEFAULT_TRACE_DIR = Path(__file__).resolve().parent.parent / "data" / "traces"
+MAX_TRACE_EVENTS = 200_000
+SAMPLE_INTERVAL = 0.005
+# 直方图每个 2 倍区间分 4 个桶，相对误差约 19%
+BUCKETS_PER_OCTAVE = 4
+
+
+class Histogram:
+    """对数分桶直方图：精确记录 count/sum/min/max，分位数取桶的上界近似。"""
+
+    __slots__ = ("count", "total", "min", "max", "zeros", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.zeros = 0
+        self.buckets: Dict[int, int] = defaultdict(int)
+
+    def add(self, value: float):
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        if value <= 0:
+            self.zeros += 1
+        else:
+            self.buckets[math.floor(math.log2(value) * BUCKETS_PER_OCTAVE)] += 1
+
+    def quantile(self, q: float) -> float:
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = self.zeros
+        if seen >= rank:
+            return min(0.0, self.max)
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                upper = 2 ** ((bucket + 1) / BUCKETS_PER_OCTAVE)
+                return min(max(upper, self.min), self.max)
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "min": self.min if self.count else 0,
+            "max": self.max if self.count else 0,
+            "mean": self.total / self.count if self.count else 0,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+
+class SpanStats:
+    __slots__ = ("calls", "total", "self_time", "durations")
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.self_time = 0.0
+        self.durations = Histogram()
+
+
+class Recorder:
+    """一次运行内的区段、计数器、直方图与 trace 事件。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.origin = time.perf_counter()
+            self.spans: Dict[str, SpanStats] = defaultdict(SpanStats)
+            self.counters: Dict[str, float] = defaultdict(float)
+            self.histograms: Dict[str, Histogram] = defaultdict(Histogram)
+            self.events: List[dict] = []
+            self.dropped_events = 0
+
+    def _stack(self) -> list:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def enter(self, name: str):
+        # 栈元素: [名称, 开始时间, 子区段累计耗时]
+        self._stack().append([name, time.perf_counter(), 0.0])
+
+    def exit(self):
+        end = time.perf_counter()
+        stack = self._stack()
+        name, start, child_time = stack.pop()
+        duration = end - start
+        if stack:
+            stack[-1][2] += duration
+        with self._lock:
+            stats = self.spans[name]
+            stats.calls += 1
+            stats.total += duration
+            stats.self_time += duration - child_time
+            stats.durations.add(duration * 1000)
+            if len(self.events) < MAX_TRACE_EVENTS:
+                self.events.append(
+                    {
+                        "name": name,
+                        "ph": "X",
+                        "ts": round((start - self.origin) * 1e6, 1),
+                        "dur": round(duration * 1e6, 1),
+                        "pid": os.getpid(),
+                        "tid": threading.get_ident(),
+                    }
+                )
+            else:
+                self.dropped_events += 1
+
+    def count(self, name: str, n: float = 1):
+        with self._lock:
+            self.counters[name] += n
+
+    def observe(self, name: str, value: float):
+        with self._lock:
+            self.histograms[name].add(value)
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                "spans": {
+                    name: {
+                        "calls": s.calls,
+                        "total_seconds": s.total,
+                        "self_seconds": s.self_time,
+                        "ms": s.durations.to_dict(),
+                    }
+                    for name, s in self.spans.items()
+                },
+                "counters": dict(self.counters),
+                "histograms": {n: h.to_dict() for n, h in self.histograms.items()},
+            }
+
+
+_recorder = Recorder()
+
+
+class span:
+    """
+    命名区段。可用作上下文管理器：
+
+        with span("json.parse"):
+            data = json.loads(text)
+
+    也可用作装饰器：
+
+        @span("curate.anime")
+        def curate_anime(...): ...
+    """
+
+    __slots__ = ("name",)
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        _recorder.enter(self.name)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _recorder.exit()
+        return False
+
+    def __call__(self, func):
+        name = self.name
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            _recorder.enter(name)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _recorder.exit()
+
+        return wrapper
+
+
+def count(name: str, n: float = 1):
+    """计数器加 n。"""
+    _recorder.count(name, n)
+
+
+def observe(name: str, value: float):
+    """向直方图 name 记录一个数值。"""
+    _recorder.observe(name, value)
+
+
+def sleep(seconds: float):
+    """time.sleep，耗时计入 "sleep" 区段（用于限速等待）。"""
+    with span("sleep"):
+        time.sleep(seconds)
+
+
+def summary() -> dict:
+    return _recorder.summary()
+
+
+# --- 剖析器 ---
+
+
+class SamplingProfiler:
+    """
+    基于 SIGALRM 的采样剖析器：每 interval 秒（墙钟时间）记录一次主线程调用栈，
+    因此等待网络与 sleep 的时间也会被采到。输出 flamegraph.pl / speedscope
+    可读的 folded 格式。开销远小于 cProfile，适合长时间运行的抓取脚本。
+    仅支持类 Unix 系统。
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self.samples: Counter = Counter()
+
+    @staticmethod
+    def available() -> bool:
+        return hasattr(signal, "setitimer") and hasattr(signal, "SIGALRM")
+
+    def _handle(self, signum, frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        self.samples[";".join(reversed(stack))] += 1
+
+    def start(self):
+        signal.signal(signal.SIGALRM, self._handle)
+        signal.setitimer(signal.ITIMER_REAL, self.interval, self.interval)
+
+    def stop(self):
+        signal.setitimer(signal.ITIMER_REAL, 0, 0)
+        signal.signal(signal.SIGALRM, signal.SIG_DFL)
+
+    def write(self, path: Path):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, n in self.samples.most_common():
+                f.write(f"{stack} {n}\n")
+
+    def print_top(self, limit: int = 20):
+        own = Counter()
+        for stack, n in self.samples.items():
+            own[stack.rsplit(";", 1)[-1]] += n
+        total = sum(own.values()) or 1
+        print(f"\n采样剖析（共 {total} 个样本，按自身样本数）:")
+        for frame, n in own.most_common(limit):
+            print(f"  {n / total * 100:6.1f}%  {frame}")
+
+
+# --- CLI 集成 ---
+
+
+def add_arguments(parser):
+    """为脚本添加 --profile 与 --trace 参数。"""
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="cprofile",
+        choices=["cprofile", "sample"],
+        default=None,
+        help="剖析整个运行：cprofile（默认，确定性）或 sample（墙钟采样）",
+    )
+    parser.add_argument(
+        "--trace",
+        nargs="?",
+        const="",
+        default=None,
+        metavar="PATH",
+        help=f"写出 JSON trace（默认 {DEFAULT_TRACE_DIR}/<脚本名>_<时间>.json）",
+    )
+
+
+def print_breakdown(name: str, wall: float, data: Optional[dict] = None):
+    """打印分阶段耗时表、计数器与直方图。"""
+    data = data or summary()
+    spans = sorted(data["spans"].items(), key=lambda kv: kv[1]["self_seconds"], reverse=True)
+    print(f"\n=== {name} 耗时分解（总计 {wall:.2f}s）===")
+    if spans:
+        print(
+            f"{'区段':<28} {'调用次数':>9} {'总耗时(s)':>10} {'自身(s)':>9} {'占比':>7}"
+            f" {'均值(ms)':>10} {'p95(ms)':>10}"
+        )
+        for span_name, s in spans:
+            share = s["self_seconds"] / wall * 100 if wall else 0
+            print(
+                f"{span_name:<28} {s['calls']:>9} {s['total_seconds']:>10.3f}"
+                f" {s['self_seconds']:>9.3f} {share:>6.1f}% {s['ms']['mean']:>10.3f}"
+                f" {s['ms']['p95']:>10.3f}"
+            )
+        untracked = wall - sum(s["self_seconds"] for _, s in spans)
+        print(f"{'(未归入区段)':<28} {'':>9} {'':>10} {untracked:>9.3f} {untracked / wall * 100 if wall else 0:>6.1f}%")
+    if data["counters"]:
+        print("计数器:")
+        for counter, value in sorted(data["counters"].items()):
+            print(f"  {counter:<36} {value:g}")
+    if data["histograms"]:
+        print("直方图:")
+        for hist, h in sorted(data["histograms"].items()):
+            print(
+                f"  {hist:<36} n={h['count']} mean={h['mean']:.1f}"
+                f" p50={h['p50']:.1f} p95={h['p95']:.1f} max={h['max']:.1f}"
+            )
+
+
+def write_trace(name: str, path: Path, wall: float, started_at: str) -> Path:
+    """写出 JSON trace：汇总数据 + Chrome trace 事件。"""
+    data = summary()
+    trace = {
+        "name": name,
+        "argv": sys.argv,
+        "started_at": started_at,
+        "wall_seconds": wall,
+        **data,
+        "dropped_events": _recorder.dropped_events,
+        "traceEvents": list(_recorder.events),
+        "displayTimeUnit": "ms",
+    }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(trace, f, ensure_ascii=False)
+    return path
+
+
+def _output_path(name: str, option: Optional[str], stamp: str, suffix: str) -> Path:
+    if option:
+        return Path(option).with_suffix(suffix) if suffix != ".json" else Path(option)
+    return DEFAULT_TRACE_DIR / f"{name}_{stamp}{suffix}"
+
+
+@contextmanager
+def session(name: str, args=None) -> Iterator[None]:
+    """
+    包裹一次脚本运行：重置记录器，按 args.profile 启动剖析器，
+    结束时打印耗时分解表，并在指定 --trace 时写出 JSON trace。
+    """
+    profile_mode = getattr(args, "profile", None)
+    trace_option = getattr(args, "trace", None)
+    started = datetime.now()
+    stamp = started.strftime("%Y%m%d_%H%M%S")
+
+    profiler = None
+    if profile_mode == "sample" and not SamplingProfiler.available():
+        print("当前平台不支持采样剖析，改用 cProfile。")
+        profile_mode = "cprofile"
+    if profile_mode == "sample":
+        profiler = SamplingProfiler()
+    elif profile_mode == "cprofile":
+        profiler = cProfile.Profile()
+
+    _recorder.reset()
+    start = time.perf_counter()
+    if isinstance(profiler, cProfile.Profile):
+        profiler.enable()
+    elif profiler is not None:
+        profiler.start()
+    try:
+        yield
+    finally:
+        if isinstance(profiler, cProfile.Profile):
+            profiler.disable()
+        elif profiler is not None:
+            profiler.stop()
+        wall = time.perf_counter() - start
+
+        print_breakdown(name, wall)
+        if isinstance(profiler, cProfile.Profile):
+            path = _output_path(name, trace_option, stamp, ".prof")
+            path.parent.mkdir(parents=True, exist_ok=True)
+            profiler.dump_stats(str(path))
+            print("\ncProfile（按累计耗时前 25 项）:")
+            pstats.Stats(profiler).sort_stats("cumulative").print_stats(25)
+            print(f"cProfile 数据已保存到: {path}")
+        elif profiler is not None:
+            path = _output_path(name, trace_option, stamp, ".folded")
+            path.parent.mkdir(parents=True, exist_ok=True)
+            profiler.write(path)
+            profiler.print_top()
+            print(f"采样调用栈（folded 格式）已保存到: {path}")
+        if trace_option is not None:
+            path = write_trace(
+                name,
+                _output_path(name, trace_option, stamp, ".json"),
+                wall,
+                started.isoformat(timespec="seconds"),
+            )
+            print(f"JSON trace 已保存到: {path}")
@@ -0,0 +1,211 @@
+"""
+流式 JSON 读写工具
+
+聚合目录（如 all_cards.json）可能包含十万级条目，一次性 json.load / json.dump
+会让峰值内存随数据量线性增长。本模块按条目逐个读写：
+
+- 写：JsonArrayWriter 逐条写入 JSON 数组（输出与 json.dump(indent=...) 一致），
+  或者在文件后缀为 .ndjson / .jsonl 时写成每行一条的 NDJSON。
+- 读：iter_records 逐条解析 JSON 数组或 NDJSON 文件，内存只与单条记录大小相关。
+
+写入先落到临时文件，完成后再原子替换目标文件（见 atomic_file.py），
+读者不会读到写了一半的文件，文件权限与直接 open() 写出的一致。
+"""
+
+import json
+import os
+import tempfile
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
+
+from atomic_file import AtomicFile
+
+NDJSON_SUFFIXES = (".ndjson", ".jsonl")
+READ_CHUNK_SIZE = 1 << 16
+
+_decoder = json.JSONDecoder()
+
+
+def is_ndjson(path: str) -> bool:
+    return str(path).endswith(NDJSON_SUFFIXES)
+
+
+class JsonArrayWriter:
+    """
+    逐条写入 JSON 数组（或 NDJSON）的写入器，用作上下文管理器：
+
+        with JsonArrayWriter("data/anime/all_cards.json", indent=2) as writer:
+            for card in cards:
+                writer.write(card)
+
+    keep_empty=False 时，如果一条记录都没写，则不会创建/覆盖目标文件。
+    """
+
+    def __init__(self, path: str, indent: Optional[int] = None, keep_empty: bool = True):
+        self.path = str(path)
+        self.indent = indent
+        self.keep_empty = keep_empty
+        self.ndjson = is_ndjson(self.path)
+        self.count = 0
+        self._prefix = " " * indent if indent else ""
+        self._out = AtomicFile(
+            self.path, "w", encoding="utf-8", suffix=os.path.basename(self.path)
+        )
+        self._file = self._out.file
+
+    def write(self, record: Any):
+        if self.ndjson:
+            self._file.write(json.dumps(record, ensure_ascii=False))
+            self._file.write("\n")
+        else:
+            if self.indent:
+                text = json.dumps(record, ensure_ascii=False, indent=self.indent)
+                self._file.write("[" if self.count == 0 else ",")
+                self._file.write("\n" + self._prefix)
+                self._file.write(text.replace("\n", "\n" + self._prefix))
+            else:
+                self._file.write("[" if self.count == 0 else ", ")
+                self._file.write(json.dumps(record, ensure_ascii=False))
+        self.count += 1
+
+    def write_all(self, records: Iterable[Any]) -> int:
+        for record in records:
+            self.write(record)
+        return self.count
+
+    def close(self):
+        """结束数组并把临时文件替换到目标路径。"""
+        if self._file.closed:
+            return
+        if not self.ndjson:
+            if self.count == 0:
+                self._file.write("[]")
+            else:
+                self._file.write("\n]" if self.indent else "]")
+        if self.count == 0 and not self.keep_empty:
+            self._out.discard()
+        else:
+            self._out.commit()
+
+    def abort(self):
+        """放弃写入，保留原有目标文件。"""
+        self._out.discard()
+
+    def __enter__(self) -> "JsonArrayWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def write_records(
+    records: Iterable[Any], path: str, indent: Optional[int] = None, keep_empty: bool = True
+) -> int:
+    """将可迭代对象流式写入 path，返回写入条数。"""
+    with JsonArrayWriter(path, indent=indent, keep_empty=keep_empty) as writer:
+        return writer.write_all(records)
+
+
+def _iter_ndjson(path: str) -> Iterator[Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def _iter_json_array(path: str) -> Iterator[Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        buf = ""
+        pos = 0
+        eof = False
+        started = False
+
+        def fill(grow: bool = False) -> bool:
+            # 单条记录跨多个块时按已缓冲长度翻倍读取，避免反复解析造成平方复杂度
+            nonlocal buf, pos, eof
+            size = max(READ_CHUNK_SIZE, len(buf) - pos) if grow else READ_CHUNK_SIZE
+            chunk = f.read(size)
+            buf = buf[pos:] + chunk
+            pos = 0
+            eof = not chunk
+            return bool(chunk)
+
+        fill()
+        while True:
+            # 跳过空白、数组起始符与分隔符
+            while True:
+                while pos < len(buf) and buf[pos] in " \t\r\n":
+                    pos += 1
+                if pos < len(buf) or eof:
+                    break
+                fill(grow=True)
+            if pos >= len(buf):
+                if started:
+                    raise ValueError(f"{path}: JSON 数组未正确结束")
+                return
+            ch = buf[pos]
+            if not started:
+                if ch != "[":
+                    raise ValueError(f"{path}: 顶层不是 JSON 数组")
+                started = True
+                pos += 1
+                continue
+            if ch == "]":
+                return
+            if ch == ",":
+                pos += 1
+                continue
+
+            while True:
+                try:
+                    record, end = _decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    fill(grow=True)
+                    continue
+                # 数字等标量可能被截断在块尾（如 "2." ），确认其后紧跟分隔符
+                nxt = end
+                while nxt < len(buf) and buf[nxt] in " \t\r\n":
+                    nxt += 1
+                if eof or (nxt < len(buf) and buf[nxt] in ",]"):
+                    break
+                fill(grow=True)
+            pos = end
+            yield record
+
+
+def iter_records(path: str) -> Iterator[Any]:
+    """逐条读取 JSON 数组文件或 NDJSON 文件中的记录。"""
+    if is_ndjson(path):
+        return _iter_ndjson(path)
+    return _iter_json_array(path)
+
+
+def sorted_records(
+    records: Iterable[Any], key: Callable[[Any], Any], reverse: bool = False
+) -> Iterator[Any]:
+    """
+    外部排序：记录先溢写到临时 NDJSON 文件，内存中只保留 (排序键, 文件偏移)，
+    再按排序顺序逐条读回。排序是稳定的，结果与 sorted(records, key=key) 相同。
+
+    溢写在调用时立即完成，返回的迭代器只负责按序读回。
+    """
+    spill = tempfile.TemporaryFile("w+b")
+    index: List[Tuple[Any, int]] = []
+    for record in records:
+        index.append((key(record), spill.tell()))
+        spill.write(json.dumps(record, ensure_ascii=False).encode("utf-8"))
+        spill.write(b"\n")
+    index.sort(key=lambda item: item[0], reverse=reverse)
+    return _read_spill(spill, index)
+
+
+def _read_spill(spill, index: List[Tuple[Any, int]]) -> Iterator[Any]:
+    with spill:
+        for _, offset in index:
+            spill.seek(offset)
+            yield json.loads(spill.readline())
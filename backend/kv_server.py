@@ -0,0 +1,204 @@
+"""
+Local stand-in for the remote user-state KV service (see ``user_store.py``).
+
+It speaks the protocol ``HttpUserStore`` expects, on top of any local
+backend (in memory by default, or a directory with ``--data``):
+
+- ``GET /kv/<key>``: the JSON value with its revision in ``ETag``, or 404;
+- ``PUT /kv/<key>``: store the JSON body; ``If-Match: "<rev>"`` or
+  ``If-None-Match: *`` make it conditional (412 with the current revision on
+  conflict); returns ``{"revision": ...}``;
+- ``POST /kv/_batch``: ``{"get": [keys], "put": [{key, value, revision}]}``
+  in one round trip;
+- ``GET /_stats``: request counters.
+
+``--latency`` / ``--jitter`` add a per-request delay to mimic a store in
+another region, and ``--token`` requires ``Authorization: Bearer <token>``.
+
+    python backend/kv_server.py --port 8790 --latency 20
+    USER_STORE_URL=http://127.0.0.1:8790 python backend/server.py
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+
+from user_store import ABSENT, RevisionConflict, UserStore, open_user_store
+
+
+class KVState:
+    """Backend, configuration and counters shared by the request threads."""
+
+    def __init__(self, store: UserStore, latency: float, jitter: float, token: str = None):
+        self.store = store
+        self.latency = latency
+        self.jitter = jitter
+        self.token = token
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "gets": 0, "puts": 0, "batches": 0, "conflicts": 0}
+
+    def bump(self, name: str, n: int = 1):
+        with self._lock:
+            self.stats[name] += n
+
+    def delay(self):
+        delay = max(self.latency + random.uniform(-self.jitter, self.jitter), 0.0)
+        if delay:
+            time.sleep(delay)
+
+
+class KVHandler(BaseHTTPRequestHandler):
+    server_version = "UserKV/1.0"
+    # Keep-alive, so clients pay the connection setup once
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; don't let Nagle hold the body
+    disable_nagle_algorithm = True
+    state: KVState = None
+    verbose = False
+
+    def log_message(self, format, *args):
+        if self.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status: int, payload, headers: dict = None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length)) if length else None
+
+    def _start(self):
+        """Common request prologue; returns the path, or None if already answered."""
+        state = self.state
+        state.bump("requests")
+        path = urlsplit(self.path).path
+        if path == "/_stats":
+            self._send_json(200, state.stats)
+            return None
+        if state.token and self.headers.get("Authorization") != f"Bearer {state.token}":
+            self._body()
+            self._send_json(401, {"error": "Unauthorized"})
+            return None
+        state.delay()
+        return path
+
+    def _key(self, path: str):
+        if not path.startswith("/kv/") or path == "/kv/_batch":
+            return None
+        return unquote(path[len("/kv/"):])
+
+    def do_GET(self):
+        path = self._start()
+        if path is None:
+            return
+        key = self._key(path)
+        if key is None:
+            return self._send_json(404, {"error": "Not found"})
+        self.state.bump("gets")
+        try:
+            entry = self.state.store.get(key)
+        except ValueError as e:
+            return self._send_json(400, {"error": str(e)})
+        if entry is None:
+            return self._send_json(404, {"error": "No such key"})
+        self._send_json(200, entry.value, {"ETag": f'"{entry.revision}"'})
+
+    def do_PUT(self):
+        path = self._start()
+        if path is None:
+            return
+        key = self._key(path)
+        value = self._body()
+        if key is None:
+            return self._send_json(404, {"error": "Not found"})
+        revision = None
+        if self.headers.get("If-None-Match") == "*":
+            revision = ABSENT
+        elif self.headers.get("If-Match"):
+            revision = self.headers["If-Match"].strip('"')
+        self.state.bump("puts")
+        try:
+            new_revision = self.state.store.put(key, value, revision)
+        except RevisionConflict as e:
+            self.state.bump("conflicts")
+            return self._send_json(412, {"error": "Revision conflict", "revision": e.revision})
+        except ValueError as e:
+            return self._send_json(400, {"error": str(e)})
+        self._send_json(200, {"revision": new_revision}, {"ETag": f'"{new_revision}"'})
+
+    def do_POST(self):
+        path = self._start()
+        if path is None:
+            return
+        body = self._body() or {}
+        if path != "/kv/_batch":
+            return self._send_json(404, {"error": "Not found"})
+        state = self.state
+        state.bump("batches")
+        result = {"get": {}, "put": {}}
+        try:
+            for key, entry in state.store.get_many(body.get("get") or []).items():
+                result["get"][key] = {"value": entry.value, "revision": entry.revision}
+            puts = [(p["key"], p.get("value"), p.get("revision")) for p in body.get("put") or []]
+            for key, revision in state.store.put_many(puts).items():
+                if revision is None:
+                    state.bump("conflicts")
+                    current = state.store.get(key)
+                    result["put"][key] = {
+                        "conflict": True,
+                        "revision": current.revision if current else None,
+                    }
+                else:
+                    result["put"][key] = {"revision": revision}
+        except (KeyError, ValueError) as e:
+            return self._send_json(400, {"error": str(e)})
+        self._send_json(200, result)
+
+
+def make_server(host: str, port: int, state: KVState, verbose: bool = False) -> ThreadingHTTPServer:
+    handler = type("Handler", (KVHandler,), {"state": state, "verbose": verbose})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the user-state KV service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("-p", "--port", type=int, default=8790)
+    parser.add_argument(
+        "--data", default="memory://", help="Backend: memory:// (default) or a directory"
+    )
+    parser.add_argument("--latency", type=float, default=0.0, help="Per-request delay in ms")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Uniform delay jitter in ms")
+    parser.add_argument("--token", default=None, help="Require this bearer token")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Log every request")
+    args = parser.parse_args()
+
+    state = KVState(
+        open_user_store(args.data), args.latency / 1000.0, args.jitter / 1000.0, args.token
+    )
+    server = make_server(args.host, args.port, state, args.verbose)
+    print(f"KV stand-in on http://{args.host}:{server.server_port} ({args.data})  (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(state.stats))
+
+
+if __name__ == "__main__":
+    main()
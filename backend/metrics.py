@@ -0,0 +1,322 @@
+"""
+Request-level metrics in the Prometheus text format.
+
+A dependency-free subset of the Prometheus client: counters, gauges and
+fixed-bucket histograms with labels, collected in a process-wide registry
+and rendered by ``render()`` for a ``/metrics`` endpoint.  Recording is a
+dict lookup plus a short critical section, so it can sit on every request.
+Values that already live elsewhere (cache hit counts, catalog sizes) are
+read by collectors at scrape time instead of being counted twice.
+
+``MetricsMiddleware`` wraps any WSGI app and records, per route template,
+request counts by status, latency, response bytes and requests in flight.
+The app names the route by setting ``environ[ROUTE_KEY]``; requests that
+don't are reported as ``unmatched``, so label cardinality stays bounded.
+
+Each process keeps its own registry: under the pre-fork server a scrape
+reports the worker it lands on.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+ROUTE_KEY = "metrics.route"
+UNMATCHED = "unmatched"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+# A collector returns (name, type, help, [(labels, value), ...]) families
+Family = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Value:
+    __slots__ = ("value", "lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self.lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1):
+        with self.lock:
+            self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class _HistogramValue:
+    __slots__ = ("bounds", "counts", "sum", "count", "lock")
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self.bounds, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+
+class Metric:
+    """A metric family; ``labels(...)`` returns the child for one label set."""
+
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[tuple, object] = {}
+        self._lock = threading.Lock()
+
+    def _new_child(self):
+        return _Value()
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} takes labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _samples(self) -> Iterable[str]:
+        for values, child in list(self._children.items()):
+            labels = _format_labels(self.labelnames, values)
+            yield f"{self.name}{labels} {_format_value(child.value)}"
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self._samples())
+        return lines
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1):
+        self.labels().dec(amount)
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def _samples(self) -> Iterable[str]:
+        names = self.labelnames + ("le",)
+        for values, child in list(self._children.items()):
+            with child.lock:
+                counts, total, count = list(child.counts), child.sum, child.count
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                labels = _format_labels(names, values + (_format_value(bound),))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, values)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {count}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._collectors: List[Callable[[], Iterable[Family]]] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        """Add ``metric``, or return the one already registered under its name."""
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def add_collector(self, collector: Callable[[], Iterable[Family]]):
+        """Add a function called at scrape time for values kept elsewhere."""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        for collector in list(self._collectors):
+            try:
+                families = list(collector())
+            except Exception as e:
+                name = getattr(collector, "__name__", collector)
+                lines.append(f"# collector {name} failed: {e}")
+                continue
+            for name, kind, help, samples in families:
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(
+                        f"{name}{_format_labels(tuple(labels), tuple(labels.values()))} "
+                        f"{_format_value(value)}"
+                    )
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, help, labelnames))
+
+
+def gauge(name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+    return REGISTRY.register(Gauge(name, help, labelnames))
+
+
+def histogram(
+    name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS
+) -> Histogram:
+    return REGISTRY.register(Histogram(name, help, labelnames, buckets))
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+REQUESTS = counter(
+    "http_requests_total",
+    "HTTP requests by route, method and status",
+    ("route", "method", "status"),
+)
+LATENCY = histogram(
+    "http_request_duration_seconds", "Time to produce and send a response", ("route", "method")
+)
+RESPONSE_BYTES = histogram(
+    "http_response_size_bytes", "Response body size", ("route",), buckets=SIZE_BUCKETS
+)
+IN_FLIGHT = gauge("http_requests_in_flight", "Requests being handled right now")
+ERRORS = counter(
+    "http_handler_errors_total",
+    "Exceptions a handler caught and turned into a 500",
+    ("route", "exception"),
+)
+
+
+def record_exception(route: Optional[str], exc: BaseException):
+    ERRORS.labels(route or UNMATCHED, type(exc).__name__).inc()
+
+
+class _MeteredBody:
+    """
+    Passes the response body through, counting bytes.  Records once, when
+    the body is exhausted or closed, whichever comes first.
+    """
+
+    def __init__(self, body, on_finish: Callable[[int], None]):
+        self._body = body
+        self._on_finish = on_finish
+        self._size = 0
+        self._finished = False
+
+    def _finish(self):
+        if not self._finished:
+            self._finished = True
+            self._on_finish(self._size)
+
+    def __iter__(self):
+        for chunk in self._body:
+            self._size += len(chunk)
+            yield chunk
+        self._finish()
+
+    def close(self):
+        try:
+            close = getattr(self._body, "close", None)
+            if close is not None:
+                close()
+        finally:
+            self._finish()
+
+
+class MetricsMiddleware:
+    """WSGI middleware recording the ``http_*`` metrics for every request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    def __call__(self, environ, start_response):
+        start = time.perf_counter()
+        status = []
+
+        def metered_start_response(status_line, headers, exc_info=None):
+            status[:] = [status_line[:3]]
+            return start_response(status_line, headers, exc_info)
+
+        def finish(size: int):
+            route = environ.get(ROUTE_KEY) or UNMATCHED
+            method = environ.get("REQUEST_METHOD", "")
+            LATENCY.labels(route, method).observe(time.perf_counter() - start)
+            REQUESTS.labels(route, method, status[0] if status else "500").inc()
+            RESPONSE_BYTES.labels(route).observe(size)
+            IN_FLIGHT.dec()
+
+        IN_FLIGHT.inc()
+        try:
+            body = self.app(environ, metered_start_response)
+        except BaseException:
+            finish(0)
+            raise
+        return _MeteredBody(body, finish)
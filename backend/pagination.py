@@ -0,0 +1,121 @@
+"""
+Keyset (cursor) pagination.
+
+A listing sorted by ``(key, id)`` is paged with an opaque cursor naming the
+last record returned: the listing it came from, the sort key, that record's
+sort value and id, and the version of the data it was read from (catalog
+version, or the revision of a save).  The next page starts strictly after
+``(value, id)``, found by binary search in a ``KeysetIndex``, so a deep page
+costs the same as the first, and records added or removed before the cursor,
+or a catalog rebuilt between two requests, don't shift or repeat results the
+way an offset does.  A cursor read against a newer version still pages
+correctly; ``Page.stale`` tells the caller the data changed underneath it.
+
+Sort keys are field names, optionally prefixed with ``-`` for descending
+order.  Ties always break on ascending id.
+"""
+
+import base64
+import json
+from bisect import bisect_right
+from typing import Any, Iterable, List, NamedTuple, Optional, Tuple
+
+from card_store import CardStore
+
+DEFAULT_PAGE_SIZE = 50
+
+
+class CursorError(ValueError):
+    """A malformed cursor, one from another listing, or an unknown sort key."""
+
+
+class Cursor(NamedTuple):
+    scope: str
+    key: str
+    value: Any
+    id: int
+    version: Optional[str]
+
+
+class Page(NamedTuple):
+    items: list
+    next_cursor: Optional[str]
+    # The cursor was issued for another version of the data
+    stale: bool
+
+
+def parse_sort(key: str) -> Tuple[str, bool]:
+    """``"-points"`` -> ``("points", True)``: the field and whether it descends."""
+    return (key[1:], True) if key.startswith("-") else (key, False)
+
+
+def encode_cursor(cursor: Cursor) -> str:
+    raw = json.dumps(list(cursor), separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(token: str, scope: str) -> Cursor:
+    """Parse ``token``, checking that it was issued for listing ``scope``."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        cursor = Cursor(*json.loads(raw))
+    except (ValueError, TypeError) as e:
+        raise CursorError("Invalid cursor") from e
+    if cursor.scope != scope:
+        raise CursorError(f"Cursor belongs to '{cursor.scope}', not '{scope}'")
+    if not isinstance(cursor.id, int) or not isinstance(cursor.value, (int, float)):
+        raise CursorError("Invalid cursor")
+    return cursor
+
+
+class KeysetIndex:
+    """The items of one listing in ``(key, id)`` order, for seeking to a cursor."""
+
+    def __init__(self, key: str, entries: Iterable[Tuple[Any, int, Any]]):
+        """``entries`` are ``(sort value, id, item)`` triples in any order."""
+        self.key = key
+        _, descending = parse_sort(key)
+        self._sign = -1 if descending else 1
+        ordered = sorted(entries, key=lambda e: (self._sign * e[0], e[1]))
+        self._positions = [(self._sign * value, item_id) for value, item_id, _ in ordered]
+        self._values = [value for value, _, _ in ordered]
+        self._ids = [item_id for _, item_id, _ in ordered]
+        self._items = [item for _, _, item in ordered]
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def page(
+        self, cursor: Optional[Cursor], limit: int, scope: str, version: Optional[str]
+    ) -> Page:
+        """Up to ``limit`` items after ``cursor`` (from the start when None)."""
+        start = 0
+        if cursor is not None:
+            start = bisect_right(self._positions, (self._sign * cursor.value, cursor.id))
+        stop = min(start + max(0, limit), len(self._items))
+        next_cursor = None
+        if start < stop < len(self._items):
+            last = stop - 1
+            next_cursor = encode_cursor(
+                Cursor(scope, self.key, self._values[last], self._ids[last], version)
+            )
+        stale = cursor is not None and cursor.version != version
+        return Page(self._items[start:stop], next_cursor, stale)
+
+
+def store_keyset(store: CardStore, key: str) -> KeysetIndex:
+    """Rows of ``store`` ordered by one of its numeric fields."""
+    field, _ = parse_sort(key)
+    numeric = [name for name, _ in store.schema["numeric"]]
+    if field not in numeric:
+        raise CursorError(f"Cannot sort by '{field}', expected one of: {', '.join(numeric)}")
+    return KeysetIndex(key, ((record[field], record.id, record.row) for record in store))
+
+
+def list_keyset(items: List[dict], key: str, fields: Iterable[str]) -> KeysetIndex:
+    """Dict items (each with an ``id``) ordered by one of ``fields``."""
+    field, _ = parse_sort(key)
+    fields = list(fields)
+    if field not in fields:
+        raise CursorError(f"Cannot sort by '{field}', expected one of: {', '.join(fields)}")
+    return KeysetIndex(key, ((item.get(field) or 0, item["id"], item) for item in items))
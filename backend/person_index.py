@@ -0,0 +1,298 @@
+"""
+Character <-> person (voice actor) join index.
+
+The person table lists every person once, with the ``character_ids`` they
+voice.  ``process_person_data.py`` writes it to ``data/person/all_persons.json``
+(with ``--fetch-missing`` / ``--staff`` adding what only the API knows); when
+that file is absent the catalog derives the table from the voice actors
+already embedded in the raw anime cards (``persons_from_anime``), which is
+what the script writes without network access.  This module turns the table
+into CSR join arrays in both directions, like ``graph_index.py`` does for
+characters and anime:
+
+- ``person_indptr`` / ``person_links``: person row -> character rows;
+- ``character_indptr`` / ``character_links``: character row -> person rows.
+
+A character has one to three voice actors, so "who voices X" is one slice,
+"do X and Y share a voice actor" is the intersection of two tiny slices, and
+"characters with the same voice actor as X" touches only those actors'
+rows.  That keeps same-VA synergy checks effectively constant time per
+character, independent of catalog size.
+
+The server gets it through ``Catalog.voices()``, cached as an ``.npz``
+artifact next to the card stores.
+"""
+
+import logging
+import os
+from collections import defaultdict
+from typing import Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from atomic_file import AtomicFile
+from graph_index import _csr
+
+
+class PersonTable:
+    """Persons deduplicated by id, with the characters, anime and staff roles they link to."""
+
+    def __init__(self):
+        self.persons = {}
+        self.characters = defaultdict(set)
+        self.anime = defaultdict(set)
+        self.staff = defaultdict(set)
+
+    def add_person(self, person: dict) -> int:
+        """Register a person; of several copies, keep the first one with a career."""
+        person_id = int(person["id"])
+        known = self.persons.get(person_id)
+        if known is None or (not known["career"] and person.get("career")):
+            self.persons[person_id] = {
+                "id": person_id,
+                "name": person.get("name", ""),
+                "type": int(person.get("type") or 1),
+                "career": list(person.get("career") or []),
+                "image_path": (person.get("images") or {}).get("large", ""),
+            }
+        return person_id
+
+    def add_voice(self, person: dict, character_id, anime_id=None):
+        person_id = self.add_person(person)
+        self.characters[person_id].add(int(character_id))
+        if anime_id is not None:
+            self.anime[person_id].add(int(anime_id))
+
+    def add_staff(self, person: dict, anime_id, relation: str):
+        person_id = self.add_person(person)
+        self.staff[person_id].add((int(anime_id), relation))
+
+    def add_anime(self, anime: dict) -> int:
+        """Add the voice actors embedded in an anime card's main characters; returns how many."""
+        added = 0
+        for character in anime.get("main_characters") or ():
+            for actor in character.get("actors") or ():
+                self.add_voice(actor, character["id"], anime["id"])
+                added += 1
+        return added
+
+    def voiced_characters(self) -> set:
+        return {c for ids in self.characters.values() for c in ids}
+
+    def records(self) -> List[dict]:
+        """Person records, most voiced characters first."""
+        records = []
+        for person_id, person in self.persons.items():
+            character_ids = sorted(self.characters.get(person_id, ()))
+            records.append(
+                {
+                    **person,
+                    "character_ids": character_ids,
+                    "character_count": len(character_ids),
+                    "anime_ids": sorted(self.anime.get(person_id, ())),
+                    "staff": [
+                        {"anime_id": anime_id, "relation": relation}
+                        for anime_id, relation in sorted(self.staff.get(person_id, ()))
+                    ],
+                }
+            )
+        records.sort(key=lambda p: (-p["character_count"], p["id"]))
+        return records
+
+
+def persons_from_anime(anime: Iterable[dict]) -> List[dict]:
+    """The person table of the voice actors embedded in raw anime cards."""
+    table = PersonTable()
+    for item in anime:
+        table.add_anime(item)
+    return table.records()
+
+
+class PersonIndex:
+    """CSR join arrays between characters and the people who voice them."""
+
+    def __init__(
+        self,
+        person_ids: np.ndarray,
+        person_names: Sequence[str],
+        character_ids: np.ndarray,
+        person_indptr: np.ndarray,
+        person_links: np.ndarray,
+        character_indptr: np.ndarray,
+        character_links: np.ndarray,
+        signature: str = "",
+    ):
+        self.person_ids = person_ids
+        self.person_names = list(person_names)
+        self.character_ids = character_ids
+        self.person_row = {int(i): row for row, i in enumerate(person_ids.tolist())}
+        self.character_row = {int(i): row for row, i in enumerate(character_ids.tolist())}
+        self.person_indptr = person_indptr
+        self.person_links = person_links
+        self.character_indptr = character_indptr
+        self.character_links = character_links
+        self.signature = signature
+
+    # --- construction / persistence ---
+
+    @classmethod
+    def build(cls, persons: Iterable[dict], signature: str = "") -> "PersonIndex":
+        names = {}
+        edges = set()
+        for person in persons:
+            if person.get("id") is None:
+                continue
+            person_id = int(person["id"])
+            names[person_id] = person.get("name") or ""
+            for char_id in person.get("character_ids") or ():
+                edges.add((person_id, int(char_id)))
+
+        person_ids = np.array(sorted(names), dtype=np.int64)
+        character_ids = np.array(sorted({c for _, c in edges}), dtype=np.int64)
+        pairs = np.array(sorted(edges), dtype=np.int64).reshape(-1, 2)
+        person_rows = np.searchsorted(person_ids, pairs[:, 0])
+        character_rows = np.searchsorted(character_ids, pairs[:, 1])
+        person_indptr, person_links = _csr(person_rows, character_rows, len(person_ids))
+        character_indptr, character_links = _csr(character_rows, person_rows, len(character_ids))
+        return cls(
+            person_ids,
+            [names[i] for i in person_ids.tolist()],
+            character_ids,
+            person_indptr,
+            person_links,
+            character_indptr,
+            character_links,
+            signature,
+        )
+
+    def save(self, path: str):
+        """Write the artifact atomically (temp file + rename)."""
+        with AtomicFile(path, suffix=".npz") as f:
+            np.savez(
+                f,
+                person_ids=self.person_ids,
+                person_names=np.array(self.person_names, dtype=str),
+                character_ids=self.character_ids,
+                person_indptr=self.person_indptr,
+                person_links=self.person_links,
+                character_indptr=self.character_indptr,
+                character_links=self.character_links,
+                signature=np.array(self.signature),
+            )
+
+    @classmethod
+    def load(cls, path: str) -> "PersonIndex":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                data["person_ids"],
+                data["person_names"].tolist(),
+                data["character_ids"],
+                data["person_indptr"],
+                data["person_links"],
+                data["character_indptr"],
+                data["character_links"],
+                str(data["signature"]),
+            )
+
+    # --- queries ---
+
+    def __len__(self) -> int:
+        return len(self.person_ids)
+
+    def _person_rows(self, character_id: int) -> np.ndarray:
+        row = self.character_row.get(character_id)
+        if row is None:
+            return self.character_links[:0]
+        return self.character_links[self.character_indptr[row] : self.character_indptr[row + 1]]
+
+    def _character_rows(self, person_row: int) -> np.ndarray:
+        return self.person_links[self.person_indptr[person_row] : self.person_indptr[person_row + 1]]
+
+    def person_name(self, person_id: int) -> Optional[str]:
+        row = self.person_row.get(person_id)
+        return None if row is None else self.person_names[row]
+
+    def persons_of(self, character_id: int) -> List[int]:
+        """Ids of the people voicing one character."""
+        return self.person_ids[self._person_rows(character_id)].tolist()
+
+    def characters_of(self, person_id: int) -> List[int]:
+        """Ids of the characters one person voices."""
+        row = self.person_row.get(person_id)
+        if row is None:
+            return []
+        return self.character_ids[self._character_rows(row)].tolist()
+
+    def shared_persons(self, a: int, b: int) -> List[int]:
+        """People voicing both characters ``a`` and ``b``."""
+        shared = np.intersect1d(self._person_rows(a), self._person_rows(b), assume_unique=True)
+        return self.person_ids[shared].tolist()
+
+    def same_voice(self, character_id: int, limit: Optional[int] = None) -> List[dict]:
+        """
+        Characters sharing a voice actor with ``character_id``, most shared
+        actors first: [{id, persons}].
+        """
+        row = self.character_row.get(character_id)
+        persons = self._person_rows(character_id)
+        if row is None or len(persons) == 0:
+            return []
+        by_character = {}
+        for person_row in persons.tolist():
+            for other in self._character_rows(person_row).tolist():
+                if other != row:
+                    by_character.setdefault(other, []).append(int(self.person_ids[person_row]))
+        order = sorted(by_character, key=lambda r: (-len(by_character[r]), r))[:limit]
+        return [
+            {"id": int(self.character_ids[r]), "persons": by_character[r]} for r in order
+        ]
+
+    def voice_pairs(self, character_ids: Iterable[int]) -> List[dict]:
+        """
+        Pairs among ``character_ids`` that share a voice actor:
+        [{characters: [a, b], persons: [...]}], in input order.
+        """
+        ids = list(dict.fromkeys(character_ids))
+        by_person = {}
+        for char_id in ids:
+            for person_row in self._person_rows(char_id).tolist():
+                by_person.setdefault(person_row, []).append(char_id)
+        pairs = {}
+        for person_row, members in by_person.items():
+            for i, a in enumerate(members):
+                for b in members[i + 1 :]:
+                    pairs.setdefault((a, b), []).append(int(self.person_ids[person_row]))
+        position = {c: i for i, c in enumerate(ids)}
+        return [
+            {"characters": [a, b], "persons": sorted(persons)}
+            for (a, b), persons in sorted(
+                pairs.items(), key=lambda kv: (position[kv[0][0]], position[kv[0][1]])
+            )
+        ]
+
+
+def open_index(source, cache_dir: str) -> Optional[PersonIndex]:
+    """
+    Load the join artifact for the person table, rebuilding it when the table
+    changed since it was built.  Returns None when the table is missing.
+    """
+    signature = source.signature()
+    if signature is None:
+        return None
+
+    path = os.path.join(cache_dir, f"{source.name}.join.npz")
+    if os.path.exists(path):
+        try:
+            index = PersonIndex.load(path)
+            if index.signature == signature:
+                return index
+        except (OSError, ValueError, KeyError):
+            pass
+
+    index = PersonIndex.build(source.records(), signature=signature)
+    index.save(path)
+    logging.info(
+        f"Built join index for {len(index)} persons and {len(index.character_ids)} "
+        f"characters into {path}"
+    )
+    return index
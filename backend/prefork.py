@@ -0,0 +1,351 @@
+"""
+Pre-forking production server for the Flask app.
+
+The master process imports ``server.app``, preloads the whole catalog
+(``Catalog.preload``: card stores, search / synergy / similarity / graph /
+person indexes) plus the ``/api/bootstrap`` bundle, and binds the listening
+socket once.  It then forks N workers.  Every worker inherits the
+already-loaded catalog: the card stores are read-only mmaps and the index
+arrays and bundle were built before the fork, so their pages are shared
+copy-on-write instead of being loaded N times.
+Each worker serves the shared socket with a bounded thread pool.
+
+Master signals:
+
+- ``SIGHUP``: graceful reload.  The master builds a new catalog (picking up
+  rebuilt sources), forks a new generation of workers, and then asks the old
+  workers to finish their in-flight requests and exit.  If the build fails the
+  old catalog and workers stay up;
+- ``SIGTERM`` / ``SIGINT``: graceful shutdown of all workers;
+- a worker that dies unexpectedly is replaced.
+
+The same reload is triggered by the master's ``CatalogWatcher`` when the
+catalog sources change (``--watch-interval``, 0 disables), and by
+``POST /api/admin/catalog/reload`` on any worker, which signals the master.
+The admin endpoints require ``ADMIN_TOKEN`` here; without it they are
+disabled (the loopback fallback is for the development server only).
+
+On startup the master prints a report of catalog load time, record counts
+and resident memory (RSS, and PSS where ``/proc`` has it, which shows how
+much of each worker is really shared).
+
+Platforms without ``os.fork`` (Windows) fall back to one in-process server
+with the same thread pool.
+
+    python backend/prefork.py --workers 4 --threads 8 --port 5001
+"""
+
+import argparse
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+from werkzeug.serving import BaseWSGIServer
+
+DEFAULT_WORKERS = 2
+DEFAULT_THREADS = 8
+DEFAULT_WATCH_INTERVAL = 2.0
+# Seconds an old worker gets to finish in-flight requests on reload / stop
+GRACEFUL_TIMEOUT = 30.0
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """A WSGI server handling each connection on a fixed-size thread pool."""
+
+    def __init__(self, *args, threads: int = DEFAULT_THREADS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="request")
+
+    def process_request(self, request, client_address):
+        self._pool.submit(self._process_request_thread, request, client_address)
+
+    def _process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def drain(self):
+        """Wait for the requests already accepted to finish."""
+        self._pool.shutdown(wait=True)
+
+
+def memory_usage(pid: Optional[int] = None) -> Dict[str, float]:
+    """RSS / PSS / shared memory of a process in MB (PSS needs /proc)."""
+    path = f"/proc/{pid or 'self'}/smaps_rollup"
+    try:
+        fields = {}
+        with open(path, "r") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                if value.strip().endswith("kB"):
+                    fields[name] = int(value.split()[0]) / 1024
+        return {
+            "rss_mb": round(fields.get("Rss", 0.0), 1),
+            "pss_mb": round(fields.get("Pss", 0.0), 1),
+            "shared_mb": round(fields.get("Shared_Clean", 0.0) + fields.get("Shared_Dirty", 0.0), 1),
+        }
+    except OSError:
+        if pid is not None:
+            return {}
+        try:
+            import resource
+        except ImportError:  # Windows
+            return {}
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in KB on Linux, bytes on macOS
+        return {"rss_mb": round(maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)}
+
+
+def bind_socket(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def serve_worker(app, sock: socket.socket, threads: int):
+    """Worker body: serve ``sock`` until SIGTERM, then drain and exit."""
+    server = PooledWSGIServer(
+        sock.getsockname()[0], sock.getsockname()[1], app, threads=threads, fd=sock.fileno()
+    )
+
+    def stop(signum, frame):
+        # shutdown() blocks until serve_forever returns, so not on this thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    def watch_master(parent: int):
+        # Stop too if the master dies without telling us (e.g. SIGKILL)
+        while os.getppid() == parent:
+            time.sleep(1.0)
+        stop(None, None)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    if hasattr(os, "fork"):
+        threading.Thread(target=watch_master, args=(os.getppid(),), daemon=True).start()
+    try:
+        server.serve_forever()
+    finally:
+        server.drain()
+
+
+class Master:
+    """Forks and supervises worker generations."""
+
+    def __init__(
+        self,
+        app,
+        data_root: str,
+        sock: socket.socket,
+        workers: int,
+        threads: int,
+        watch_interval: float = DEFAULT_WATCH_INTERVAL,
+    ):
+        self.app = app
+        self.data_root = data_root
+        self.sock = sock
+        self.workers = workers
+        self.threads = threads
+        self.watch_interval = watch_interval
+        self.generation = 0
+        self.children: Dict[int, int] = {}  # pid -> generation
+        self._stopping = False
+        self._reload = False
+
+    def preload(self, reload: bool = False) -> dict:
+        from bootstrap import get_bundle
+        from catalog import get_catalog, reload_catalog
+
+        start = time.perf_counter()
+        if reload:
+            old = get_catalog(self.data_root)
+            catalog = reload_catalog(self.data_root)
+            # The master serves no requests; the old workers have their own copy
+            old.close()
+        else:
+            catalog = get_catalog(self.data_root).preload()
+        bundle = get_bundle(catalog.version, catalog.anime, catalog.characters)
+        return {
+            "load_seconds": round(time.perf_counter() - start, 3),
+            "catalog_version": catalog.version,
+            "catalog_generation": catalog.generation,
+            "records": catalog.stats(),
+            "bundle": f"{bundle.version} ({len(bundle.body)} bytes, {bundle.gzip_size} gzipped)",
+        }
+
+    def spawn(self):
+        master = os.getpid()
+        pid = os.fork()
+        if pid == 0:
+            status = 0
+            try:
+                from catalog import set_reload_handler
+
+                # An admin reload on one worker reloads every worker
+                set_reload_handler(lambda: os.kill(master, signal.SIGHUP))
+                serve_worker(self.app, self.sock, self.threads)
+            except BaseException:
+                status = 1
+            finally:
+                os._exit(status)
+        self.children[pid] = self.generation
+
+    def spawn_generation(self):
+        self.generation += 1
+        for _ in range(self.workers):
+            self.spawn()
+
+    def retire(self, generation: Optional[int] = None):
+        """Ask the workers of older generations (or all) to stop gracefully."""
+        for pid, gen in list(self.children.items()):
+            if generation is None or gen < generation:
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                except ProcessLookupError:
+                    pass
+
+    def reap(self):
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self.children.clear()
+                return
+            if pid == 0:
+                return
+            gen = self.children.pop(pid, None)
+            if gen == self.generation and not self._stopping and status != 0:
+                print(f"[prefork] worker {pid} exited ({status}), respawning", flush=True)
+                self.spawn()
+
+    def report(self, loaded: dict):
+        time.sleep(0.2)  # let workers finish starting before sampling them
+        print(f"[prefork] catalog {loaded['catalog_version']} "
+              f"(generation {loaded['catalog_generation']}) loaded in {loaded['load_seconds']}s: "
+              f"{', '.join(f'{k}={v}' for k, v in loaded['records'].items())}")
+        print(f"[prefork] bootstrap bundle {loaded['bundle']}")
+        print(f"[prefork] master {os.getpid()}: {memory_usage()}")
+        for pid, gen in sorted(self.children.items()):
+            if gen == self.generation:
+                print(f"[prefork] worker {pid}: {memory_usage(pid)}")
+        sys.stdout.flush()
+
+    def run(self):
+        def on_stop(signum, frame):
+            self._stopping = True
+
+        def on_reload(signum, frame):
+            self._reload = True
+
+        signal.signal(signal.SIGTERM, on_stop)
+        signal.signal(signal.SIGINT, on_stop)
+        signal.signal(signal.SIGHUP, on_reload)
+
+        loaded = self.preload()
+        self.spawn_generation()
+        if self.watch_interval > 0:
+            from catalog import watch_catalog
+
+            def on_change():
+                self._reload = True
+
+            watch_catalog(self.data_root, self.watch_interval, on_change)
+        host, port = self.sock.getsockname()[:2]
+        print(f"[prefork] listening on http://{host}:{port} with "
+              f"{self.workers} workers x {self.threads} threads")
+        self.report(loaded)
+
+        while not self._stopping:
+            if self._reload:
+                self._reload = False
+                print("[prefork] reloading", flush=True)
+                try:
+                    loaded = self.preload(reload=True)
+                except Exception as e:
+                    print(f"[prefork] reload failed, keeping the current workers: {e}", flush=True)
+                    continue
+                self.spawn_generation()
+                self.retire(self.generation)
+                self.report(loaded)
+            self.reap()
+            time.sleep(0.2)
+
+        print("[prefork] shutting down", flush=True)
+        self.retire()
+        deadline = time.monotonic() + GRACEFUL_TIMEOUT
+        while self.children and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.1)
+        for pid in list(self.children):
+            os.kill(pid, signal.SIGKILL)
+        self.reap()
+
+
+def run(
+    host: str,
+    port: int,
+    workers: int,
+    threads: int,
+    watch_interval: float = DEFAULT_WATCH_INTERVAL,
+):
+    from catalog import get_catalog, watch_catalog
+    from server import ADMIN_TOKEN, DATA_ROOT, app
+
+    if not ADMIN_TOKEN:
+        print("[prefork] WARNING: ADMIN_TOKEN is not set; the /api/admin endpoints are "
+              "disabled", file=sys.stderr, flush=True)
+    catalog = get_catalog(DATA_ROOT)
+    sock = bind_socket(host, port)
+
+    if not hasattr(os, "fork"):
+        start = time.perf_counter()
+        catalog.preload()
+        print(f"[prefork] fork unavailable; catalog loaded in "
+              f"{time.perf_counter() - start:.3f}s, serving in-process with {threads} threads")
+        print(f"[prefork] memory: {memory_usage()}")
+        if watch_interval > 0:
+            watch_catalog(DATA_ROOT, watch_interval)
+        serve_worker(app, sock, threads)
+        return
+
+    Master(app, DATA_ROOT, sock, workers, threads, watch_interval).run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-forking production server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("-p", "--port", type=int, default=5001)
+    parser.add_argument(
+        "-w", "--workers", type=int, default=int(os.environ.get("WEB_WORKERS", DEFAULT_WORKERS))
+    )
+    parser.add_argument(
+        "-t",
+        "--threads",
+        type=int,
+        default=int(os.environ.get("WEB_THREADS", DEFAULT_THREADS)),
+        help="Request threads per worker",
+    )
+    parser.add_argument(
+        "--watch-interval",
+        type=float,
+        default=float(os.environ.get("CATALOG_WATCH_INTERVAL", DEFAULT_WATCH_INTERVAL)),
+        help="Seconds between checks of the catalog sources for a reload (0 disables)",
+    )
+    args = parser.parse_args()
+    run(args.host, args.port, args.workers, args.threads, args.watch_interval)
+
+
+if __name__ == "__main__":
+    main()
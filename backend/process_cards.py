@@ -1,8 +1,16 @@
+import argparse
 import json
 import os
 import sys
 from pathlib import Path
 
+# Add project root to the Python path to allow absolute imports
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from backend import instrumentation
+from backend.instrumentation import span
+from json_stream import JsonArrayWriter
+
 
 def get_rarity(rank: int) -> str:
     """根据排名确定稀有度"""
@@ -82,19 +90,26 @@ def process_anime_data(source_dir: str, output_dir: str, image_dir: str):
         print(f"错误: 源目录未找到 {source_dir}")
         return
 
-    all_anime_files = list(source_path.glob("*.json"))
+    with span("io.list"):
+        all_anime_files = list(source_path.glob("*.json"))
     if not all_anime_files:
         print(f"警告: 在目录 {source_dir} 中没有找到任何JSON文件。")
         return
 
     print(f"找到 {len(all_anime_files)} 个动画文件，开始处理...")
 
-    all_cards_data = []
+    # 将所有卡牌数据流式汇总到一个文件中, 并放在source_json_dir文件夹同级目录下
+    all_cards_path = os.path.join(source_path.parent, "all_cards.json")
+    all_cards_writer = JsonArrayWriter(all_cards_path, indent=4, keep_empty=False)
+
     processed_count = 0
     for subject_file in all_anime_files:
         try:
-            with open(subject_file, "r", encoding="utf-8") as f:
-                subject = json.load(f)
+            with span("io.read"), open(subject_file, "r", encoding="utf-8") as f:
+                text = f.read()
+            instrumentation.observe("raw_card.bytes", len(text))
+            with span("json.parse"):
+                subject = json.loads(text)
 
             # 基本的数据校验
             if (
@@ -102,6 +117,7 @@ def process_anime_data(source_dir: str, output_dir: str, image_dir: str):
                 or "id" not in subject
                 or "rating" not in subject
             ):
+                instrumentation.count("cards.skipped")
                 continue
 
             card_id = subject["id"]
@@ -109,12 +125,13 @@ def process_anime_data(source_dir: str, output_dir: str, image_dir: str):
             # 动态寻找图片路径，并生成相对路径
             image_path_found = None
             base_path = Path(image_dir)
-            for ext in [".jpg", ".png", ".webp", ".jpeg"]:
-                potential_path = base_path / f"{card_id}{ext}"
-                if potential_path.exists():
-                    # 生成一个从项目根目录开始的相对路径
-                    image_path_found = str(potential_path)
-                    break
+            with span("io.image_lookup"):
+                for ext in [".jpg", ".png", ".webp", ".jpeg"]:
+                    potential_path = base_path / f"{card_id}{ext}"
+                    if potential_path.exists():
+                        # 生成一个从项目根目录开始的相对路径
+                        image_path_found = str(potential_path)
+                        break
 
             card_data = {
                 "id": card_id,
@@ -138,23 +155,22 @@ def process_anime_data(source_dir: str, output_dir: str, image_dir: str):
 
             output_path = os.path.join(output_dir, f"{card_id}.json")
 
-            with open(output_path, "w", encoding="utf-8") as f:
+            with span("io.write_card"), open(output_path, "w", encoding="utf-8") as f:
                 json.dump(card_data, f, ensure_ascii=False, indent=4)
 
-            all_cards_data.append(card_data)
+            with span("io.write_aggregate"):
+                all_cards_writer.write(card_data)
             processed_count += 1
+            instrumentation.count("cards.processed")
         except Exception as e:
             # 捕获处理单个条目时的任何意外错误
             print(f"跳过文件 {subject_file.name}，因为出现意外错误: {e}")
+            instrumentation.count("cards.failed")
             continue
 
-    # 将所有卡牌数据汇总到一个文件中, 并放在source_json_dir文件夹同级目录下
-    if all_cards_data:
-        # 获取source_json_dir的父目录
-        parent_dir = source_path.parent
-        all_cards_path = os.path.join(parent_dir, "all_cards.json")
-        with open(all_cards_path, "w", encoding="utf-8") as f:
-            json.dump(all_cards_data, f, ensure_ascii=False, indent=4)
+    with span("io.write_aggregate"):
+        all_cards_writer.close()
+    if processed_count:
         print(f"已将所有卡牌数据汇总到: {all_cards_path}")
 
     print(
@@ -163,8 +179,13 @@ def process_anime_data(source_dir: str, output_dir: str, image_dir: str):
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="将 raw_cards 处理为番剧卡牌")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
     SOURCE_JSON_DIR = "data/anime/raw_cards"
     CARDS_OUTPUT_DIR = "data/anime/processed_cards"
     IMAGES_DIR = "data/images/anime"  # 修正路径以匹配 data_fetcher.py
 
-    process_anime_data(SOURCE_JSON_DIR, CARDS_OUTPUT_DIR, IMAGES_DIR)
+    with instrumentation.session("process_cards", args):
+        process_anime_data(SOURCE_JSON_DIR, CARDS_OUTPUT_DIR, IMAGES_DIR)
@@ -4,12 +4,23 @@
 处理人物数据，生成all_cards.json文件，包含人物等级、作品数、中文名、战斗属性等数据
 """
 
+import argparse
 import json
 import os
 import glob
 from collections import defaultdict
 import logging
 import random
+import sys
+from pathlib import Path
+
+# Add project root to the Python path to allow absolute imports
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from backend import instrumentation
+from backend.instrumentation import span
+from graph_index import GraphIndex
+from json_stream import iter_records, sorted_records, write_records
 
 # 配置日志
 logging.basicConfig(
@@ -17,23 +28,18 @@ logging.basicConfig(
 )
 
 
+@span("load_anime")
 def load_anime_data():
-    """加载动漫数据，创建ID到名称的映射"""
+    """加载动漫数据，建立番剧↔角色关系图（含番剧名称，见 graph_index.py）"""
     anime_file = "data/anime/all_cards.json"
-    anime_mapping = {}
 
     try:
-        with open(anime_file, "r", encoding="utf-8") as f:
-            anime_data = json.load(f)
-
-        for anime in anime_data:
-            anime_mapping[anime["id"]] = anime["name"]
-
-        logging.info(f"加载了 {len(anime_mapping)} 部动漫作品数据")
-        return anime_mapping
+        graph = GraphIndex.build(anime=iter_records(anime_file))
+        logging.info(f"加载了 {len(graph.anime_ids)} 部动漫作品数据")
+        return graph
     except Exception as e:
         logging.error(f"加载动漫数据失败: {e}")
-        return {}
+        return GraphIndex.build()
 
 
 def calculate_character_rarity(character):
@@ -119,77 +125,86 @@ def assign_battle_stats(rarity, popularity_score):
     return final_stats
 
 
+@span("transform")
+def build_processed_character(character, graph):
+    """把单个原始角色转换为卡牌数据"""
+    chinese_name = extract_chinese_name(character)
+    rarity = calculate_character_rarity(character)
+
+    anime_ids = character.get("anime_ids", [])
+    anime_names = graph.anime_names_of(anime_ids)
+
+    birthday = extract_birthday(character)
+
+    popularity_score = (
+        character.get("stat", {}).get("collects", 0)
+        + character.get("stat", {}).get("comments", 0) * 2
+    )
+
+    battle_stats = assign_battle_stats(rarity, popularity_score)
+
+    processed_character = {
+        "id": character["id"],
+        "name": chinese_name,
+        "original_name": character.get("name", ""),
+        "rarity": rarity,
+        "image_path": character.get("images", {}).get("large", ""),
+        "anime_ids": anime_ids,
+        "anime_names": anime_names,
+        "anime_count": len(anime_ids),
+        "gender": character.get("gender", "unknown"),
+        "birthday": birthday,
+        "description": character.get("summary", "神秘的角色")[:200]
+        + ("..." if len(character.get("summary", "")) > 200 else ""),
+        "stats": character.get("stat", {"comments": 0, "collects": 0}),
+        "type": "character",
+        "popularity_score": popularity_score,
+        "battle_stats": battle_stats,  # 新增战斗属性
+        "blood_type": None,
+        "height": None,
+    }
+
+    return processed_character
+
+
 def process_character_files():
-    """处理所有角色文件"""
+    """处理所有角色文件，返回按稀有度与人气排序的角色迭代器"""
     characters_dir = "data/character/raw_cards"
-    processed_characters = []
 
-    anime_mapping = load_anime_data()
+    graph = load_anime_data()
 
     character_files = glob.glob(os.path.join(characters_dir, "*.json"))
     logging.info(f"找到 {len(character_files)} 个角色文件")
 
-    for file_path in character_files:
-        try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                character = json.load(f)
-
-            chinese_name = extract_chinese_name(character)
-            rarity = calculate_character_rarity(character)
-
-            anime_ids = character.get("anime_ids", [])
-            anime_names = [
-                anime_mapping[anime_id]
-                for anime_id in anime_ids
-                if anime_id in anime_mapping
-            ]
-
-            birthday = extract_birthday(character)
-
-            popularity_score = (
-                character.get("stat", {}).get("collects", 0)
-                + character.get("stat", {}).get("comments", 0) * 2
-            )
-
-            battle_stats = assign_battle_stats(rarity, popularity_score)
-
-            processed_character = {
-                "id": character["id"],
-                "name": chinese_name,
-                "original_name": character.get("name", ""),
-                "rarity": rarity,
-                "image_path": character.get("images", {}).get("large", ""),
-                "anime_ids": anime_ids,
-                "anime_names": anime_names,
-                "anime_count": len(anime_ids),
-                "gender": character.get("gender", "unknown"),
-                "birthday": birthday,
-                "description": character.get("summary", "神秘的角色")[:200]
-                + ("..." if len(character.get("summary", "")) > 200 else ""),
-                "stats": character.get("stat", {"comments": 0, "collects": 0}),
-                "type": "character",
-                "popularity_score": popularity_score,
-                "battle_stats": battle_stats,  # 新增战斗属性
-                "blood_type": None,
-                "height": None,
-            }
-
-            processed_characters.append(processed_character)
-
-        except Exception as e:
-            logging.error(f"处理文件 {file_path} 时出错: {e}")
-            continue
+    rarity_stats = defaultdict(int)
 
-    rarity_order = {"UR": 0, "HR": 1, "SSR": 2, "SR": 3, "R": 4, "N": 5}
-    processed_characters.sort(
-        key=lambda x: (rarity_order.get(x["rarity"], 6), -x.get("popularity_score", 0))
-    )
+    def iter_processed_characters():
+        for file_path in character_files:
+            try:
+                with span("io.read"), open(file_path, "r", encoding="utf-8") as f:
+                    text = f.read()
+                with span("json.parse"):
+                    character = json.loads(text)
 
-    logging.info(f"成功处理了 {len(processed_characters)} 个角色")
+                processed_character = build_processed_character(character, graph)
+                rarity_stats[processed_character["rarity"]] += 1
+                instrumentation.count("characters.processed")
+                yield processed_character
 
-    rarity_stats = defaultdict(int)
-    for char in processed_characters:
-        rarity_stats[char["rarity"]] += 1
+            except Exception as e:
+                logging.error(f"处理文件 {file_path} 时出错: {e}")
+                instrumentation.count("characters.failed")
+                continue
+
+    rarity_order = {"UR": 0, "HR": 1, "SSR": 2, "SR": 3, "R": 4, "N": 5}
+    # 外部排序：处理结果先溢写到临时文件，内存中只保留排序键
+    with span("sort.spill"):
+        processed_characters = sorted_records(
+            iter_processed_characters(),
+            key=lambda x: (rarity_order.get(x["rarity"], 6), -x.get("popularity_score", 0)),
+        )
+
+    logging.info(f"成功处理了 {sum(rarity_stats.values())} 个角色")
 
     logging.info("稀有度分布:")
     for rarity, count in sorted(
@@ -205,16 +220,16 @@ def save_processed_data(characters):
     output_file = "data/character/all_cards.json"
 
     try:
-        os.makedirs(os.path.dirname(output_file), exist_ok=True)
-
-        with open(output_file, "w", encoding="utf-8") as f:
-            json.dump(characters, f, ensure_ascii=False, indent=2)
+        with span("io.write"):
+            count = write_records(characters, output_file, indent=2, keep_empty=False)
 
         logging.info(f"数据已保存到 {output_file}")
-        logging.info(f"总共保存了 {len(characters)} 个角色的数据")
+        logging.info(f"总共保存了 {count} 个角色的数据")
+        return count
 
     except Exception as e:
         logging.error(f"保存数据时出错: {e}")
+        return 0
 
 
 def main():
@@ -231,12 +246,15 @@ def main():
 
     processed_characters = process_character_files()
 
-    if processed_characters:
-        save_processed_data(processed_characters)
+    if save_processed_data(processed_characters):
         logging.info("角色数据处理完成！")
     else:
         logging.warning("没有处理任何角色数据，请检查原始数据目录。")
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="处理角色数据，生成 all_cards.json")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    with instrumentation.session("process_character_data", args):
+        main()
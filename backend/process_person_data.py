@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+人物（声优 / 制作人员）数据处理脚本
+
+从原始数据中批量收集人物，按人物 ID 去重后生成紧凑的人物表
+data/person/all_persons.json：
+
+- 声优：data_fetcher.py 保存的番剧里，每个主角的 actors 字段本来就带有配音
+  人物，直接读取，无需联网；
+- --fetch-missing：对没有任何配音信息的角色调用 get_character_related_persons 补齐；
+- --staff：对每部番剧调用 get_related_persons，记录导演、脚本等制作人员。
+
+联网部分使用线程池并发请求，总速率受 --rate 限制（见 bangumi_api.set_rate_limit）。
+每个人物记录 character_ids（配音的角色），服务端据此建立角色↔人物连接索引
+（见 person_index.py）。
+
+不联网时生成的人物表与服务端在该文件缺失时从原始番剧卡牌推导的结果完全相同，
+所以 all_persons.json 不纳入版本库，需要 --fetch-missing / --staff 的补充时再运行本脚本。
+"""
+
+import argparse
+import glob
+import json
+import logging
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Add project root to the Python path to allow absolute imports
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from backend import instrumentation
+from backend.instrumentation import span
+from json_stream import write_records
+from person_index import PersonTable
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+
+ANIME_DIR = "data/anime/raw_cards"
+CHARACTER_DIR = "data/character/raw_cards"
+OUTPUT_FILE = "data/person/all_persons.json"
+ANIME_SUBJECT_TYPE = 2
+# 记录的制作人员职位
+STAFF_RELATIONS = {"原作", "导演", "脚本", "系列构成", "人物设定", "音乐", "动画制作", "总作画监督"}
+
+
+def _bangumi_api():
+    """延迟导入 bangumi_api（需要 requests / pydantic）。"""
+    from backend.bangumi_asset import bangumi_api
+
+    return bangumi_api
+
+
+def _iter_json_files(directory):
+    for file_path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+        try:
+            with span("io.read"), open(file_path, "r", encoding="utf-8") as f:
+                text = f.read()
+            with span("json.parse"):
+                yield json.loads(text)
+        except Exception as e:
+            logging.error(f"读取文件 {file_path} 时出错: {e}")
+            instrumentation.count("files.failed")
+
+
+@span("collect.actors")
+def collect_actors(table, anime_dir=ANIME_DIR):
+    """从番剧主角的 actors 字段收集声优，返回读取的番剧 ID 列表。"""
+    anime_ids = []
+    for anime in _iter_json_files(anime_dir):
+        anime_ids.append(int(anime["id"]))
+        instrumentation.count("voices.embedded", table.add_anime(anime))
+    return anime_ids
+
+
+def _fetch_all(fn, ids, workers):
+    """并发调用 fn(id)，逐个产出 (id, 结果)；失败的 ID 记录日志后跳过。"""
+
+    def call(item_id):
+        try:
+            return item_id, fn(item_id)
+        except Exception as e:
+            logging.warning(f"请求 {item_id} 失败: {e}")
+            instrumentation.count("fetch.failed")
+            return item_id, None
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for item_id, result in pool.map(call, ids):
+            if result is not None:
+                yield item_id, result
+
+
+@span("fetch.voices")
+def fetch_missing_voices(table, api, workers, character_dir=CHARACTER_DIR):
+    """为没有配音信息的角色逐个请求关联人物。"""
+    voiced = table.voiced_characters()
+    stems = (
+        os.path.splitext(os.path.basename(path))[0]
+        for path in glob.glob(os.path.join(character_dir, "*.json"))
+    )
+    missing = sorted(int(s) for s in stems if s.isdigit() and int(s) not in voiced)
+    logging.info(f"{len(missing)} 个角色缺少配音信息，开始请求...")
+    for character_id, persons in _fetch_all(api.get_character_related_persons, missing, workers):
+        for person in persons:
+            if int(person.subject_type.value) == ANIME_SUBJECT_TYPE:
+                table.add_voice(person.model_dump(mode="json"), character_id, person.subject_id)
+                instrumentation.count("voices.fetched")
+
+
+@span("fetch.staff")
+def fetch_staff(table, api, anime_ids, workers):
+    """请求每部番剧的关联人物，记录主要制作人员。"""
+    logging.info(f"开始请求 {len(anime_ids)} 部番剧的制作人员...")
+    for anime_id, persons in _fetch_all(api.get_related_persons, anime_ids, workers):
+        for person in persons:
+            if person.relation in STAFF_RELATIONS:
+                table.add_staff(person.model_dump(mode="json"), anime_id, person.relation)
+                instrumentation.count("staff.fetched")
+
+
+def save_processed_data(records, output_file=OUTPUT_FILE):
+    """保存人物表。"""
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    with span("io.write"):
+        count = write_records(records, output_file, indent=2)
+    logging.info(f"数据已保存到 {output_file}，共 {count} 个人物")
+    return count
+
+
+def main(args):
+    """主函数"""
+    if not os.path.exists(args.anime_dir):
+        logging.error(f"原始番剧数据目录不存在: {args.anime_dir}")
+        return
+
+    table = PersonTable()
+    anime_ids = collect_actors(table, args.anime_dir)
+    logging.info(
+        f"从 {len(anime_ids)} 部番剧中收集到 {len(table.persons)} 个声优，"
+        f"覆盖 {len(table.voiced_characters())} 个角色"
+    )
+
+    if args.fetch_missing or args.staff:
+        api = _bangumi_api()
+        api.set_rate_limit(args.rate, burst=args.workers)
+        # 批量请求只读少数字段，不必对每个响应做完整校验
+        api.set_validation("light")
+        if args.fetch_missing:
+            fetch_missing_voices(table, api, args.workers, args.character_dir)
+        if args.staff:
+            fetch_staff(table, api, anime_ids, args.workers)
+
+    save_processed_data(table.records(), args.output)
+    logging.info("人物数据处理完成！")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="收集声优与制作人员，生成 all_persons.json")
+    parser.add_argument("--anime-dir", default=ANIME_DIR, help="原始番剧数据目录")
+    parser.add_argument("--character-dir", default=CHARACTER_DIR, help="原始角色数据目录")
+    parser.add_argument("-o", "--output", default=OUTPUT_FILE, help="输出文件")
+    parser.add_argument(
+        "--fetch-missing", action="store_true", help="联网补齐没有配音信息的角色"
+    )
+    parser.add_argument("--staff", action="store_true", help="联网收集番剧的主要制作人员")
+    parser.add_argument("-w", "--workers", type=int, default=4, help="并发请求数")
+    parser.add_argument("-r", "--rate", type=float, default=2.0, help="每秒请求数上限")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    with instrumentation.session("process_person_data", args):
+        main(args)
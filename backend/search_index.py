@@ -0,0 +1,341 @@
+"""
+Full-text search over card names and descriptions.
+
+Text is normalized (NFKC, lower case) and split into runs: CJK runs become
+overlapping character bigrams (a lone CJK character stays a unigram), other
+scripts become words.  At index time the last character of each CJK run is
+also kept as a unigram, so every character occurrence starts some term and a
+one-character type-ahead query is a plain prefix match.  Each catalog is indexed once per version into:
+
+- a sorted term dictionary, so prefix matches are a binary-search range;
+- term -> cards postings as CSR arrays with field-weighted term frequencies
+  (a name hit counts more than a description hit);
+- per-card weighted lengths for BM25 length normalization.
+
+Like the synergy index, the arrays are saved as an ``.npz`` artifact next to
+the card stores and rebuilt only when the source changes.  A query is a few
+postings slices scattered into a score array, which keeps ``/api/search`` in the
+low-millisecond range.
+
+Run directly to build an artifact and try a query:
+
+    python backend/search_index.py --input data/selected_anime/all_cards.json 进击
+"""
+
+import argparse
+import bisect
+import logging
+import os
+import re
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from atomic_file import AtomicFile
+
+
+# Field -> term-frequency weight.  Missing fields are skipped; list values
+# (e.g. a character's anime_names) are indexed item by item.
+SEARCH_FIELDS = {
+    "name": 3.0,
+    "original_name": 3.0,
+    "name_cn": 3.0,
+    "anime_names": 1.5,
+    "description": 1.0,
+}
+BM25_K1 = 1.2
+BM25_B = 0.75
+# A one-character prefix can match thousands of terms; keep the most common
+MAX_PREFIX_TERMS = 64
+
+_CJK = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff"
+_RUN_RE = re.compile(f"[{_CJK}]+|[^\\W_{_CJK}]+")
+_CJK_RE = re.compile(f"[{_CJK}]")
+
+
+def _runs(text: str) -> List[str]:
+    return _RUN_RE.findall(unicodedata.normalize("NFKC", text).lower())
+
+
+def _run_terms(run: str) -> List[str]:
+    if len(run) > 1 and _CJK_RE.match(run):
+        return [run[i : i + 2] for i in range(len(run) - 1)]
+    return [run]
+
+
+def tokenize(text: str) -> List[str]:
+    """Terms of ``text``: CJK bigrams and lower-cased words."""
+    return [term for run in _runs(text) for term in _run_terms(run)]
+
+
+def _index_terms(text: str) -> List[str]:
+    terms = []
+    for run in _runs(text):
+        terms.extend(_run_terms(run))
+        if len(run) > 1 and _CJK_RE.match(run):
+            terms.append(run[-1])
+    return terms
+
+
+def _field_texts(card: dict, field: str) -> List[str]:
+    value = card.get(field)
+    if not value:
+        return []
+    if isinstance(value, list):
+        return [str(v) for v in value if v]
+    return [str(value)]
+
+
+class SearchIndex:
+    """Term dictionary plus BM25 postings for one catalog."""
+
+    def __init__(
+        self,
+        terms: Sequence[str],
+        card_ids: np.ndarray,
+        term_indptr: np.ndarray,
+        term_cards: np.ndarray,
+        term_weights: np.ndarray,
+        card_lengths: np.ndarray,
+        signature: str = "",
+    ):
+        self.terms = list(terms)
+        self.term_code = {term: code for code, term in enumerate(self.terms)}
+        self.card_ids = card_ids
+        self.term_indptr = term_indptr
+        self.term_cards = term_cards
+        self.term_weights = term_weights
+        self.card_lengths = card_lengths
+        self.signature = signature
+
+        n = len(card_ids)
+        df = np.diff(term_indptr)
+        self.term_df = df
+        self.term_idf = np.log(1 + (n - df + 0.5) / (df + 0.5))
+        mean_length = float(card_lengths.mean()) if n else 0.0
+        # BM25 per-card length normalization, precomputed
+        self.card_norm = BM25_K1 * (
+            1 - BM25_B + BM25_B * card_lengths / max(mean_length, 1e-9)
+        )
+
+    # --- construction / persistence ---
+
+    @classmethod
+    def build(
+        cls,
+        cards: Iterable[dict],
+        fields: Dict[str, float] = SEARCH_FIELDS,
+        signature: str = "",
+    ) -> "SearchIndex":
+        card_ids: List[int] = []
+        lengths: List[float] = []
+        postings: Dict[str, Dict[int, float]] = {}
+        for card in cards:
+            if card.get("id") is None:
+                continue
+            row = len(card_ids)
+            card_ids.append(int(card["id"]))
+            length = 0.0
+            for field, weight in fields.items():
+                for text in _field_texts(card, field):
+                    for term in _index_terms(text):
+                        row_weights = postings.setdefault(term, {})
+                        row_weights[row] = row_weights.get(row, 0.0) + weight
+                        length += weight
+            lengths.append(length)
+
+        terms = sorted(postings)
+        term_indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum([len(postings[t]) for t in terms], out=term_indptr[1:])
+        term_cards = np.fromiter(
+            (row for t in terms for row in postings[t]),
+            dtype=np.int32,
+            count=int(term_indptr[-1]),
+        )
+        term_weights = np.fromiter(
+            (w for t in terms for w in postings[t].values()),
+            dtype=np.float32,
+            count=int(term_indptr[-1]),
+        )
+        return cls(
+            terms,
+            np.array(card_ids, dtype=np.int64),
+            term_indptr,
+            term_cards,
+            term_weights,
+            np.array(lengths, dtype=np.float32),
+            signature,
+        )
+
+    def save(self, path: str):
+        """Write the artifact atomically (temp file + rename)."""
+        with AtomicFile(path, suffix=".npz") as f:
+            np.savez(
+                f,
+                terms=np.array(self.terms, dtype=str),
+                card_ids=self.card_ids,
+                term_indptr=self.term_indptr,
+                term_cards=self.term_cards,
+                term_weights=self.term_weights,
+                card_lengths=self.card_lengths,
+                signature=np.array(self.signature),
+            )
+
+    @classmethod
+    def load(cls, path: str) -> "SearchIndex":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                data["terms"].tolist(),
+                data["card_ids"],
+                data["term_indptr"],
+                data["term_cards"],
+                data["term_weights"],
+                data["card_lengths"],
+                str(data["signature"]),
+            )
+
+    # --- queries ---
+
+    def __len__(self) -> int:
+        return len(self.card_ids)
+
+    def _prefix_codes(self, prefix: str) -> np.ndarray:
+        """Codes of the terms starting with ``prefix``, most common first."""
+        lo = bisect.bisect_left(self.terms, prefix)
+        hi = bisect.bisect_left(self.terms, prefix + "\U0010ffff", lo)
+        codes = np.arange(lo, hi)
+        if len(codes) > MAX_PREFIX_TERMS:
+            codes = codes[np.argsort(-self.term_df[codes], kind="stable")[:MAX_PREFIX_TERMS]]
+        return codes
+
+    def _query_groups(self, query: str, prefix: bool) -> List[np.ndarray]:
+        """
+        One array of term codes per query term.  Every group must match; with
+        ``prefix`` the last group is the terms the unfinished last run can
+        complete to (a lone CJK character matches the bigrams it starts).
+        """
+        runs = _runs(query)
+        if not runs:
+            return []
+        last = runs[-1]
+        complete_last = not prefix or query[-1:].isspace()
+        if not complete_last and len(last) > 1 and _CJK_RE.match(last):
+            # The final bigram of a CJK run is already whole
+            complete_last = True
+
+        groups = []
+        for i, run in enumerate(runs):
+            if i == len(runs) - 1 and not complete_last:
+                groups.append(self._prefix_codes(run))
+                continue
+            for term in _run_terms(run):
+                code = self.term_code.get(term)
+                groups.append(np.array([] if code is None else [code], dtype=np.int64))
+        return groups
+
+    def search(
+        self, query: str, limit: int = 10, prefix: bool = True, normalize: bool = False
+    ) -> List[dict]:
+        """
+        BM25-ranked cards matching every term of ``query``: [{id, score}].
+
+        Raw BM25 scores scale with the index's term statistics, so they don't
+        compare across indexes.  With ``normalize`` each score is divided by
+        the most the query can score in this index (every term at its highest
+        IDF completion, fully saturated: the sum of IDF * (k1 + 1)), giving a
+        value in [0, 1] that does.
+        """
+        groups = self._query_groups(query, prefix)
+        if not groups or any(len(codes) == 0 for codes in groups):
+            return []
+
+        n = len(self.card_ids)
+        scores = np.zeros(n, dtype=np.float64)
+        matched = np.zeros(n, dtype=np.int32)
+        for codes in groups:
+            group_scores = np.zeros(n, dtype=np.float64)
+            for code in codes.tolist():
+                lo, hi = self.term_indptr[code], self.term_indptr[code + 1]
+                rows = self.term_cards[lo:hi]
+                tf = self.term_weights[lo:hi].astype(np.float64)
+                bm25 = self.term_idf[code] * tf * (BM25_K1 + 1) / (tf + self.card_norm[rows])
+                # Several prefix completions in one card: keep the best one
+                np.maximum.at(group_scores, rows, bm25)
+            scores += group_scores
+            matched += group_scores > 0
+
+        hits = np.flatnonzero(matched == len(groups))
+        if len(hits) == 0:
+            return []
+        order = hits[np.lexsort((hits, -scores[hits]))][:limit]
+        if normalize:
+            scores /= sum(self.term_idf[codes].max() for codes in groups) * (BM25_K1 + 1)
+        return [
+            {"id": int(self.card_ids[row]), "score": round(float(scores[row]), 4)}
+            for row in order.tolist()
+        ]
+
+
+def open_index(source, cache_dir: str) -> Optional[SearchIndex]:
+    """
+    Load the search artifact for a catalog source, rebuilding it when the
+    source changed since it was built.  Returns None when the source is missing.
+    """
+    signature = source.signature()
+    if signature is None:
+        return None
+
+    path = os.path.join(cache_dir, f"{source.name}.search.npz")
+    if os.path.exists(path):
+        try:
+            index = SearchIndex.load(path)
+            if index.signature == signature:
+                return index
+        except (OSError, ValueError, KeyError):
+            pass
+
+    index = SearchIndex.build(source.records(), signature=signature)
+    index.save(path)
+    logging.info(
+        f"Built search index for {len(index)} {source.name} cards "
+        f"({len(index.terms)} terms) into {path}"
+    )
+    return index
+
+
+def main():
+    import time
+
+    from json_stream import iter_records
+
+    parser = argparse.ArgumentParser(description="Build the full-text search index")
+    parser.add_argument(
+        "-i", "--input", default="data/selected_anime/all_cards.json", help="Card catalog JSON"
+    )
+    parser.add_argument(
+        "-o", "--output", default=None, help="Artifact path (default: <input>.search.npz)"
+    )
+    parser.add_argument("-n", "--limit", type=int, default=10, help="Results to print")
+    parser.add_argument("query", nargs="*", help="Query to run against the index")
+    args = parser.parse_args()
+
+    cards = {card["id"]: card.get("name", "") for card in iter_records(args.input)}
+    index = SearchIndex.build(iter_records(args.input))
+    output = args.output or os.path.splitext(args.input)[0] + ".search.npz"
+    index.save(output)
+    print(f"Indexed {len(index)} cards, {len(index.terms)} terms -> {output}")
+
+    if args.query:
+        query = " ".join(args.query)
+        start = time.perf_counter()
+        results = index.search(query, args.limit)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"--- {len(results)} results for {query!r} in {elapsed:.2f} ms ---")
+        for result in results:
+            print(f"{result['score']:8.3f}  {result['id']:>8}  {cards.get(result['id'], '')}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -1,57 +1,352 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, g, request, jsonify, send_from_directory
 import os
-import json
+import time
+
+from bootstrap import get_bundle, user_fields
+from card_store import json_array, ndjson_chunks
+from catalog import (
+    SEARCHABLE,
+    get_catalog,
+    reload_status,
+    request_reload,
+    store_open_stats,
+    watch_catalog,
+)
+import metrics
+from pagination import DEFAULT_PAGE_SIZE, CursorError, Page, decode_cursor, list_keyset
+from deck_eval import DeckError, cache_stats as deck_cache_stats, evaluate, evaluate_batch
+from synergy_index import METRICS as SYNERGY_METRICS
+from user_store import RevisionConflict, UserStoreError, open_user_store
 
 app = Flask(__name__, static_folder="../frontend")
 app.config["SEND_FILE_MAX_AGE_DEFAULT"] = 0  # Disable caching
-USER_DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "data", "user_data")
+# Per-route latency, status, size and in-flight metrics, served at /metrics
+app.wsgi_app = metrics.MetricsMiddleware(app.wsgi_app)
 DATA_ROOT = os.path.join(os.path.dirname(__file__), "..", "data")
+# A prebuilt catalog to serve as-is instead of compiling DATA_ROOT (the
+# serverless entry, api/index.py, ships one; see catalog.get_catalog)
+CATALOG_SNAPSHOT = os.environ.get("CATALOG_SNAPSHOT")
+# User saves: a directory by default, or a remote KV service (see user_store.py)
+USER_DATA_DIR = os.environ.get("USER_DATA_DIR") or os.path.join(DATA_ROOT, "user_data")
+USER_STORE = open_user_store(os.environ.get("USER_STORE_URL") or USER_DATA_DIR)
+# Token for the admin endpoints.  When unset, only the development server
+# (``python server.py``, which sets ALLOW_LOCAL_ADMIN) answers them, and only
+# for loopback requests that didn't come through a reverse proxy: behind one,
+# every request arrives from the proxy's address
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+ALLOW_LOCAL_ADMIN = False
+LOCAL_ADDRS = {"127.0.0.1", "::1"}
+PROXY_HEADERS = ("X-Forwarded-For", "X-Real-IP", "Forwarded")
+# Records per write of /api/cards/stream (?chunk= overrides, up to the max)
+STREAM_CHUNK = 64
+MAX_STREAM_CHUNK = 1000
 
 
 # --- Helper Functions ---
-def get_user_filepath(username):
+def user_key(username):
+    """The user-store key of a username, or None if the name is invalid."""
     if not username or not username.isalnum():
         return None
-    return os.path.join(USER_DATA_DIR, f"{username}.json")
+    return username
+
+
+def current_catalog():
+    """
+    The catalog for this request.  Pinned on first use, so a hot reload that
+    swaps the catalog mid-request can't mix two versions in one response.
+    """
+    if "catalog" not in g:
+        g.catalog = get_catalog(DATA_ROOT, CATALOG_SNAPSHOT)
+    return g.catalog
+
+
+def is_admin():
+    if ADMIN_TOKEN:
+        return request.headers.get("X-Admin-Token") == ADMIN_TOKEN
+    return (
+        ALLOW_LOCAL_ADMIN
+        and request.remote_addr in LOCAL_ADDRS
+        and not any(header in request.headers for header in PROXY_HEADERS)
+    )
+
+
+def error_response(e: Exception):
+    """Answer an unexpected handler error with a 500, logging and counting it."""
+    app.logger.exception(f"{request.method} {request.path} failed")
+    metrics.record_exception(request.environ.get(metrics.ROUTE_KEY), e)
+    return jsonify({"error": str(e)}), 500
+
+
+def json_bytes_response(body: bytes):
+    """Return pre-encoded JSON (e.g. straight from a card store) as a response."""
+    return Response(body, mimetype="application/json")
+
+
+def _int_ids(values):
+    return [int(i) for i in values or () if isinstance(i, (int, str)) and str(i).isdigit()]
+
+
+def collection_ids(payload: dict, key: str):
+    """Card IDs of a saved collection (a list of [id, {count}] entries)."""
+    return _int_ids(entry[0] for entry in payload.get(key) or () if entry)
+
+
+def load_user_payload(username):
+    """The saved payload of a user, {} for a new user, or None for an invalid name."""
+    key = user_key(username)
+    if not key:
+        return None
+    entry = USER_STORE.get(key)
+    return (entry.value or {}) if entry else {}
+
+
+def request_object():
+    """The request's JSON body, or None when it isn't a JSON object."""
+    data = request.get_json()
+    return data if isinstance(data, dict) else None
+
+
+def request_revision(data: dict):
+    """The revision a write is conditional on: the body's "revision" or If-Match."""
+    revision = data.get("revision") or request.headers.get("If-Match")
+    return revision.strip('"') if revision else None
+
+
+def conflict_response(e: RevisionConflict):
+    return jsonify({"error": "Revision conflict", "revision": e.revision}), 409
+
+
+def request_cursor(scope: str, default_sort=None):
+    """
+    The sort key and decoded ``?cursor=`` of a keyset-paginated listing.
+    Without a cursor the sort comes from ``?sort=`` (or ``default_sort``)
+    and the cursor is None.  Raises CursorError for a bad cursor.
+    """
+    token = request.args.get("cursor")
+    sort = request.args.get("sort")
+    if not token:
+        return sort or default_sort, None
+    cursor = decode_cursor(token, scope)
+    if sort and sort != cursor.key:
+        raise CursorError(f"Cursor was issued for sort={cursor.key}, not sort={sort}")
+    return cursor.key, cursor
+
+
+def paged_response(response, page: Page):
+    """Attach the next-page cursor (if any) and staleness of a keyset page."""
+    if page.next_cursor:
+        response.headers["X-Next-Cursor"] = page.next_cursor
+    if page.stale:
+        response.headers["X-Cursor-Stale"] = "true"
+    return response
+
+
+def catalog_page(name: str, sort: str, cursor):
+    """One keyset page of a catalog, as (card records, Page)."""
+    catalog = current_catalog()
+    store = catalog.store(name)
+    limit = request.args.get("limit", type=int, default=DEFAULT_PAGE_SIZE)
+    page = catalog.keyset(name, sort).page(cursor, limit, name, catalog.version)
+    return [store[row] for row in page.items], page
+
+
+@app.before_request
+def name_route():
+    # The route template (not the raw path) keeps metric labels bounded
+    rule = request.url_rule
+    request.environ[metrics.ROUTE_KEY] = rule.rule if rule is not None else metrics.UNMATCHED
+
+
+@app.after_request
+def add_catalog_headers(response):
+    catalog = g.get("catalog")
+    if catalog is not None:
+        response.headers["X-Catalog-Version"] = catalog.version
+        response.headers["X-Catalog-Generation"] = str(catalog.generation)
+    return response
 
 
 # --- API Routes ---
 @app.route("/api/user/data", methods=["GET"])
 def get_user_data():
-    username = request.args.get("username")
-    filepath = get_user_filepath(username)
-    if not filepath:
+    key = user_key(request.args.get("username"))
+    if not key:
         return jsonify({"error": "Invalid username"}), 400
 
-    if not os.path.exists(filepath):
-        # If user file doesn't exist, return default initial state
+    try:
+        entry = USER_STORE.get(key)
+    except (UserStoreError, ValueError) as e:
+        return error_response(e)
+    if entry is None:
+        # If the user doesn't exist yet, return default initial state
         return jsonify({"isNewUser": True})
 
-    try:
-        with open(filepath, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        return jsonify(data)
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    response = jsonify(entry.value)
+    response.headers["ETag"] = f'"{entry.revision}"'
+    return response
 
 
 @app.route("/api/user/data", methods=["POST"])
 def save_user_data():
-    data = request.get_json()
-    username = data.get("username")
-    filepath = get_user_filepath(username)
-    if not filepath:
+    """Replace a user's save; conditional when a revision is given."""
+    data = request_object()
+    if data is None:
+        return jsonify({"error": "Request body must be a JSON object"}), 400
+    key = user_key(data.get("username"))
+    if not key:
         return jsonify({"error": "Invalid username"}), 400
 
-    if not os.path.exists(USER_DATA_DIR):
-        os.makedirs(USER_DATA_DIR)
+    try:
+        revision = USER_STORE.put(key, data.get("payload"), request_revision(data))
+        return jsonify({"message": "Data saved successfully", "revision": revision}), 200
+    except RevisionConflict as e:
+        return conflict_response(e)
+    except Exception as e:
+        return error_response(e)
+
+
+@app.route("/api/user/data", methods=["PATCH"])
+def patch_user_data():
+    """Merge {"changes": {...}} into the top level of a user's save (null deletes)."""
+    data = request_object()
+    if data is None:
+        return jsonify({"error": "Request body must be a JSON object"}), 400
+    key = user_key(data.get("username"))
+    changes = data.get("changes")
+    if not key:
+        return jsonify({"error": "Invalid username"}), 400
+    if not isinstance(changes, dict):
+        return jsonify({"error": "changes must be an object"}), 400
+
+    try:
+        entry = USER_STORE.patch(key, changes, request_revision(data))
+        return jsonify({"message": "Data saved successfully", "revision": entry.revision}), 200
+    except RevisionConflict as e:
+        return conflict_response(e)
+    except Exception as e:
+        return error_response(e)
+
+
+# Save fields listed by /api/user/history and /api/user/collection, per ?type=
+HISTORY_FIELDS = {"anime": "animeHistory", "character": "characterHistory"}
+COLLECTION_FIELDS = {"anime": "animeCollection", "character": "characterCollection"}
+COLLECTION_SORTS = ("id", "count")
+
+
+def listing_error(fields: dict):
+    """The 400 response for a user listing request with a bad username or ?type=."""
+    kind = request.args.get("type", "anime")
+    if not user_key(request.args.get("username")):
+        return jsonify({"error": "Invalid username"}), 400
+    if kind not in fields:
+        types = ", ".join(fields)
+        return jsonify({"error": f"Unknown type '{kind}', expected one of: {types}"}), 400
+    return None
+
+
+def user_listing(fields: dict):
+    """The save entry, ``?type=`` and saved list of a user listing request."""
+    kind = request.args.get("type", "anime")
+    entry = USER_STORE.get(user_key(request.args.get("username")))
+    items = (entry.value or {}).get(fields[kind]) if entry else None
+    return entry, kind, items if isinstance(items, list) else []
+
+
+@app.route("/api/user/history", methods=["GET"])
+def get_user_history():
+    """
+    A user's gacha history, newest pull first, paged by cursor.  Entries get
+    a ``seq`` (their position in the append-only history), so pulls made
+    while paging don't shift later pages.
+    """
+    error = listing_error(HISTORY_FIELDS)
+    if error:
+        return error
+    try:
+        entry, kind, history = user_listing(HISTORY_FIELDS)
+        scope = f"history/{kind}"
+        _, cursor = request_cursor(scope)
+        items = [
+            {**item, "seq": seq}
+            for seq, item in enumerate(history)
+            if isinstance(item, dict) and isinstance(item.get("id"), int)
+        ]
+        page = list_keyset(items, "-seq", ("seq",)).page(
+            cursor,
+            request.args.get("limit", type=int, default=DEFAULT_PAGE_SIZE),
+            scope,
+            entry.revision if entry else None,
+        )
+    except CursorError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return error_response(e)
+    response = jsonify(
+        {"history": page.items, "total": len(items), "nextCursor": page.next_cursor}
+    )
+    return paged_response(response, page)
+
+
+@app.route("/api/user/collection", methods=["GET"])
+def get_user_collection():
+    """A user's card collection sorted by ``?sort=`` (id or count), paged by cursor."""
+    error = listing_error(COLLECTION_FIELDS)
+    if error:
+        return error
+    try:
+        entry, kind, collection = user_listing(COLLECTION_FIELDS)
+        scope = f"collection/{kind}"
+        sort, cursor = request_cursor(scope, default_sort="id")
+        items = [
+            {**(item[1] if isinstance(item[1], dict) else {}), "id": item[0]}
+            for item in collection
+            if isinstance(item, list) and len(item) == 2 and isinstance(item[0], int)
+        ]
+        page = list_keyset(items, sort, COLLECTION_SORTS).page(
+            cursor,
+            request.args.get("limit", type=int, default=DEFAULT_PAGE_SIZE),
+            scope,
+            entry.revision if entry else None,
+        )
+    except CursorError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return error_response(e)
+    response = jsonify(
+        {"collection": page.items, "total": len(items), "nextCursor": page.next_cursor}
+    )
+    return paged_response(response, page)
+
+
+@app.route("/api/bootstrap", methods=["GET"])
+def bootstrap():
+    """
+    Everything the client loads on startup in one round trip: the catalog
+    bundle (unless ``?version=`` already names it) and the user's save.
+    """
+    username = request.args.get("username")
+    key = user_key(username)
+    if username is not None and not key:
+        return jsonify({"error": "Invalid username"}), 400
 
     try:
-        with open(filepath, "w", encoding="utf-8") as f:
-            json.dump(data.get("payload"), f, ensure_ascii=False, indent=4)
-        return jsonify({"message": "Data saved successfully"}), 200
+        catalog = current_catalog()
+        bundle = get_bundle(catalog.version, catalog.anime, catalog.characters)
+        entry = USER_STORE.get(key) if key else None
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return error_response(e)
+    if entry is not None:
+        user = user_fields(entry.value, entry.revision)
+    else:
+        user = user_fields({"isNewUser": True} if key else None, None)
+
+    stale = request.args.get("version") != bundle.version
+    gzip = stale and "gzip" in request.headers.get("Accept-Encoding", "")
+    response = json_bytes_response(bundle.render(stale, user, gzip))
+    response.headers["Vary"] = "Accept-Encoding"
+    if gzip:
+        response.headers["Content-Encoding"] = "gzip"
+    return response
 
 
 @app.route("/data/<path:path>")
@@ -63,137 +358,560 @@ def serve_data_files(path):
 # --- Anime API Routes ---
 @app.route("/api/all_animes", methods=["GET"])
 def get_animes():
-    """Get a list of anime cards with full data."""
+    """
+    Get a list of anime cards with full data.  ``?offset=`` pages by
+    position; ``?sort=`` (e.g. ``-rating_score``) and the ``X-Next-Cursor``
+    of the previous page (as ``?cursor=``) page by key instead.
+    """
     try:
-        anime_dir = os.path.join(DATA_ROOT, "selected_anime", "all_cards.json")
-        if not os.path.exists(anime_dir):
+        store = current_catalog().anime
+        if store is None:
             return jsonify({"error": "Anime directory not found"}), 404
 
+        sort, cursor = request_cursor("anime")
+        if sort:
+            records, page = catalog_page("anime", sort, cursor)
+            return paged_response(json_bytes_response(json_array(records)), page)
+
         # Get query parameters
         limit = request.args.get("limit", type=int, default=50)
         offset = request.args.get("offset", type=int, default=0)
 
-        # Get all anime files
-        with open(anime_dir, "r", encoding="utf-8") as f:
-            anime_data = json.load(f)
-
-        # Apply pagination
-        paginated_anime = anime_data[offset : offset + limit]
-
-        return jsonify(paginated_anime)
+        return json_bytes_response(json_array(store.slice(offset, limit)))
+    except CursorError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return error_response(e)
 
 
 @app.route("/api/anime/<int:anime_id>", methods=["GET"])
 def get_anime(anime_id):
     """Get specific character data by ID."""
     try:
-        anime_file = os.path.join(
-            DATA_ROOT, "anime", "processed_cards", f"{anime_id}.json"
-        )
-        if not os.path.exists(anime_file):
+        store = current_catalog().anime_cards
+        record = store.get(anime_id) if store is not None else None
+        if record is None:
             return jsonify({"error": "Anime not found"}), 404
 
-        with open(anime_file, "r", encoding="utf-8") as f:
-            anime_data = json.load(f)
-
-        return jsonify(anime_data)
+        return json_bytes_response(record.raw_json())
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return error_response(e)
 
 
 @app.route("/api/anime/batch", methods=["POST"])
 def get_anime_batch():
     """Get multiple anime by IDs."""
     try:
-        data = request.get_json()
-        character_ids = data.get("ids", [])
+        data = request_object()
+        character_ids = data.get("ids") if data is not None else None
 
-        if not character_ids:
+        if not character_ids or not isinstance(character_ids, list):
             return jsonify({"error": "No anime IDs provided"}), 400
 
-        anime = []
-        for char_id in character_ids:
-            anime_file = os.path.join(
-                DATA_ROOT, "anime", "processed_cards", f"{char_id}.json"
+        store = current_catalog().anime_cards
+        records = [store.get(i) for i in _int_ids(character_ids)] if store else []
+        anime = json_array(r for r in records if r is not None)
+
+        return json_bytes_response(b'{"anime":' + anime + b"}")
+    except Exception as e:
+        return error_response(e)
+
+
+# --- Synergy API Routes ---
+@app.route("/api/synergies", methods=["GET"])
+def get_synergies():
+    """
+    Tag synergy queries against the selected anime catalog.
+
+    ?tag=X                 tags that co-occur with X (metric=lift|pmi|count)
+    ?tags=X,Y              IDs of the cards that carry all of the given tags
+    ?deck=id1,id2,...      best-synergy cards to add to a partial deck
+    (no parameters)        the most common tags
+    """
+    try:
+        index = current_catalog().synergy("anime")
+        if index is None:
+            return jsonify({"error": "Anime catalog not found"}), 404
+
+        limit = min(request.args.get("limit", type=int, default=10), 100)
+        tag = request.args.get("tag")
+        tags = request.args.get("tags")
+        deck = request.args.get("deck")
+
+        if tag:
+            metric = request.args.get("metric", default="lift")
+            if metric not in SYNERGY_METRICS:
+                return jsonify({"error": f"Unknown metric: {metric}"}), 400
+            min_support = request.args.get("min_support", type=int, default=2)
+            return jsonify(
+                {
+                    "tag": tag,
+                    "count": index.tag_count(tag),
+                    "partners": index.partners(tag, limit, metric, min_support),
+                }
             )
-            if os.path.exists(anime_file):
-                with open(anime_file, "r", encoding="utf-8") as f:
-                    anime_data = json.load(f)
-                    anime.append(anime_data)
 
-        return jsonify({"anime": anime})
+        if tags:
+            tag_list = [t for t in tags.split(",") if t]
+            return jsonify({"tags": tag_list, "cards": index.cards_with(tag_list)})
+
+        if deck:
+            try:
+                deck_ids = [int(i) for i in deck.split(",") if i]
+            except ValueError:
+                return jsonify({"error": "deck must be comma-separated card IDs"}), 400
+            store = current_catalog().anime
+            suggestions = index.suggest(deck_ids, limit)
+            for suggestion in suggestions:
+                record = store.get(suggestion["id"])
+                suggestion["name"] = record.name
+                suggestion["rarity"] = record.rarity
+                suggestion["cost"] = record.cost
+            return jsonify({"deck": deck_ids, "suggestions": suggestions})
+
+        return jsonify({"cards": len(index), "tags": index.top_tags(limit)})
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return error_response(e)
+
+
+# --- Search API Routes ---
+@app.route("/api/search", methods=["GET"])
+def search_cards():
+    """
+    Full-text search over anime and character names and descriptions.
+
+    ?q=...                 query; the last word is prefix-matched (type-ahead)
+    ?type=anime|characters restrict to one catalog (default: both)
+    ?prefix=0              match the last word exactly
+
+    Raw BM25 scores depend on each catalog's term statistics, so each is
+    divided by the query's maximum attainable score in its catalog (see
+    ``SearchIndex.search``) before the two lists are merged.
+    """
+    try:
+        start = time.perf_counter()
+        query = request.args.get("q", "").strip()
+        if not query:
+            return jsonify({"error": "No query provided"}), 400
+        kind = request.args.get("type")
+        if kind is not None and kind not in SEARCHABLE:
+            return jsonify({"error": f"Unknown type: {kind}"}), 400
+        limit = min(request.args.get("limit", type=int, default=10), 100)
+        prefix = request.args.get("prefix", default="1") != "0"
+
+        catalog = current_catalog()
+        results = []
+        for name in (kind,) if kind else SEARCHABLE:
+            index = catalog.search(name)
+            if index is None:
+                continue
+            store = catalog.store(name)
+            for hit in index.search(query, limit, prefix, normalize=True):
+                record = store.get(hit["id"])
+                hit["type"] = name
+                hit["name"] = record.name
+                hit["rarity"] = record.rarity
+                results.append(hit)
+        results.sort(key=lambda hit: -hit["score"])
+        return jsonify(
+            {
+                "query": query,
+                "results": results[:limit],
+                "took_ms": round((time.perf_counter() - start) * 1000, 2),
+            }
+        )
+    except Exception as e:
+        return error_response(e)
+
+
+# --- Recommendation API Routes ---
+# Seed weights for the parts of a save that say what a player likes
+RECOMMEND_SEED_WEIGHTS = {"favorites": 1.5, "watched": 1.0, "queued": 0.75, "owned": 0.5}
+
+
+def recommendation_profile(payload: dict) -> dict:
+    """Watched / queued / favourite / owned anime IDs from a saved payload."""
+    state = payload.get("state") or {}
+    return {
+        "favorites": _int_ids(payload.get("favoriteAnime")),
+        "watched": _int_ids(state.get("watchedAnime")),
+        "queued": _int_ids(slot.get("animeId") for slot in state.get("viewingQueue") or () if slot),
+        "owned": collection_ids(payload, "animeCollection"),
+    }
+
+
+@app.route("/api/recommend", methods=["GET", "POST"])
+def recommend_anime():
+    """
+    "Watch next" suggestions from the anime similarity index.
+
+    GET ?username=X        seeds from the user's save (watched, queue, favourites, collection)
+    GET ?anime=id          cards most similar to one anime
+    POST {"watched": [...], "favorites": [...], "queued": [...], "owned": [...]}
+    Watched and queued anime are never suggested.
+    """
+    try:
+        catalog = current_catalog()
+        index = catalog.similarity("anime")
+        if index is None:
+            return jsonify({"error": "Anime catalog not found"}), 404
+        limit = min(request.args.get("limit", type=int, default=10), 100)
+
+        anime_id = request.args.get("anime", type=int)
+        if request.method == "GET" and anime_id is not None:
+            results = index.similar(anime_id, limit)
+        else:
+            if request.method == "POST":
+                data = request_object()
+                if data is None:
+                    return jsonify({"error": "Request body must be a JSON object"}), 400
+                profile = {key: _int_ids(data.get(key)) for key in RECOMMEND_SEED_WEIGHTS}
+            else:
+                payload = load_user_payload(request.args.get("username"))
+                if payload is None:
+                    return jsonify({"error": "Invalid username"}), 400
+                profile = recommendation_profile(payload)
+
+            seeds = {}
+            for key, weight in RECOMMEND_SEED_WEIGHTS.items():
+                for i in profile[key]:
+                    seeds[i] = max(seeds.get(i, 0.0), weight)
+            results = index.recommend(seeds, profile["watched"] + profile["queued"], limit)
+
+        store = catalog.anime
+        for result in results:
+            record = store.get(result["id"])
+            result["name"] = record.name
+            result["rarity"] = record.rarity
+        return jsonify({"results": results})
+    except Exception as e:
+        return error_response(e)
+
+
+# --- Graph API Routes ---
+def _graph_cards(store, ids):
+    """Join graph node IDs with their catalog records, dropping unknown IDs."""
+    cards = []
+    for card_id in ids:
+        record = store.get(card_id) if store is not None else None
+        if record is not None:
+            cards.append({"id": card_id, "name": record.name, "rarity": record.rarity})
+    return cards
+
+
+@app.route("/api/anime/<int:anime_id>/characters", methods=["GET"])
+def get_anime_characters(anime_id):
+    """Characters of one anime; ?username=X marks (or with owned=1, keeps) the owned ones."""
+    try:
+        catalog = current_catalog()
+        graph = catalog.graph()
+        if graph is None:
+            return jsonify({"error": "Catalog not found"}), 404
+        characters = _graph_cards(catalog.characters, graph.characters_of(anime_id))
+
+        username = request.args.get("username")
+        if username is not None:
+            payload = load_user_payload(username)
+            if payload is None:
+                return jsonify({"error": "Invalid username"}), 400
+            owned = set(collection_ids(payload, "characterCollection"))
+            for character in characters:
+                character["owned"] = character["id"] in owned
+            if request.args.get("owned") == "1":
+                characters = [c for c in characters if c["owned"]]
+        return jsonify({"anime": anime_id, "characters": characters})
+    except Exception as e:
+        return error_response(e)
+
+
+@app.route("/api/anime/<int:anime_id>/related", methods=["GET"])
+def get_related_anime(anime_id):
+    """Anime sharing characters with one anime, most shared first."""
+    try:
+        catalog = current_catalog()
+        graph = catalog.graph()
+        if graph is None:
+            return jsonify({"error": "Catalog not found"}), 404
+        limit = min(request.args.get("limit", type=int, default=20), 100)
+        related = graph.related_anime(anime_id)
+        cards = {c["id"]: c for c in _graph_cards(catalog.anime, [r["id"] for r in related])}
+        results = [{**cards[r["id"]], "shared": r["shared"]} for r in related if r["id"] in cards]
+        return jsonify({"anime": anime_id, "related": results[:limit]})
+    except Exception as e:
+        return error_response(e)
+
+
+@app.route("/api/characters/<int:character_id>/anime", methods=["GET"])
+def get_character_anime(character_id):
+    """Anime one character appears in."""
+    try:
+        catalog = current_catalog()
+        graph = catalog.graph()
+        if graph is None:
+            return jsonify({"error": "Catalog not found"}), 404
+        anime = _graph_cards(catalog.anime, graph.anime_of(character_id))
+        return jsonify({"character": character_id, "anime": anime})
+    except Exception as e:
+        return error_response(e)
+
+
+@app.route("/api/characters/<int:character_id>/voice-actors", methods=["GET"])
+def get_character_voice_actors(character_id):
+    """People voicing one character."""
+    try:
+        voices = current_catalog().voices()
+        if voices is None:
+            return jsonify({"error": "Person table not found"}), 404
+        persons = [
+            {"id": p, "name": voices.person_name(p)} for p in voices.persons_of(character_id)
+        ]
+        return jsonify({"character": character_id, "persons": persons})
+    except Exception as e:
+        return error_response(e)
+
+
+@app.route("/api/characters/<int:character_id>/same-voice", methods=["GET"])
+def get_same_voice_characters(character_id):
+    """Catalog characters sharing a voice actor with one character."""
+    try:
+        catalog = current_catalog()
+        voices = catalog.voices()
+        if voices is None:
+            return jsonify({"error": "Person table not found"}), 404
+        limit = min(request.args.get("limit", type=int, default=20), 100)
+        matches = voices.same_voice(character_id)
+        cards = {c["id"]: c for c in _graph_cards(catalog.characters, [m["id"] for m in matches])}
+        results = [
+            {**cards[m["id"]], "persons": m["persons"]} for m in matches if m["id"] in cards
+        ]
+        return jsonify({"character": character_id, "characters": results[:limit]})
+    except Exception as e:
+        return error_response(e)
+
+
+@app.route("/api/persons/<int:person_id>", methods=["GET"])
+def get_person(person_id):
+    """Get one person (voice actor / staff) record by ID."""
+    try:
+        store = current_catalog().persons
+        record = store.get(person_id) if store is not None else None
+        if record is None:
+            return jsonify({"error": "Person not found"}), 404
+
+        return json_bytes_response(record.raw_json())
+    except Exception as e:
+        return error_response(e)
+
+
+# --- Deck API Routes ---
+@app.route("/api/decks/evaluate", methods=["POST"])
+def evaluate_deck():
+    """
+    Score one deck against the catalog.  The body is a saved deck
+    ({"anime": [...], "character": [...]}) or a bare list of anime IDs.
+    """
+    try:
+        catalog = current_catalog()
+        if catalog.anime is None:
+            return jsonify({"error": "Anime catalog not found"}), 404
+        result = evaluate(catalog, request.get_json())
+        return jsonify({"catalog_version": catalog.version, **result})
+    except DeckError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return error_response(e)
+
+
+@app.route("/api/decks/evaluate/batch", methods=["POST"])
+def evaluate_decks():
+    """
+    Score many decks: {"decks": [deck, ...]} or {"decks": {name: deck}}
+    (e.g. a user's savedDecks); results come back in the same shape.
+    """
+    try:
+        catalog = current_catalog()
+        if catalog.anime is None:
+            return jsonify({"error": "Anime catalog not found"}), 404
+        data = request_object()
+        results = evaluate_batch(catalog, data.get("decks") if data is not None else None)
+        return jsonify({"catalog_version": catalog.version, "results": results})
+    except DeckError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return error_response(e)
 
 
 # --- Character API Routes ---
 @app.route("/api/all_characters", methods=["GET"])
 def get_characters():
-    """Get a list of character cards with full data."""
+    """Get a list of character cards with full data (paged as in get_animes)."""
     try:
-        characters_dir = os.path.join(DATA_ROOT, "selected_character", "all_cards.json")
-        if not os.path.exists(characters_dir):
+        store = current_catalog().characters
+        if store is None:
             return jsonify({"error": "Characters directory not found"}), 404
 
+        sort, cursor = request_cursor("characters")
+        if sort:
+            records, page = catalog_page("characters", sort, cursor)
+            body = b'{"characters":' + json_array(records) + b"}"
+            return paged_response(json_bytes_response(body), page)
+
         # Get query parameters
         limit = request.args.get("limit", type=int, default=50)
         offset = request.args.get("offset", type=int, default=0)
 
-        # Get all character files
-        with open(characters_dir, "r", encoding="utf-8") as f:
-            character_data = json.load(f)
-
-        # Apply pagination
-        paginated_characters = character_data[offset : offset + limit]
-
-        return jsonify({"characters": paginated_characters})
+        characters = json_array(store.slice(offset, limit))
+        return json_bytes_response(b'{"characters":' + characters + b"}")
+    except CursorError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return error_response(e)
 
 
 @app.route("/api/characters/<int:character_id>", methods=["GET"])
 def get_character(character_id):
     """Get specific character data by ID."""
     try:
-        character_file = os.path.join(
-            DATA_ROOT, "character", "raw_cards", f"{character_id}.json"
-        )
-        if not os.path.exists(character_file):
+        store = current_catalog().character_cards
+        record = store.get(character_id) if store is not None else None
+        if record is None:
             return jsonify({"error": "Character not found"}), 404
 
-        with open(character_file, "r", encoding="utf-8") as f:
-            character_data = json.load(f)
-
-        return jsonify(character_data)
+        return json_bytes_response(record.raw_json())
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return error_response(e)
 
 
 @app.route("/api/characters/batch", methods=["POST"])
 def get_characters_batch():
     """Get multiple characters by IDs."""
     try:
-        data = request.get_json()
-        character_ids = data.get("ids", [])
+        data = request_object()
+        character_ids = data.get("ids") if data is not None else None
 
-        if not character_ids:
+        if not character_ids or not isinstance(character_ids, list):
             return jsonify({"error": "No character IDs provided"}), 400
 
-        characters = []
-        for char_id in character_ids:
-            character_file = os.path.join(
-                DATA_ROOT, "character", "raw_cards", f"{char_id}.json"
-            )
-            if os.path.exists(character_file):
-                with open(character_file, "r", encoding="utf-8") as f:
-                    character_data = json.load(f)
-                    characters.append(character_data)
+        store = current_catalog().character_cards
+        records = [store.get(i) for i in _int_ids(character_ids)] if store else []
+        characters = json_array(r for r in records if r is not None)
 
-        return jsonify({"characters": characters})
+        return json_bytes_response(b'{"characters":' + characters + b"}")
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return error_response(e)
+
+
+# --- Catalog Export ---
+@app.route("/api/cards/stream", methods=["GET"])
+def stream_cards():
+    """
+    Export one catalog (``?type=``, default anime) as newline-delimited JSON,
+    ``?chunk=`` records per write.  Cards are read from the mapped store as
+    the response goes out, so server memory stays flat however large the
+    catalog is, and the client can parse the first card right away.
+    """
+    name = request.args.get("type", "anime")
+    catalog = current_catalog()
+    if name not in catalog.sources:
+        types = ", ".join(sorted(catalog.sources))
+        return jsonify({"error": f"Unknown type '{name}', expected one of: {types}"}), 400
+    chunk = request.args.get("chunk", type=int, default=STREAM_CHUNK)
+    chunk = min(max(chunk, 1), MAX_STREAM_CHUNK)
+
+    try:
+        store = catalog.store(name)
+    except Exception as e:
+        return error_response(e)
+    if store is None:
+        return jsonify({"error": f"Catalog '{name}' not found"}), 404
+
+    # The generator holds the store itself, so a hot reload mid-stream
+    # doesn't switch catalogs under it
+    response = Response(ndjson_chunks(store, chunk), mimetype="application/x-ndjson")
+    response.headers["X-Record-Count"] = str(len(store))
+    return response
+
+
+@app.route("/api/admin/catalog", methods=["GET"])
+def catalog_status():
+    if not is_admin():
+        return jsonify({"error": "Forbidden"}), 403
+    return jsonify(reload_status())
+
+
+@app.route("/api/admin/catalog/reload", methods=["POST"])
+def reload_catalog_route():
+    """Rebuild the catalog in the background (or inline with ?wait=1) and swap it in."""
+    if not is_admin():
+        return jsonify({"error": "Forbidden"}), 403
+    wait = request.args.get("wait") in ("1", "true")
+    try:
+        started = request_reload(DATA_ROOT, wait=wait)
+    except Exception as e:
+        return jsonify({"error": str(e), **reload_status()}), 500
+    if not started:
+        return jsonify({"error": "Reload already in progress", **reload_status()}), 409
+    return jsonify(reload_status()), 200 if wait else 202
+
+
+def collect_caches():
+    """Hit / miss counters the caches keep themselves, read at scrape time."""
+    caches = {"deck_eval": deck_cache_stats(), "user_store": USER_STORE.cache_stats()}
+    caches = {name: stats for name, stats in caches.items() if stats is not None}
+    opens = store_open_stats()
+    return [
+        (
+            "cache_requests_total",
+            "counter",
+            "Cache lookups by result",
+            [
+                ({"cache": name, "result": result}, stats[key])
+                for name, stats in caches.items()
+                for result, key in (("hit", "hits"), ("miss", "misses"))
+            ]
+            + [({"cache": "catalog_store", "result": r}, n) for r, n in opens.items()],
+        ),
+        (
+            "cache_entries",
+            "gauge",
+            "Entries held by each cache",
+            [({"cache": name}, stats["size"]) for name, stats in caches.items()],
+        ),
+    ]
+
+
+def collect_catalog():
+    status = reload_status()
+    families = [
+        (
+            "catalog_generation",
+            "gauge",
+            "Catalog generation being served (bumped by each hot reload)",
+            [({}, status["generation"] or 0)],
+        )
+    ]
+    if status["version"]:
+        families.append(
+            (
+                "catalog_info",
+                "gauge",
+                "Catalog version being served",
+                [({"version": status["version"]}, 1)],
+            )
+        )
+    return families
+
+
+metrics.REGISTRY.add_collector(collect_caches)
+metrics.REGISTRY.add_collector(collect_catalog)
+
+
+@app.route("/metrics", methods=["GET"])
+# Deployments that only route /api/* to the app (vercel.json) scrape it here
+@app.route("/api/metrics", methods=["GET"])
+def metrics_endpoint():
+    """Prometheus text exposition of this process's metrics."""
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
 
 
 # --- Serve Frontend ---
@@ -211,6 +929,8 @@ def serve_static(path):
 
 
 if __name__ == "__main__":
-    if not os.path.exists(USER_DATA_DIR):
-        os.makedirs(USER_DATA_DIR)
+    ALLOW_LOCAL_ADMIN = True
+    # The debug reloader runs this file twice; only watch in the serving child
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        watch_catalog(DATA_ROOT, interval=float(os.environ.get("CATALOG_WATCH_INTERVAL", 2.0)))
     app.run(debug=True, port=5001)  # Using a different port to avoid conflicts
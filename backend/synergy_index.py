@@ -0,0 +1,409 @@
+"""
+Tag co-occurrence index for deck building.
+
+Cards carry ``synergy_tags``.  This module dictionary-encodes those tags and
+builds, once per catalog version:
+
+- card -> tags postings and the transposed tag -> cards postings, both as CSR
+  arrays (``indptr`` / ``indices``);
+- a sparse, symmetric tag x tag co-occurrence matrix (also CSR) with the pair
+  support, lift and PMI of every tag pair that appears together on a card.
+
+The arrays are saved as one ``.npz`` build artifact next to the card stores, so
+the API answers "which tags go with X" and "which cards best fit this partial
+deck" with a few array lookups instead of rescanning the catalog.
+
+Run directly to (re)build an artifact and print the strongest pairs:
+
+    python backend/synergy_index.py --input data/anime/all_cards.json
+"""
+
+import argparse
+import logging
+import os
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from atomic_file import AtomicFile
+
+
+TAG_FIELD = "synergy_tags"
+# Pairs are generated in blocks of cards to bound peak memory on large catalogs
+PAIR_BLOCK_ROWS = 20000
+METRICS = ("lift", "pmi", "count")
+
+
+def _csr_transpose(indptr: np.ndarray, indices: np.ndarray, n_cols: int):
+    """Transpose a CSR pattern; rows of the result are sorted by original row."""
+    rows = np.repeat(np.arange(len(indptr) - 1, dtype=np.int32), np.diff(indptr))
+    order = np.argsort(indices, kind="stable")
+    t_indptr = np.zeros(n_cols + 1, dtype=np.int64)
+    np.cumsum(np.bincount(indices, minlength=n_cols), out=t_indptr[1:])
+    return t_indptr, rows[order]
+
+
+def _block_pairs(indptr: np.ndarray, indices: np.ndarray, n_tags: int) -> tuple:
+    """Count ordered tag pairs (a != b) over the rows of one CSR block."""
+    lengths = np.diff(indptr)
+    # Position p in a row of length L pairs with the L-1-(p-start) positions after it
+    row_end = np.repeat(indptr[1:], lengths)
+    later = row_end - np.arange(indptr[0], indptr[-1]) - 1
+    total = int(later.sum())
+    if total == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    left = np.repeat(np.arange(indptr[0], indptr[-1]), later)
+    step = np.arange(total) - np.repeat(np.cumsum(later) - later, later) + 1
+    a = indices[left - indptr[0]].astype(np.int64)
+    b = indices[left - indptr[0] + step].astype(np.int64)
+    keys = np.concatenate((a * n_tags + b, b * n_tags + a))
+    return np.unique(keys, return_counts=True)
+
+
+class SynergyIndex:
+    """Dictionary-encoded tag postings plus tag-pair statistics."""
+
+    def __init__(
+        self,
+        tags: Sequence[str],
+        card_ids: np.ndarray,
+        card_indptr: np.ndarray,
+        card_tags: np.ndarray,
+        pair_indptr: np.ndarray,
+        pair_tags: np.ndarray,
+        pair_counts: np.ndarray,
+        signature: str = "",
+    ):
+        self.tags = list(tags)
+        self.tag_code = {tag: code for code, tag in enumerate(self.tags)}
+        self.card_ids = card_ids
+        self.card_row = {int(card_id): row for row, card_id in enumerate(card_ids.tolist())}
+        self.card_indptr = card_indptr
+        self.card_tags = card_tags
+        self.tag_indptr, self.tag_cards = _csr_transpose(
+            card_indptr, card_tags, len(self.tags)
+        )
+        self.tag_counts = np.diff(self.tag_indptr)
+        self.pair_indptr = pair_indptr
+        self.pair_tags = pair_tags
+        self.pair_counts = pair_counts
+        self.signature = signature
+
+        # lift(a, b) = P(a, b) / (P(a) P(b)); PMI = log2(lift)
+        n = max(len(card_ids), 1)
+        pair_rows = np.repeat(
+            np.arange(len(self.tags), dtype=np.int64), np.diff(pair_indptr)
+        )
+        expected = self.tag_counts[pair_rows] * self.tag_counts[pair_tags].astype(np.float64)
+        self.pair_lift = pair_counts * n / np.maximum(expected, 1)
+        self.pair_pmi = np.log2(np.maximum(self.pair_lift, 1e-12))
+        # Tags on nearly every card (e.g. "TV") say little about a deck
+        self.tag_idf = np.log((n + 1) / (self.tag_counts + 1))
+
+    # --- construction / persistence ---
+
+    @classmethod
+    def build(
+        cls, cards: Iterable[dict], tag_field: str = TAG_FIELD, signature: str = ""
+    ) -> "SynergyIndex":
+        card_ids: List[int] = []
+        card_tag_lists: List[List[str]] = []
+        frequency: Dict[str, int] = {}
+        for card in cards:
+            if card.get("id") is None:
+                continue
+            tags = list(dict.fromkeys(card.get(tag_field) or []))
+            card_ids.append(int(card["id"]))
+            card_tag_lists.append(tags)
+            for tag in tags:
+                frequency[tag] = frequency.get(tag, 0) + 1
+
+        # Codes by descending frequency, so the common tags get the small codes
+        tags = sorted(frequency, key=lambda t: (-frequency[t], t))
+        code = {tag: i for i, tag in enumerate(tags)}
+        lengths = np.fromiter(
+            (len(t) for t in card_tag_lists), dtype=np.int64, count=len(card_tag_lists)
+        )
+        card_indptr = np.zeros(len(card_tag_lists) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=card_indptr[1:])
+        card_tags = np.fromiter(
+            (code[tag] for row in card_tag_lists for tag in sorted(row, key=code.get)),
+            dtype=np.int32,
+            count=int(card_indptr[-1]),
+        )
+
+        pair_indptr, pair_tags, pair_counts = cls._cooccurrence(
+            card_indptr, card_tags, len(tags)
+        )
+        return cls(
+            tags,
+            np.array(card_ids, dtype=np.int64),
+            card_indptr,
+            card_tags,
+            pair_indptr,
+            pair_tags,
+            pair_counts,
+            signature,
+        )
+
+    @staticmethod
+    def _cooccurrence(card_indptr: np.ndarray, card_tags: np.ndarray, n_tags: int):
+        keys_parts, count_parts = [], []
+        for start in range(0, len(card_indptr) - 1, PAIR_BLOCK_ROWS):
+            block = card_indptr[start : start + PAIR_BLOCK_ROWS + 1]
+            keys, counts = _block_pairs(
+                block, card_tags[block[0] : block[-1]], n_tags
+            )
+            keys_parts.append(keys)
+            count_parts.append(counts)
+
+        keys = np.concatenate(keys_parts) if keys_parts else np.zeros(0, dtype=np.int64)
+        counts = np.concatenate(count_parts) if count_parts else np.zeros(0, dtype=np.int64)
+        if len(keys_parts) > 1:
+            order = np.argsort(keys, kind="stable")
+            keys, counts = keys[order], counts[order]
+            starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+            keys, counts = keys[starts], np.add.reduceat(counts, starts)
+
+        rows = keys // max(n_tags, 1)
+        pair_indptr = np.zeros(n_tags + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n_tags), out=pair_indptr[1:])
+        return pair_indptr, (keys % max(n_tags, 1)).astype(np.int32), counts.astype(np.int64)
+
+    def save(self, path: str):
+        """Write the artifact atomically (temp file + rename)."""
+        with AtomicFile(path, suffix=".npz") as f:
+            np.savez(
+                f,
+                tags=np.array(self.tags, dtype=str),
+                card_ids=self.card_ids,
+                card_indptr=self.card_indptr,
+                card_tags=self.card_tags,
+                pair_indptr=self.pair_indptr,
+                pair_tags=self.pair_tags,
+                pair_counts=self.pair_counts,
+                signature=np.array(self.signature),
+            )
+
+    @classmethod
+    def load(cls, path: str) -> "SynergyIndex":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                data["tags"].tolist(),
+                data["card_ids"],
+                data["card_indptr"],
+                data["card_tags"],
+                data["pair_indptr"],
+                data["pair_tags"],
+                data["pair_counts"],
+                str(data["signature"]),
+            )
+
+    # --- queries ---
+
+    def __len__(self) -> int:
+        return len(self.card_ids)
+
+    def tag_count(self, tag: str) -> int:
+        code = self.tag_code.get(tag)
+        return 0 if code is None else int(self.tag_counts[code])
+
+    def top_tags(self, limit: int = 20) -> List[dict]:
+        return [
+            {"tag": tag, "count": int(count)}
+            for tag, count in zip(self.tags[:limit], self.tag_counts[:limit].tolist())
+        ]
+
+    def partners(
+        self, tag: str, limit: int = 10, metric: str = "lift", min_support: int = 2
+    ) -> List[dict]:
+        """Tags that co-occur with ``tag``, strongest first."""
+        code = self.tag_code.get(tag)
+        if code is None:
+            return []
+        lo, hi = self.pair_indptr[code], self.pair_indptr[code + 1]
+        others = self.pair_tags[lo:hi]
+        counts = self.pair_counts[lo:hi]
+        lift = self.pair_lift[lo:hi]
+        pmi = self.pair_pmi[lo:hi]
+        keep = counts >= min_support
+        key = {"lift": lift, "pmi": pmi, "count": counts}[metric]
+        order = np.flatnonzero(keep)[np.lexsort((-counts[keep], -key[keep]))][:limit]
+        return [
+            {
+                "tag": self.tags[others[i]],
+                "count": int(counts[i]),
+                "lift": round(float(lift[i]), 4),
+                "pmi": round(float(pmi[i]), 4),
+            }
+            for i in order.tolist()
+        ]
+
+    def cards_with(self, tags: Sequence[str]) -> List[int]:
+        """Ids of the cards that carry every tag in ``tags`` (postings intersection)."""
+        codes = [self.tag_code.get(tag) for tag in tags]
+        if not codes or None in codes:
+            return []
+        codes.sort(key=lambda c: self.tag_counts[c])
+        rows = self.tag_cards[self.tag_indptr[codes[0]] : self.tag_indptr[codes[0] + 1]]
+        for c in codes[1:]:
+            rows = np.intersect1d(
+                rows, self.tag_cards[self.tag_indptr[c] : self.tag_indptr[c + 1]],
+                assume_unique=True,
+            )
+        return self.card_ids[np.sort(rows)].tolist()
+
+    def _deck_tags(self, deck_rows: np.ndarray) -> np.ndarray:
+        return self.card_tags[
+            np.concatenate(
+                [np.arange(self.card_indptr[r], self.card_indptr[r + 1]) for r in deck_rows]
+            )
+        ]
+
+    def _deck_affinity(self, deck_tags: np.ndarray) -> np.ndarray:
+        """Per-tag affinity of a deck: IDF-weighted shared tags + positive PMI partners."""
+        n_tags = len(self.tags)
+        profile = np.bincount(deck_tags, minlength=n_tags).astype(np.float64)
+
+        affinity = profile * self.tag_idf
+        # Sparse mat-vec over the co-occurrence CSR: affinity[b] += ppmi(a, b) * profile[a]
+        pair_rows = np.repeat(np.arange(n_tags), np.diff(self.pair_indptr))
+        weight = np.maximum(self.pair_pmi, 0) * profile[pair_rows]
+        affinity += np.bincount(self.pair_tags, weights=weight, minlength=n_tags)
+        return affinity
+
+    def deck_synergy(self, deck_ids: Sequence[int], top: int = 5) -> dict:
+        """
+        How well a deck's cards fit each other.  Each card is scored against
+        the affinity of the *other* cards (affinity is linear in the tag
+        profile, so that is the deck affinity minus the card's own), damped by
+        sqrt(tag count) as in ``suggest``; ``score`` is the mean per partner.
+        """
+        deck_rows = np.array(
+            [self.card_row[i] for i in deck_ids if i in self.card_row], dtype=np.int64
+        )
+        deck_tags = self._deck_tags(deck_rows) if len(deck_rows) else np.empty(0, np.int32)
+        counts = np.bincount(deck_tags, minlength=len(self.tags))
+        shared = np.flatnonzero(counts >= 2)
+        weight = counts[shared] * self.tag_idf[shared]
+        core = shared[np.lexsort((shared, -weight))][:top]
+        core_tags = [{"tag": self.tags[c], "count": int(counts[c])} for c in core.tolist()]
+        if len(deck_rows) < 2:
+            return {"score": 0.0, "core_tags": core_tags}
+
+        affinity = self._deck_affinity(deck_tags)
+        total = 0.0
+        for row in deck_rows.tolist():
+            own = self.card_tags[self.card_indptr[row] : self.card_indptr[row + 1]]
+            if len(own) == 0:
+                continue
+            rest = affinity[own] - self._deck_affinity(own)[own]
+            total += float(rest.sum()) / np.sqrt(len(own))
+        score = total / len(deck_rows) / (len(deck_rows) - 1)
+        return {"score": round(score, 4), "core_tags": core_tags}
+
+    def suggest(self, deck_ids: Sequence[int], limit: int = 10) -> List[dict]:
+        """Cards (not already in the deck) whose tags best complement the deck."""
+        deck_rows = np.array(
+            [self.card_row[i] for i in deck_ids if i in self.card_row], dtype=np.int64
+        )
+        if len(deck_rows) == 0:
+            return []
+        deck_tags = self._deck_tags(deck_rows)
+        affinity = self._deck_affinity(deck_tags)
+
+        # Card score = affinities of its tags (CSR row sums), damped by sqrt(tag
+        # count) so cards are not ranked up just for carrying many tags
+        card_rows = np.repeat(np.arange(len(self.card_ids)), np.diff(self.card_indptr))
+        scores = np.bincount(
+            card_rows, weights=affinity[self.card_tags], minlength=len(self.card_ids)
+        ) / np.sqrt(np.maximum(np.diff(self.card_indptr), 1))
+        scores[deck_rows] = -np.inf
+
+        limit = min(limit, len(scores) - len(np.unique(deck_rows)))
+        if limit <= 0:
+            return []
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.lexsort((top, -scores[top]))]
+
+        deck_tag_set = set(deck_tags.tolist())
+        results = []
+        for row in top.tolist():
+            codes = self.card_tags[self.card_indptr[row] : self.card_indptr[row + 1]].tolist()
+            results.append(
+                {
+                    "id": int(self.card_ids[row]),
+                    "score": round(float(scores[row]), 4),
+                    "shared_tags": [self.tags[c] for c in codes if c in deck_tag_set],
+                    "tags": [self.tags[c] for c in codes],
+                }
+            )
+        return results
+
+
+def open_index(source, cache_dir: str) -> Optional[SynergyIndex]:
+    """
+    Load the synergy artifact for a catalog source, rebuilding it when the
+    source changed since it was built.  Returns None when the source is missing.
+    """
+    signature = source.signature()
+    if signature is None:
+        return None
+
+    path = os.path.join(cache_dir, f"{source.name}.synergy.npz")
+    if os.path.exists(path):
+        try:
+            index = SynergyIndex.load(path)
+            if index.signature == signature:
+                return index
+        except (OSError, ValueError, KeyError):
+            pass
+
+    index = SynergyIndex.build(source.records(), signature=signature)
+    index.save(path)
+    logging.info(
+        f"Built synergy index for {len(index)} {source.name} cards "
+        f"({len(index.tags)} tags) into {path}"
+    )
+    return index
+
+
+def main():
+    from json_stream import iter_records
+
+    parser = argparse.ArgumentParser(description="Build the tag co-occurrence synergy index")
+    parser.add_argument(
+        "-i", "--input", default="data/anime/all_cards.json", help="Card catalog JSON"
+    )
+    parser.add_argument(
+        "-o", "--output", default=None, help="Artifact path (default: <input>.synergy.npz)"
+    )
+    parser.add_argument("-n", "--top", type=int, default=20, help="Pairs to print")
+    parser.add_argument("--metric", choices=METRICS, default="lift")
+    parser.add_argument("--min-support", type=int, default=5)
+    args = parser.parse_args()
+
+    index = SynergyIndex.build(iter_records(args.input))
+    output = args.output or os.path.splitext(args.input)[0] + ".synergy.npz"
+    index.save(output)
+    print(f"Indexed {len(index)} cards, {len(index.tags)} tags -> {output}")
+
+    pairs = []
+    for tag in index.tags:
+        for partner in index.partners(
+            tag, limit=len(index.tags), metric=args.metric, min_support=args.min_support
+        ):
+            if index.tag_code[tag] < index.tag_code[partner["tag"]]:
+                pairs.append((tag, partner))
+    pairs.sort(key=lambda p: (-p[1][args.metric], -p[1]["count"]))
+    print(f"--- Top {args.top} tag pairs by {args.metric} (support >= {args.min_support}) ---")
+    for tag, partner in pairs[: args.top]:
+        print(
+            f"{tag} + {partner['tag']}: count={partner['count']} "
+            f"lift={partner['lift']:.2f} pmi={partner['pmi']:.2f}"
+        )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
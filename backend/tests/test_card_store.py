@@ -0,0 +1,72 @@
+import json
+
+import pytest
+
+from card_store import CardStore, CardStoreError, build_store, json_array
+
+RECORDS = [
+    {"id": card_id, "name": f"Card {card_id}", "rating": card_id / 10, "tags": ["a", "名"]}
+    for card_id in range(7, 7 * 40, 7)
+]
+
+
+@pytest.fixture
+def store(tmp_path):
+    path = tmp_path / "cards.cards"
+    count = build_store(
+        iter(RECORDS), str(path), {"id": "int", "rating": "float"}, ["name"], {"source": "test"}
+    )
+    assert count == len(RECORDS)
+    store = CardStore(str(path))
+    yield store
+    store.close()
+
+
+def test_round_trip(store):
+    assert len(store) == len(RECORDS)
+    assert store.meta == {"source": "test"}
+    for record, expected in zip(store, RECORDS):
+        assert record.id == expected["id"]
+        assert record.name == expected["name"]
+        assert record.rating == pytest.approx(expected["rating"])
+        assert record.to_dict() == expected
+    assert json.loads(json_array(store)) == RECORDS
+
+
+def test_get_by_id(store):
+    for expected in RECORDS:
+        assert store.get(expected["id"]).to_dict() == expected
+        assert expected["id"] in store
+
+
+@pytest.mark.parametrize("card_id", [0, 1, 8, 13, 7 * 40, 10**9, -7])
+def test_get_miss(store, card_id):
+    assert store.get(card_id) is None
+    assert card_id not in store
+
+
+def test_first_duplicate_id_wins(tmp_path):
+    path = str(tmp_path / "dupes.cards")
+    build_store([{"id": 1, "name": "first"}, {"id": 1, "name": "second"}], path, {"id": "int"})
+    store = CardStore(path)
+    assert len(store) == 2
+    assert store.get(1).to_dict()["name"] == "first"
+    store.close()
+
+
+def test_empty_store(tmp_path):
+    path = str(tmp_path / "empty.cards")
+    assert build_store([], path, {"id": "int"}) == 0
+    store = CardStore(path)
+    assert len(store) == 0
+    assert store.get(1) is None
+    store.close()
+
+
+def test_rejects_foreign_file(tmp_path):
+    path = tmp_path / "not.cards"
+    path.write_bytes(b"not a card store at all" * 4)
+    with pytest.raises(CardStoreError):
+        CardStore(str(path))
+    with pytest.raises(CardStoreError):
+        CardStore(str(tmp_path / "missing.cards"))
@@ -0,0 +1,36 @@
+import random
+
+import pytest
+
+from json_stream import sorted_records
+
+RECORDS = [
+    {"id": i, "score": random.Random(i).randint(0, 9), "name": f"卡牌 {i}\n "}
+    for i in range(500)
+]
+
+
+@pytest.mark.parametrize("reverse", [False, True])
+def test_sorted_records_matches_sorted(reverse):
+    key = lambda record: record["score"]  # noqa: E731
+    result = list(sorted_records(iter(RECORDS), key, reverse))
+    assert result == sorted(RECORDS, key=key, reverse=reverse)
+
+
+@pytest.mark.parametrize("reverse", [False, True])
+def test_sorted_records_is_stable(reverse):
+    result = list(sorted_records(RECORDS, lambda record: record["score"], reverse))
+    for a, b in zip(result, result[1:]):
+        if a["score"] == b["score"]:
+            assert a["id"] < b["id"]
+
+
+def test_sorted_records_spills_on_call():
+    source = iter(RECORDS)
+    result = sorted_records(source, lambda record: -record["id"])
+    assert next(source, None) is None
+    assert [record["id"] for record in result] == list(range(499, -1, -1))
+
+
+def test_sorted_records_empty():
+    assert list(sorted_records([], lambda record: record)) == []
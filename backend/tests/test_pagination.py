@@ -0,0 +1,42 @@
+import base64
+import json
+
+import pytest
+
+from pagination import Cursor, CursorError, decode_cursor, encode_cursor
+
+
+def raw_token(payload: bytes) -> str:
+    return base64.urlsafe_b64encode(payload).rstrip(b"=").decode("ascii")
+
+
+def test_round_trip():
+    cursor = Cursor("anime", "-rating_score", 8.5, 326, "1eef49c8e3cb")
+    assert decode_cursor(encode_cursor(cursor), "anime") == cursor
+
+
+def test_rejects_foreign_scope():
+    token = encode_cursor(Cursor("characters", "id", 1, 1, None))
+    with pytest.raises(CursorError, match="characters"):
+        decode_cursor(token, "anime")
+
+
+@pytest.mark.parametrize(
+    "token",
+    [
+        "",
+        "not base64!",
+        "é",
+        raw_token(b"not json"),
+        raw_token(b"{}"),
+        raw_token(b"5"),
+        raw_token(json.dumps(["anime", "id", 1]).encode()),
+        raw_token(json.dumps(["anime", "id", 1, 2, None, "extra"]).encode()),
+        raw_token(json.dumps(["anime", "id", 1, "2", None]).encode()),
+        raw_token(json.dumps(["anime", "id", "1", 2, None]).encode()),
+        raw_token(json.dumps(["anime", "id", None, 2, None]).encode()),
+    ],
+)
+def test_rejects_malformed(token):
+    with pytest.raises(CursorError):
+        decode_cursor(token, "anime")
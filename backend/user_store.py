@@ -0,0 +1,540 @@
+"""
+Key-value storage for per-user state (saves, collections), shared by the
+Flask server and the serverless entry point (``api/index.py``).
+
+Values are JSON documents stored under a key (the username).  Every stored
+value carries an opaque revision string, so read-modify-write callers can
+make their write conditional on what they read:
+
+    entry = store.get(key)                      # Entry(value, revision) or None
+    store.put(key, value, revision=entry.revision)   # RevisionConflict if stale
+    store.put(key, value, revision=ABSENT)      # only if the key doesn't exist
+    store.patch(key, {"gold": 10})              # shallow merge, retried on conflict
+    store.get_many(keys) / store.put_many(items)    # one round trip where supported
+
+Backends, picked by ``open_user_store(url)``:
+
+- a directory path: ``FileUserStore``, one ``<key>.json`` per user in the
+  format ``data/user_data`` already uses; the revision comes from the file's
+  inode and mtime (every write renames a new file into place);
+- ``memory://``: ``MemoryUserStore``, for tests and the local stand-in;
+- ``http(s)://...``: ``HttpUserStore``, a remote KV service speaking a small
+  HTTP protocol (``GET``/``PUT /kv/<key>`` with ``ETag``/``If-Match``,
+  ``POST /kv/_batch``).  ``kv_server.py`` implements it locally.  Requests go
+  over per-thread keep-alive connections and sit behind a ``CachedUserStore``
+  read cache, so a read is usually free and a write costs one round trip.
+
+``open_user_store`` wraps the result in ``MeteredUserStore``, which times
+every call (``user_store_operation_seconds``, see ``metrics.py``).
+"""
+
+import json
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, NamedTuple, Optional, Tuple
+
+import metrics
+
+# Revision meaning "the key must not exist yet"
+ABSENT = "0"
+# A patch without a revision retries its merge on conflict for up to
+# PATCH_TIMEOUT seconds, sleeping a random time up to a delay that doubles
+# from PATCH_BACKOFF to PATCH_BACKOFF_MAX between attempts
+PATCH_TIMEOUT = 5.0
+PATCH_BACKOFF = 0.005
+PATCH_BACKOFF_MAX = 0.2
+DEFAULT_CACHE_SIZE = 256
+DEFAULT_CACHE_TTL = 5.0
+
+_OPERATION_SECONDS = metrics.histogram(
+    "user_store_operation_seconds",
+    "Time spent in user-store calls; put / put_many / patch are the writes to the backend",
+    ("backend", "op"),
+)
+_CONFLICTS = metrics.counter(
+    "user_store_conflicts_total", "Conditional writes rejected as stale", ("backend",)
+)
+
+
+class UserStoreError(Exception):
+    """Raised when a backend can't be reached or returns something unexpected."""
+
+
+class RevisionConflict(UserStoreError):
+    """A conditional write lost: the stored revision isn't the expected one."""
+
+    def __init__(self, key: str, revision: Optional[str]):
+        super().__init__(f"Revision conflict on {key!r} (current: {revision})")
+        self.key = key
+        self.revision = revision
+
+
+class Entry(NamedTuple):
+    value: Any
+    revision: str
+
+
+def check_key(key: str) -> str:
+    if not key or key.startswith(".") or "/" in key or "\\" in key:
+        raise ValueError(f"Invalid key: {key!r}")
+    return key
+
+
+def _expected(revision: str) -> Optional[str]:
+    return None if revision == ABSENT else revision
+
+
+class UserStore:
+    """
+    Interface of a user-state backend.  Subclasses implement ``get`` and
+    ``put``; batching and ``patch`` have generic fallbacks.
+    """
+
+    def get(self, key: str) -> Optional[Entry]:
+        raise NotImplementedError
+
+    def put(self, key: str, value: Any, revision: Optional[str] = None) -> str:
+        """
+        Store ``value`` and return its new revision.  With ``revision`` the
+        write only happens if the stored revision matches (``ABSENT``: no
+        value yet); otherwise ``RevisionConflict`` is raised.
+        """
+        raise NotImplementedError
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Entry]:
+        entries = {}
+        for key in keys:
+            entry = self.get(key)
+            if entry is not None:
+                entries[key] = entry
+        return entries
+
+    def put_many(
+        self, items: Iterable[Tuple[str, Any, Optional[str]]]
+    ) -> Dict[str, Optional[str]]:
+        """
+        Apply several ``(key, value, revision)`` writes.  Each one is checked
+        on its own (the batch isn't atomic); conflicting keys map to None.
+        """
+        results = {}
+        for key, value, revision in items:
+            try:
+                results[key] = self.put(key, value, revision)
+            except RevisionConflict:
+                results[key] = None
+        return results
+
+    def patch(self, key: str, changes: Dict[str, Any], revision: Optional[str] = None) -> Entry:
+        """
+        Shallow-merge ``changes`` into the stored dict (a None value deletes
+        the field).  With ``revision`` a stale read raises RevisionConflict;
+        without, the merge is re-read and retried with jittered backoff, so
+        concurrent patches of one key all land; RevisionConflict is raised
+        only if that still fails after ``PATCH_TIMEOUT`` seconds.
+        """
+        deadline = time.monotonic() + PATCH_TIMEOUT
+        delay = PATCH_BACKOFF
+        while True:
+            entry = self.get(key)
+            current = entry.revision if entry else ABSENT
+            if revision is not None and current != revision:
+                raise RevisionConflict(key, entry.revision if entry else None)
+            value = dict(entry.value) if entry and isinstance(entry.value, dict) else {}
+            for field, field_value in changes.items():
+                if field_value is None:
+                    value.pop(field, None)
+                else:
+                    value[field] = field_value
+            try:
+                return Entry(value, self.put(key, value, current))
+            except RevisionConflict:
+                if revision is not None or time.monotonic() >= deadline:
+                    raise
+            time.sleep(random.uniform(0, delay))
+            delay = min(delay * 2, PATCH_BACKOFF_MAX)
+
+    def cache_stats(self) -> Optional[dict]:
+        """Size / hits / misses of a read cache in front of the backend, if any."""
+        return None
+
+    def close(self):
+        pass
+
+
+class FileUserStore(UserStore):
+    """One JSON file per key; writes are atomic and serialized by a lock file."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{check_key(key)}.json")
+
+    @staticmethod
+    def _revision(st: os.stat_result) -> str:
+        return f"{st.st_ino:x}-{st.st_mtime_ns:x}"
+
+    def _read(self, key: str) -> Tuple[Optional[bytes], Optional[str]]:
+        """Contents and revision of one file, read from the same open file."""
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read(), self._revision(os.fstat(f.fileno()))
+        except FileNotFoundError:
+            return None, None
+
+    @contextmanager
+    def _locked(self):
+        # The lock file also serializes writers in other worker processes
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, ".lock"), "a") as lock_file:
+                try:
+                    import fcntl
+                except ImportError:  # Windows: the thread lock is all we get
+                    yield
+                    return
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def get(self, key: str) -> Optional[Entry]:
+        data, revision = self._read(key)
+        if data is None:
+            return None
+        return Entry(json.loads(data), revision)
+
+    def put(self, key: str, value: Any, revision: Optional[str] = None) -> str:
+        from atomic_file import AtomicFile
+
+        data = json.dumps(value, ensure_ascii=False, indent=4).encode("utf-8")
+        path = self._path(key)
+        with self._locked():
+            if revision is not None:
+                current = self._read(key)[1]
+                if current != _expected(revision):
+                    raise RevisionConflict(key, current)
+            with AtomicFile(path, suffix=".json") as f:
+                f.write(data)
+                f.flush()
+                new_revision = self._revision(os.fstat(f.fileno()))
+        return new_revision
+
+
+class MemoryUserStore(UserStore):
+    """In-process store; values are kept JSON-encoded so callers can't alias them."""
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[bytes, str]] = {}
+        self._counter = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Entry]:
+        stored = self._data.get(check_key(key))
+        if stored is None:
+            return None
+        return Entry(json.loads(stored[0]), stored[1])
+
+    def put(self, key: str, value: Any, revision: Optional[str] = None) -> str:
+        data = json.dumps(value, ensure_ascii=False).encode("utf-8")
+        with self._lock:
+            stored = self._data.get(check_key(key))
+            current = stored[1] if stored else None
+            if revision is not None and current != _expected(revision):
+                raise RevisionConflict(key, current)
+            self._counter += 1
+            new_revision = str(self._counter)
+            self._data[key] = (data, new_revision)
+        return new_revision
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class HttpUserStore(UserStore):
+    """
+    Client of a remote KV service.  Each thread keeps one keep-alive
+    connection; a request on a connection the server dropped is retried once.
+    """
+
+    def __init__(self, url: str, token: Optional[str] = None, timeout: float = 5.0):
+        from urllib.parse import urlsplit
+
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.netloc:
+            raise ValueError(f"Not an http(s) URL: {url!r}")
+        self.url = url
+        self._https = parts.scheme == "https"
+        self._netloc = parts.netloc
+        self._prefix = parts.path.rstrip("/")
+        self._headers = {"Content-Type": "application/json"}
+        if token:
+            self._headers["Authorization"] = f"Bearer {token}"
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            import http.client
+
+            cls = http.client.HTTPSConnection if self._https else http.client.HTTPConnection
+            conn = self._local.conn = cls(self._netloc, timeout=self.timeout)
+        return conn
+
+    def _request(self, method: str, path: str, body: Any = None, headers: Optional[dict] = None):
+        import http.client
+
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8") if body is not None else None
+        for attempt in range(2):
+            conn = self._connection()
+            try:
+                conn.request(
+                    method,
+                    self._prefix + path,
+                    body=data,
+                    headers={**self._headers, **(headers or {})},
+                )
+                response = conn.getresponse()
+                return response.status, response.getheader("ETag"), response.read()
+            except (http.client.HTTPException, OSError) as e:
+                conn.close()
+                self._local.conn = None
+                if attempt:
+                    raise UserStoreError(f"{method} {self.url}{path} failed: {e}") from e
+
+    @staticmethod
+    def _key_path(key: str) -> str:
+        from urllib.parse import quote
+
+        return "/kv/" + quote(check_key(key), safe="")
+
+    @staticmethod
+    def _error(status: int, data: bytes) -> UserStoreError:
+        return UserStoreError(f"KV service returned {status}: {data[:200]!r}")
+
+    def get(self, key: str) -> Optional[Entry]:
+        status, etag, data = self._request("GET", self._key_path(key))
+        if status == 404:
+            return None
+        if status != 200 or not etag:
+            raise self._error(status, data)
+        return Entry(json.loads(data), etag.strip('"'))
+
+    def put(self, key: str, value: Any, revision: Optional[str] = None) -> str:
+        headers = {}
+        if revision == ABSENT:
+            headers["If-None-Match"] = "*"
+        elif revision is not None:
+            headers["If-Match"] = f'"{revision}"'
+        status, _, data = self._request("PUT", self._key_path(key), value, headers)
+        if status == 412:
+            raise RevisionConflict(key, json.loads(data).get("revision"))
+        if status not in (200, 201):
+            raise self._error(status, data)
+        return json.loads(data)["revision"]
+
+    def _batch(self, body: dict) -> dict:
+        status, _, data = self._request("POST", "/kv/_batch", body)
+        if status != 200:
+            raise self._error(status, data)
+        return json.loads(data)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Entry]:
+        keys = [check_key(key) for key in keys]
+        if not keys:
+            return {}
+        found = self._batch({"get": keys})["get"]
+        return {key: Entry(item["value"], item["revision"]) for key, item in found.items()}
+
+    def put_many(
+        self, items: Iterable[Tuple[str, Any, Optional[str]]]
+    ) -> Dict[str, Optional[str]]:
+        puts = [
+            {"key": check_key(key), "value": value, "revision": revision}
+            for key, value, revision in items
+        ]
+        if not puts:
+            return {}
+        results = self._batch({"put": puts})["put"]
+        return {
+            key: None if result.get("conflict") else result["revision"]
+            for key, result in results.items()
+        }
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class CachedUserStore(UserStore):
+    """
+    A small LRU read cache with a TTL in front of another store.  Writes go
+    through and refresh the cache; a conflict evicts the key.  Reads may be
+    up to ``ttl`` seconds stale across instances, but conditional writes are
+    still checked by the backend, so a stale revision only costs a retry.
+    Cached values are shared: treat what ``get`` returns as read-only.
+    """
+
+    def __init__(
+        self, backend: UserStore, size: int = DEFAULT_CACHE_SIZE, ttl: float = DEFAULT_CACHE_TTL
+    ):
+        self.backend = backend
+        self.size = size
+        self.ttl = ttl
+        self._cache: "OrderedDict[str, Tuple[float, Optional[Entry]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, key: str):
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None and time.monotonic() - cached[0] < self.ttl:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return True, cached[1]
+            self.misses += 1
+            return False, None
+
+    def _remember(self, key: str, entry: Optional[Entry]):
+        with self._lock:
+            self._cache[key] = (time.monotonic(), entry)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.size:
+                self._cache.popitem(last=False)
+
+    def _forget(self, key: str):
+        with self._lock:
+            self._cache.pop(key, None)
+
+    def get(self, key: str) -> Optional[Entry]:
+        found, entry = self._lookup(key)
+        if not found:
+            entry = self.backend.get(key)
+            self._remember(key, entry)
+        return entry
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Entry]:
+        entries, missing = {}, []
+        for key in keys:
+            found, entry = self._lookup(key)
+            if not found:
+                missing.append(key)
+            elif entry is not None:
+                entries[key] = entry
+        if missing:
+            fetched = self.backend.get_many(missing)
+            for key in missing:
+                self._remember(key, fetched.get(key))
+            entries.update(fetched)
+        return entries
+
+    def put(self, key: str, value: Any, revision: Optional[str] = None) -> str:
+        try:
+            new_revision = self.backend.put(key, value, revision)
+        except RevisionConflict:
+            self._forget(key)
+            raise
+        self._remember(key, Entry(value, new_revision))
+        return new_revision
+
+    def patch(self, key: str, changes: Dict[str, Any], revision: Optional[str] = None) -> Entry:
+        try:
+            return super().patch(key, changes, revision)
+        except RevisionConflict:
+            # The conflict may come from a stale cached read; drop it so the
+            # check (and the client's retry) sees the backend's revision
+            self._forget(key)
+            if revision is None:
+                raise
+        return super().patch(key, changes, revision)
+
+    def put_many(
+        self, items: Iterable[Tuple[str, Any, Optional[str]]]
+    ) -> Dict[str, Optional[str]]:
+        items = list(items)
+        results = self.backend.put_many(items)
+        for key, value, _ in items:
+            if results.get(key) is None:
+                self._forget(key)
+            else:
+                self._remember(key, Entry(value, results[key]))
+        return results
+
+    def cache_stats(self) -> Optional[dict]:
+        return {"size": len(self._cache), "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        self.backend.close()
+
+
+class MeteredUserStore(UserStore):
+    """Times every call into another store and counts its revision conflicts."""
+
+    def __init__(self, backend: UserStore, kind: str):
+        self.backend = backend
+        self.kind = kind
+
+    def _timed(self, op: str, call, *args):
+        start = time.perf_counter()
+        try:
+            return call(*args)
+        except RevisionConflict:
+            _CONFLICTS.labels(self.kind).inc()
+            raise
+        finally:
+            _OPERATION_SECONDS.labels(self.kind, op).observe(time.perf_counter() - start)
+
+    def get(self, key: str) -> Optional[Entry]:
+        return self._timed("get", self.backend.get, key)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Entry]:
+        return self._timed("get_many", self.backend.get_many, keys)
+
+    def put(self, key: str, value: Any, revision: Optional[str] = None) -> str:
+        return self._timed("put", self.backend.put, key, value, revision)
+
+    def put_many(
+        self, items: Iterable[Tuple[str, Any, Optional[str]]]
+    ) -> Dict[str, Optional[str]]:
+        return self._timed("put_many", self.backend.put_many, items)
+
+    def patch(self, key: str, changes: Dict[str, Any], revision: Optional[str] = None) -> Entry:
+        return self._timed("patch", self.backend.patch, key, changes, revision)
+
+    def cache_stats(self) -> Optional[dict]:
+        return self.backend.cache_stats()
+
+    def close(self):
+        self.backend.close()
+
+
+def open_user_store(
+    url: str,
+    token: Optional[str] = None,
+    cache_size: int = DEFAULT_CACHE_SIZE,
+    cache_ttl: float = DEFAULT_CACHE_TTL,
+) -> UserStore:
+    """
+    Open the backend ``url`` names: ``http(s)://`` (cached remote KV),
+    ``memory://``, or a directory path (``file://`` optional).
+    """
+    if url.startswith(("http://", "https://")):
+        store = HttpUserStore(url, token=token or os.environ.get("USER_STORE_TOKEN"))
+        if cache_size > 0:
+            store = CachedUserStore(store, cache_size, cache_ttl)
+        return MeteredUserStore(store, "http")
+    if url == "memory://":
+        return MeteredUserStore(MemoryUserStore(), "memory")
+    if url.startswith("file://"):
+        url = url[len("file://"):]
+    return MeteredUserStore(FileUserStore(url), "file")
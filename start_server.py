@@ -3,19 +3,34 @@
 启动服务器脚本 - 动漫卡牌游戏（含角色卡系统）
 
 使用方法：
-python start_server.py
+python start_server.py                          # 开发模式（Flask 调试服务器，自动重载）
+python start_server.py --prod -w 4 -t 8         # 生产模式（预加载卡牌目录后 fork 多个工作进程）
 
 或者直接运行：
 ./start_server.py
+
+生产模式下向主进程发送 SIGHUP 可平滑重载（重新加载卡牌目录并替换工作进程），
+SIGTERM 平滑停止，详见 backend/prefork.py。
 """
 
+import argparse
 import os
+import signal
 import sys
 import subprocess
 from pathlib import Path
 
 
 def main():
+    parser = argparse.ArgumentParser(description="启动动漫卡牌游戏服务器")
+    parser.add_argument(
+        "--prod", action="store_true", help="生产模式：预加载目录的多进程服务器"
+    )
+    parser.add_argument("-w", "--workers", type=int, default=None, help="工作进程数（生产模式）")
+    parser.add_argument("-t", "--threads", type=int, default=None, help="每个进程的线程数（生产模式）")
+    parser.add_argument("-p", "--port", type=int, default=5001, help="端口（生产模式）")
+    args = parser.parse_args()
+
     # 获取当前脚本所在目录
     current_dir = Path(__file__).parent
     backend_dir = current_dir / "backend"
@@ -33,14 +48,33 @@ def main():
 
     print("🎮 启动动漫卡牌游戏服务器...")
     print("📁 项目目录:", current_dir)
-    print("🌐 服务器将在 http://localhost:5001 启动")
+    if args.prod:
+        command = [sys.executable, "prefork.py", "--port", str(args.port)]
+        if args.workers:
+            command += ["--workers", str(args.workers)]
+        if args.threads:
+            command += ["--threads", str(args.threads)]
+        print(f"🚀 生产模式：服务器将在 http://localhost:{args.port} 启动")
+    else:
+        command = [sys.executable, "server.py"]
+        print("🌐 服务器将在 http://localhost:5001 启动")
     print("✨ 新功能：角色卡抽卡和收集系统")
     print("=" * 50)
 
     # 切换到backend目录并启动服务器
     try:
         os.chdir(backend_dir)
-        subprocess.run([sys.executable, "server.py"], check=True)
+        process = subprocess.Popen(command)
+        try:
+            returncode = process.wait()
+        except KeyboardInterrupt:
+            # 让服务器自己平滑退出（生产模式下主进程会先停掉工作进程）
+            process.send_signal(signal.SIGINT)
+            process.wait()
+            print("\n⭐ 服务器已停止")
+            return
+        if returncode:
+            raise subprocess.CalledProcessError(returncode, command)
     except KeyboardInterrupt:
         print("\n⭐ 服务器已停止")
     except subprocess.CalledProcessError as e: